@@ -0,0 +1,292 @@
+"""
+Módulo: almacenDocumentos.py
+
+Este módulo guarda los documentos descargados de MITECO una sola vez, por su contenido.
+
+Cada archivo se guarda en data/blobs/ con el nombre de su hash SHA-256 y un índice SQLite (data/documentos.sqlite3)
+relaciona cada documento de descargas/{productor}/{residuo}/{nombre} (y su regage) con su blob. La estructura de
+carpetas de siempre se mantiene, pero sus archivos son enlaces al blob (enlace duro, si no simbólico y, si el sistema
+no permite ninguno, una copia), así que los PDF repetidos en muchas carpetas de residuo ocupan lo de uno solo.
+Como un enlace duro comparte el archivo con el blob, los blobs son de solo lectura (editar una copia cambiaría todas)
+y antes de restaurar un regage se comprueba que el contenido de sus blobs sigue teniendo su hash.
+
+Funciones principales:
+  - guardar_documento(ruta, productor, residuo, regage): mueve el archivo al almacén y deja un enlace en su lugar.
+  - documentos_regage(regage): documentos ya guardados de un regage.
+  - restaurar_regage(regage, carpeta, documentos_esperados): vuelve a crear en 'carpeta' los documentos ya guardados
+    de un regage, solo si están todos los esperados.
+  - deduplicar_carpeta(carpeta): pasa al almacén todos los archivos de un árbol de descargas existente.
+
+Ejemplo de uso:
+    almacenDocumentos.guardar_documento(ruta_pdf, "EMPRESA_SL", "FILTROS_DE_ACEITE", "REGAGE24e00001234567")
+    if almacenDocumentos.restaurar_regage("REGAGE24e00001234567", carpeta, documentos_esperados=3):
+        ...  # No hace falta volver a descargar
+
+Ejecutar el módulo deduplica la carpeta descargas/.
+"""
+
+import loggerConfig
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from config import BASE_DIR
+
+RUTA_BLOBS = os.path.join(BASE_DIR, "data", "blobs")
+RUTA_INDICE = os.path.join(BASE_DIR, "data", "documentos.sqlite3")
+CARPETA_DESCARGAS = os.path.join(BASE_DIR, "descargas")
+
+# Tamaño de los bloques leídos al calcular el hash
+TAMANO_BLOQUE = 1024 * 1024
+
+# Un lock por hash: varios hilos (sesiones de linkRegage) pueden guardar a la vez el mismo contenido
+_locks_blobs = {}
+_lock_blobs = threading.Lock()
+
+
+@contextmanager
+def _conexion():
+    """
+    Abre una conexión al índice de documentos, hace commit al salir del bloque y la cierra.
+    """
+    os.makedirs(os.path.dirname(RUTA_INDICE), exist_ok=True)
+    conexion = sqlite3.connect(RUTA_INDICE, timeout=10)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(
+        """
+        CREATE TABLE IF NOT EXISTS documentos (
+            productor TEXT NOT NULL,
+            residuo TEXT NOT NULL,
+            nombre TEXT NOT NULL,
+            regage TEXT,
+            sha256 TEXT NOT NULL,
+            tamano INTEGER NOT NULL,
+            fecha REAL NOT NULL,
+            PRIMARY KEY (productor, residuo, nombre)
+        )
+        """
+    )
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_documentos_regage ON documentos (regage)")
+    try:
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def calcular_hash(ruta: str) -> str:
+    """
+    Devuelve el SHA-256 (hexadecimal) del contenido del archivo.
+    """
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b""):
+            resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+def ruta_blob(sha256: str) -> str:
+    """
+    Devuelve la ruta del blob con ese hash (data/blobs/ab/abcdef...).
+    """
+    return os.path.join(RUTA_BLOBS, sha256[:2], sha256)
+
+
+def _mismo_archivo(ruta: str, otra: str) -> bool:
+    try:
+        return os.path.samefile(ruta, otra)
+    except OSError:
+        return False
+
+
+def _solo_lectura(ruta: str) -> None:
+    """
+    Quita el permiso de escritura del blob (y de sus enlaces duros, que son el mismo archivo).
+    """
+    os.chmod(ruta, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _eliminar(ruta: str) -> None:
+    """
+    Elimina un archivo aunque sea de solo lectura (en Windows os.remove no puede borrarlo).
+    """
+    try:
+        os.remove(ruta)
+    except PermissionError:
+        os.chmod(ruta, stat.S_IRUSR | stat.S_IWUSR)
+        os.remove(ruta)
+
+
+def blob_integro(sha256: str) -> bool:
+    """
+    Indica si el blob existe y su contenido sigue teniendo ese hash (nadie lo ha editado a través de un enlace).
+    """
+    blob = ruta_blob(sha256)
+    return os.path.exists(blob) and calcular_hash(blob) == sha256
+
+
+def materializar(sha256: str, destino: str) -> str:
+    """
+    Crea 'destino' a partir del blob: enlace duro, si no enlace simbólico y, si no, copia.
+    Devuelve el tipo usado ("enlace", "simbolico" o "copia").
+    """
+    origen = ruta_blob(sha256)
+    if _mismo_archivo(origen, destino):
+        return "enlace"
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    if os.path.lexists(destino):
+        _eliminar(destino)
+        # Si 'destino' era un enlace a este mismo blob, al borrarlo ha podido quedar con permiso de escritura
+        _solo_lectura(origen)
+    try:
+        os.link(origen, destino)
+        return "enlace"
+    except OSError:
+        pass
+    try:
+        os.symlink(origen, destino)
+        return "simbolico"
+    except OSError:
+        pass
+    shutil.copy2(origen, destino)
+    return "copia"
+
+
+def _guardar_blob(ruta: str) -> str:
+    """
+    Pasa el archivo al almacén de blobs (si su contenido no estaba ya) y devuelve su hash.
+    Un blob existente cuyo contenido ya no coincide con su hash se sustituye por el archivo nuevo.
+    """
+    sha256 = calcular_hash(ruta)
+    blob = ruta_blob(sha256)
+    with _lock_blobs:
+        lock = _locks_blobs.setdefault(sha256, threading.Lock())
+    with lock:
+        if os.path.exists(blob) and not blob_integro(sha256):
+            logging.warning(f"El blob {sha256[:12]} se había modificado, se sustituye.")
+            _eliminar(blob)
+        if os.path.exists(blob):
+            _solo_lectura(blob)
+            return sha256
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # Temporal con nombre único: otro proceso puede estar guardando el mismo contenido
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(blob), suffix=".tmp")
+        os.close(descriptor)
+        try:
+            shutil.copy2(ruta, temporal)
+            _solo_lectura(temporal)
+            try:
+                os.replace(temporal, blob)
+            except OSError:
+                # Si otro proceso ya ha dejado el blob completo (en Windows no se puede sustituir), vale el suyo
+                if not blob_integro(sha256):
+                    raise
+        finally:
+            if os.path.lexists(temporal):
+                _eliminar(temporal)
+    return sha256
+
+
+def guardar_documento(ruta: str, productor: str, residuo: str, regage: str = None) -> str:
+    """
+    Guarda el documento en el almacén, lo registra en el índice y deja en 'ruta' un enlace al blob.
+    Si el mismo contenido ya estaba guardado (en esta u otra carpeta), no ocupa espacio de nuevo.
+    Devuelve el hash del documento.
+    """
+    sha256 = _guardar_blob(ruta)
+    tamano = os.path.getsize(ruta)
+    tipo = materializar(sha256, ruta)
+    with _conexion() as conexion:
+        conexion.execute(
+            "INSERT OR REPLACE INTO documentos (productor, residuo, nombre, regage, sha256, tamano, fecha) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (productor, residuo, os.path.basename(ruta), regage, sha256, tamano, time.time()),
+        )
+    logging.info(f"Documento {os.path.basename(ruta)} guardado en el almacén ({sha256[:12]}, {tipo}).")
+    return sha256
+
+
+def documentos_regage(regage: str) -> list:
+    """
+    Devuelve los documentos guardados de un regage: [{"productor", "residuo", "nombre", "sha256", "tamano"}].
+    """
+    with _conexion() as conexion:
+        filas = conexion.execute(
+            "SELECT productor, residuo, nombre, sha256, tamano FROM documentos WHERE regage = ? ORDER BY nombre",
+            (regage,),
+        ).fetchall()
+    return [
+        {"productor": productor, "residuo": residuo, "nombre": nombre, "sha256": sha256, "tamano": tamano}
+        for productor, residuo, nombre, sha256, tamano in filas
+    ]
+
+
+def restaurar_regage(regage: str, carpeta: str, documentos_esperados: int = 1) -> list:
+    """
+    Crea en 'carpeta' los documentos ya guardados del regage (enlazados a sus blobs).
+    Devuelve la lista de nombres restaurados, o [] si hay menos de 'documentos_esperados' documentos
+    (descarga incompleta) o alguno de sus blobs falta o ha cambiado (en ese caso hay que volver a descargarlos).
+    """
+    documentos = documentos_regage(regage)
+    if not documentos:
+        return []
+    guardados = len({doc["nombre"] for doc in documentos})
+    if guardados < documentos_esperados:
+        logging.info(f"El almacén solo tiene {guardados} de {documentos_esperados} documentos de {regage}.")
+        return []
+    for sha256 in {doc["sha256"] for doc in documentos}:
+        if not blob_integro(sha256):
+            logging.warning(f"El blob {sha256[:12]} de {regage} falta o su contenido ha cambiado, hay que descargarlo.")
+            return []
+    nombres = []
+    for documento in documentos:
+        if documento["nombre"] in nombres:
+            continue
+        materializar(documento["sha256"], os.path.join(carpeta, documento["nombre"]))
+        nombres.append(documento["nombre"])
+    logging.info(f"Documentos de {regage} restaurados desde el almacén en {carpeta}: {nombres}")
+    return nombres
+
+
+def deduplicar_carpeta(carpeta: str = CARPETA_DESCARGAS) -> dict:
+    """
+    Pasa al almacén todos los archivos de un árbol descargas/{productor}/{residuo}/ ya existente
+    y los sustituye por enlaces. Los documentos que ya estaban en el índice conservan su regage.
+    Devuelve {"archivos": n, "blobs": n, "bytes_ahorrados": n}.
+    """
+    vistos = set()
+    archivos = 0
+    ahorrado = 0
+    for raiz, _, nombres in os.walk(carpeta):
+        relativa = os.path.relpath(raiz, carpeta).split(os.sep)
+        if len(relativa) != 2:
+            continue
+        productor, residuo = relativa
+        for nombre in sorted(nombres):
+            ruta = os.path.join(raiz, nombre)
+            if os.path.islink(ruta) or not os.path.isfile(ruta):
+                continue
+            with _conexion() as conexion:
+                fila = conexion.execute(
+                    "SELECT regage FROM documentos WHERE productor = ? AND residuo = ? AND nombre = ?",
+                    (productor, residuo, nombre),
+                ).fetchone()
+            tamano = os.path.getsize(ruta)
+            sha256 = guardar_documento(ruta, productor, residuo, fila[0] if fila else None)
+            archivos += 1
+            if sha256 in vistos:
+                ahorrado += tamano
+            vistos.add(sha256)
+    logging.info(f"Deduplicados {archivos} archivos en {len(vistos)} blobs ({ahorrado} bytes ahorrados).")
+    return {"archivos": archivos, "blobs": len(vistos), "bytes_ahorrados": ahorrado}
+
+
+if __name__ == "__main__":
+    deduplicar_carpeta()
@@ -0,0 +1,209 @@
+"""
+Módulo: cacheNima.py
+
+Este módulo implementa una caché persistente (SQLite en disco) de los resultados de las búsquedas NIMA,
+indexada por NIF normalizado, para no volver a scrapear los portales autonómicos con NIFs ya consultados.
+
+Políticas:
+  - TTL por comunidad autónoma (TTL_POR_COMUNIDAD) para los NIF encontrados.
+  - TTL más corto (TTL_NO_ENCONTRADO) para los resultados "NIF no encontrado".
+  - Stale-while-revalidate: durante VENTANA_OBSOLETO tras caducar, se devuelve el dato antiguo
+    inmediatamente y se lanza en segundo plano una búsqueda que lo refresca.
+  - bypass / invalidar explícitos desde el endpoint.
+
+Ejemplo de uso:
+    resultado = cacheNima.obtener_o_buscar("B98969264", mainNima.busqueda_NIMA_con_comunidad)
+"""
+
+import loggerConfig
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import BASE_DIR
+
+RUTA_CACHE = os.path.join(BASE_DIR, "data", "cache_nima.sqlite3")
+
+HORA = 3600
+DIA = 24 * HORA
+
+# Tiempo de vida de un resultado encontrado, según la comunidad donde se encontró
+TTL_POR_COMUNIDAD = {
+    "Valencia": 7 * DIA,
+    "Madrid": 7 * DIA,
+    "Castilla": 7 * DIA,
+    "Cataluña": 7 * DIA,
+}
+TTL_ENCONTRADO_POR_DEFECTO = 7 * DIA
+# Tiempo de vida de un resultado "NIF no encontrado"
+TTL_NO_ENCONTRADO = 6 * HORA
+# Tiempo tras caducar durante el que se sirve el dato antiguo mientras se refresca en segundo plano
+VENTANA_OBSOLETO = 2 * DIA
+
+_refrescos_en_curso = set()
+_lock_refrescos = threading.Lock()
+
+
+def normalizar_nif(nif: str) -> str:
+    """
+    Normaliza un NIF para usarlo como clave: mayúsculas, sin espacios, guiones ni puntos.
+    """
+    return re.sub(r"[\s\-.]", "", str(nif)).upper()
+
+
+@contextmanager
+def _conexion():
+    """
+    Abre una conexión a la caché, hace commit al salir del bloque y la cierra.
+    """
+    os.makedirs(os.path.dirname(RUTA_CACHE), exist_ok=True)
+    conexion = sqlite3.connect(RUTA_CACHE, timeout=10)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(
+        """
+        CREATE TABLE IF NOT EXISTS resultados (
+            nif TEXT PRIMARY KEY,
+            comunidad TEXT,
+            encontrado INTEGER NOT NULL,
+            resultado TEXT NOT NULL,
+            guardado REAL NOT NULL
+        )
+        """
+    )
+    try:
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def _ttl(comunidad, encontrado: bool) -> int:
+    if not encontrado:
+        return TTL_NO_ENCONTRADO
+    return TTL_POR_COMUNIDAD.get(comunidad, TTL_ENCONTRADO_POR_DEFECTO)
+
+
+def leer(nif: str):
+    """
+    Lee la entrada de caché de un NIF.
+
+    Returns:
+        dict or None: {"nif", "comunidad", "encontrado", "resultado", "edad", "estado"} donde 'estado' es
+        "fresco", "obsoleto" (caducado pero dentro de VENTANA_OBSOLETO) o "caducado". None si no hay entrada.
+    """
+    clave = normalizar_nif(nif)
+    with _conexion() as conexion:
+        fila = conexion.execute(
+            "SELECT comunidad, encontrado, resultado, guardado FROM resultados WHERE nif = ?", (clave,)
+        ).fetchone()
+    if fila is None:
+        return None
+    comunidad, encontrado, resultado, guardado = fila
+    edad = time.time() - guardado
+    ttl = _ttl(comunidad, bool(encontrado))
+    if edad <= ttl:
+        estado = "fresco"
+    elif edad <= ttl + VENTANA_OBSOLETO:
+        estado = "obsoleto"
+    else:
+        estado = "caducado"
+    return {
+        "nif": clave,
+        "comunidad": comunidad,
+        "encontrado": bool(encontrado),
+        "resultado": json.loads(resultado),
+        "edad": edad,
+        "estado": estado,
+    }
+
+
+def guardar(nif: str, comunidad, resultado: dict) -> None:
+    """
+    Guarda (o sustituye) el resultado de la búsqueda de un NIF.
+    Un resultado sin comunidad se considera "NIF no encontrado".
+    """
+    clave = normalizar_nif(nif)
+    encontrado = comunidad is not None
+    with _conexion() as conexion:
+        conexion.execute(
+            "INSERT OR REPLACE INTO resultados (nif, comunidad, encontrado, resultado, guardado) VALUES (?, ?, ?, ?, ?)",
+            (clave, comunidad, int(encontrado), json.dumps(resultado, ensure_ascii=False), time.time()),
+        )
+    logging.info(f"Resultado de {clave} guardado en caché (comunidad: {comunidad}).")
+
+
+def invalidar(nif: str = None) -> int:
+    """
+    Elimina la entrada de caché de un NIF, o toda la caché si no se indica NIF.
+    Devuelve el número de entradas eliminadas.
+    """
+    with _conexion() as conexion:
+        if nif is None:
+            cursor = conexion.execute("DELETE FROM resultados")
+        else:
+            cursor = conexion.execute("DELETE FROM resultados WHERE nif = ?", (normalizar_nif(nif),))
+    logging.info(f"Caché NIMA invalidada para {nif or 'todos los NIF'} ({cursor.rowcount} entradas).")
+    return cursor.rowcount
+
+
+def _buscar_y_guardar(nif, funcion_busqueda):
+    # Si la búsqueda lanza una excepción (algún portal no ha respondido) no se guarda nada
+    comunidad, resultado = funcion_busqueda(nif)
+    if resultado is not None:
+        guardar(nif, comunidad, resultado)
+    return comunidad, resultado
+
+
+def _refrescar_en_segundo_plano(nif, funcion_busqueda):
+    """
+    Lanza un hilo que vuelve a buscar el NIF y actualiza la caché. Evita refrescos duplicados del mismo NIF.
+    """
+    clave = normalizar_nif(nif)
+    with _lock_refrescos:
+        if clave in _refrescos_en_curso:
+            return
+        _refrescos_en_curso.add(clave)
+
+    def refrescar():
+        try:
+            _buscar_y_guardar(nif, funcion_busqueda)
+        except Exception as e:
+            logging.error(f"Error refrescando en segundo plano la caché de {clave}: {e}")
+        finally:
+            with _lock_refrescos:
+                _refrescos_en_curso.discard(clave)
+
+    threading.Thread(target=refrescar, daemon=True).start()
+
+
+def obtener_o_buscar(nif: str, funcion_busqueda, bypass: bool = False):
+    """
+    Devuelve el resultado de la caché si está vigente; si no, ejecuta la búsqueda y guarda el resultado.
+
+    Args:
+        nif (str): NIF a buscar.
+        funcion_busqueda (callable): Función nif -> (comunidad, resultado). comunidad es None si no se encontró.
+        bypass (bool): Si es True, ignora la caché y busca siempre (el resultado nuevo sí se guarda).
+
+    Returns:
+        tuple: (comunidad, resultado, origen) donde origen es "cache", "cache-obsoleta" o "busqueda".
+
+    Las excepciones de 'funcion_busqueda' se propagan sin escribir en la caché.
+    """
+    if not bypass:
+        entrada = leer(nif)
+        if entrada and entrada["estado"] == "fresco":
+            logging.info(f"Acierto de caché para {entrada['nif']}.")
+            return entrada["comunidad"], entrada["resultado"], "cache"
+        if entrada and entrada["estado"] == "obsoleto":
+            logging.info(f"Caché obsoleta para {entrada['nif']}, se devuelve y se refresca en segundo plano.")
+            _refrescar_en_segundo_plano(nif, funcion_busqueda)
+            return entrada["comunidad"], entrada["resultado"], "cache-obsoleta"
+
+    comunidad, resultado = _buscar_y_guardar(nif, funcion_busqueda)
+    return comunidad, resultado, "busqueda"
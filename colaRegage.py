@@ -0,0 +1,198 @@
+"""
+Módulo: colaRegage.py
+
+Este módulo guarda la cola persistente de regages pendientes de descargar de MITECO (linkRegage).
+
+Cada regage pasa por los estados pendiente -> en_curso -> hecho. Si falla, vuelve a pendiente con una espera
+creciente (REINTENTO_BASE * 2^(intentos-1) segundos) hasta MAX_INTENTOS; después queda como fallido.
+Como la cola está en SQLite (data/cola_regage.sqlite3), si el proceso se interrumpe se continúa donde se quedó,
+y varios hilos pueden tomar elementos a la vez sin repetirlos.
+
+Funciones principales:
+  - encolar(registro, origen): añade un registro (si no estaba ya).
+  - estado(regage): estado actual de un regage en la cola.
+  - tomar_siguiente(): reserva el siguiente regage listo para procesar.
+  - marcar_hecho(regage, duracion, documentos) / marcar_fallo(regage, error, duracion).
+  - origen_completado(origen): indica si todos los registros de un JSON ya están hechos.
+  - resumen(): número de regages por estado y duración media.
+
+Ejemplo de uso:
+    colaRegage.encolar(registro, ruta_json)
+    elemento = colaRegage.tomar_siguiente()
+    colaRegage.marcar_hecho(elemento["regage"], 12.4, 3)
+"""
+
+import loggerConfig
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from config import BASE_DIR
+
+RUTA_COLA = os.path.join(BASE_DIR, "data", "cola_regage.sqlite3")
+
+# Número máximo de intentos por regage y espera (segundos) antes del primer reintento
+MAX_INTENTOS = 4
+REINTENTO_BASE = 30
+
+
+@contextmanager
+def _conexion():
+    """
+    Abre una conexión a la cola, hace commit al salir del bloque y la cierra.
+    """
+    os.makedirs(os.path.dirname(RUTA_COLA), exist_ok=True)
+    conexion = sqlite3.connect(RUTA_COLA, timeout=30, isolation_level=None)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(
+        """
+        CREATE TABLE IF NOT EXISTS regages (
+            regage TEXT PRIMARY KEY,
+            registro TEXT NOT NULL,
+            origen TEXT,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            proximo_intento REAL NOT NULL DEFAULT 0,
+            duracion REAL,
+            documentos INTEGER,
+            error TEXT,
+            actualizado REAL NOT NULL
+        )
+        """
+    )
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_regages_estado ON regages (estado, proximo_intento)")
+    try:
+        conexion.execute("BEGIN IMMEDIATE")
+        yield conexion
+        conexion.execute("COMMIT")
+    except Exception:
+        conexion.execute("ROLLBACK")
+        raise
+    finally:
+        conexion.close()
+
+
+def encolar(registro: dict, origen: str = None) -> bool:
+    """
+    Añade el registro a la cola como pendiente. Si el regage ya estaba (en cualquier estado) no se modifica,
+    tampoco su origen: el que llama decide qué hacer con el JSON repetido (ver estado()).
+    Devuelve True si se ha añadido.
+    """
+    with _conexion() as conexion:
+        cursor = conexion.execute(
+            "INSERT OR IGNORE INTO regages (regage, registro, origen, actualizado) VALUES (?, ?, ?, ?)",
+            (registro["regage"], json.dumps(registro, ensure_ascii=False), origen, time.time()),
+        )
+    return cursor.rowcount > 0
+
+
+def estado(regage: str):
+    """
+    Devuelve el estado del regage ("pendiente", "en_curso", "hecho" o "fallido"), o None si no está en la cola.
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute("SELECT estado FROM regages WHERE regage = ?", (regage,)).fetchone()
+    return fila[0] if fila else None
+
+
+def reanudar() -> int:
+    """
+    Devuelve a pendiente los regages que quedaron en curso (proceso interrumpido) y los fallidos, con sus
+    intentos a cero. Devuelve cuántos se han reanudado.
+    """
+    with _conexion() as conexion:
+        cursor = conexion.execute(
+            "UPDATE regages SET estado = 'pendiente', intentos = CASE WHEN estado = 'fallido' THEN 0 ELSE intentos END, "
+            "proximo_intento = 0, actualizado = ? WHERE estado IN ('en_curso', 'fallido')",
+            (time.time(),),
+        )
+    return cursor.rowcount
+
+
+def tomar_siguiente():
+    """
+    Reserva (pasa a en_curso) el siguiente regage pendiente cuyo reintento ya toca.
+    Devuelve {"regage", "registro", "origen", "intentos"} o None si no hay ninguno listo.
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute(
+            "SELECT regage, registro, origen, intentos FROM regages "
+            "WHERE estado = 'pendiente' AND proximo_intento <= ? ORDER BY proximo_intento, rowid LIMIT 1",
+            (time.time(),),
+        ).fetchone()
+        if fila is None:
+            return None
+        conexion.execute(
+            "UPDATE regages SET estado = 'en_curso', actualizado = ? WHERE regage = ?", (time.time(), fila[0])
+        )
+    regage, registro, origen, intentos = fila
+    return {"regage": regage, "registro": json.loads(registro), "origen": origen, "intentos": intentos}
+
+
+def segundos_hasta_siguiente():
+    """
+    Devuelve los segundos que faltan para que haya un regage pendiente listo (0 si ya lo hay),
+    o None si no queda ninguno pendiente.
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute("SELECT MIN(proximo_intento) FROM regages WHERE estado = 'pendiente'").fetchone()
+    if fila[0] is None:
+        return None
+    return max(0.0, fila[0] - time.time())
+
+
+def marcar_hecho(regage: str, duracion: float, documentos: int) -> None:
+    """
+    Marca el regage como descargado, con su duración (segundos) y el número de documentos.
+    """
+    with _conexion() as conexion:
+        conexion.execute(
+            "UPDATE regages SET estado = 'hecho', duracion = ?, documentos = ?, error = NULL, actualizado = ? "
+            "WHERE regage = ?",
+            (duracion, documentos, time.time(), regage),
+        )
+
+
+def marcar_fallo(regage: str, error: str, duracion: float = None) -> str:
+    """
+    Registra un intento fallido. Vuelve a dejar el regage pendiente con espera exponencial o, si ha agotado
+    MAX_INTENTOS, lo marca como fallido. Devuelve el nuevo estado.
+    """
+    with _conexion() as conexion:
+        (intentos,) = conexion.execute("SELECT intentos FROM regages WHERE regage = ?", (regage,)).fetchone()
+        intentos += 1
+        estado = "fallido" if intentos >= MAX_INTENTOS else "pendiente"
+        espera = REINTENTO_BASE * 2 ** (intentos - 1)
+        conexion.execute(
+            "UPDATE regages SET estado = ?, intentos = ?, proximo_intento = ?, duracion = ?, error = ?, actualizado = ? "
+            "WHERE regage = ?",
+            (estado, intentos, time.time() + espera, duracion, error, time.time(), regage),
+        )
+    if estado == "pendiente":
+        logging.warning(f"Regage {regage} falló (intento {intentos}), se reintentará en {espera}s: {error}")
+    else:
+        logging.error(f"Regage {regage} descartado tras {intentos} intentos: {error}")
+    return estado
+
+
+def origen_completado(origen: str) -> bool:
+    """
+    Indica si todos los regages leídos de ese archivo JSON están hechos.
+    """
+    with _conexion() as conexion:
+        (restantes,) = conexion.execute(
+            "SELECT COUNT(*) FROM regages WHERE origen = ? AND estado != 'hecho'", (origen,)
+        ).fetchone()
+    return restantes == 0
+
+
+def resumen() -> dict:
+    """
+    Devuelve {estado: {"regages": n, "duracion_media": s}} de toda la cola.
+    """
+    with _conexion() as conexion:
+        filas = conexion.execute("SELECT estado, COUNT(*), AVG(duracion) FROM regages GROUP BY estado").fetchall()
+    return {estado: {"regages": total, "duracion_media": media} for estado, total, media in filas}
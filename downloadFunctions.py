@@ -2,15 +2,28 @@ import logging
 from config import BASE_DIR
 import loggerConfig
 import os
+import fnmatch
+import glob
 import json
+import shutil
+import tempfile
 import time
+from contextlib import contextmanager
 from selenium import webdriver
 
+import eventosCDP
+import vigilanteCarpetas
 import webConfiguration
 import webFunctions
 
 WEB = "https://ash-speed.hetzner.com/"
 
+# Extensiones de archivos que el navegador aún está escribiendo o que no son descargas reales
+EXTENSIONES_TEMPORALES = vigilanteCarpetas.EXTENSIONES_TEMPORALES
+
+# Segundos entre comprobaciones de la carpeta mientras se esperan los eventos de descarga de Chrome
+INTERVALO_CARPETA_CDP = 2
+
 def ensure_download_path(path: str) -> str:
     """Crea el directorio si no existe y devuelve la ruta absoluta."""
     os.makedirs(path, exist_ok=True)
@@ -61,63 +74,81 @@ def detect_new_file(old_state: dict, new_state: dict) -> str | None:
     new_entries = new_files - old_files
     return next(iter(new_entries), None)
 
-def wait_for_new_download(download_path: str, old_state: dict, num_descargas: int = 1, timeout: int = 7200) -> list:
+def wait_for_new_download(download_path: str, old_state: dict, num_descargas: int = 1, timeout: int = 7200, seguimiento: dict = None) -> list:
     """
     Espera hasta detectar el número de archivos nuevos indicados (ignorando .crdownload y .htm) o agotar el tiempo.
     Si un archivo descargado tiene el mismo nombre que uno existente, detecta también los renombrados (nombre (1).pdf, etc).
     Devuelve la lista de nombres de archivos nuevos detectados (con nombres únicos).
+
+    Si se pasa 'seguimiento' (seguir_descargas(driver), creado antes de lanzar las descargas), se espera a los eventos
+    de descarga completada de Chrome y se responde en cuanto terminan. Cada INTERVALO_CARPETA_CDP segundos se mira
+    también la carpeta, así que si algún evento no llega (p. ej. un PDF abierto en el visor) se responde igualmente
+    en cuanto los archivos están en disco, sin agotar 'timeout'.
     """
-    archivos_detectados = set()
-    old_files_set = set(old_state["files"])
-    old_files_mtime = {}
-    for f in old_state["files"]:
-        ruta = os.path.join(download_path, f)
-        if os.path.exists(ruta):
-            old_files_mtime[f] = os.path.getmtime(ruta)
-    checked_files = set()
-
-    for _ in range(timeout):
-        time.sleep(1)
-        new_state = snapshot_folder_state(download_path)
-        # Archivos válidos (sin .crdownload ni .htm)
-        valid_files = [f for f in new_state["files"] if not f.endswith('.crdownload') and not f.endswith('.htm')]
-
-        # Detectar archivos realmente nuevos
-        nuevos = set(valid_files) - old_files_set
-        archivos_detectados.update(nuevos)
-
-        # Detectar archivos renombrados por el navegador (nombre (1).pdf, nombre (2).pdf, ...)
-        for archivo in valid_files:
-            if archivo in checked_files:
-                continue
-            ruta = os.path.join(download_path, archivo)
-            # Si el archivo existía antes, pero ha cambiado su fecha de modificación, es una nueva descarga
-            if archivo in old_files_set:
-                try:
-                    if os.path.getmtime(ruta) > old_files_mtime.get(archivo, 0):
-                        archivos_detectados.add(archivo)
-                        checked_files.add(archivo)
-                except Exception:
-                    continue
-            # Si es un archivo con patrón nombre (n).ext y no estaba antes, también lo añadimos
-            elif any(
-                archivo.startswith(base_name[:-len(ext)]) and archivo.endswith(ext)
-                for base_name in old_files_set
-                for ext in [os.path.splitext(base_name)[1]]
-            ):
-                archivos_detectados.add(archivo)
-                checked_files.add(archivo)
-
-        if len(archivos_detectados) >= num_descargas:
-            for archivo in archivos_detectados:
-                logging.info(f"Archivo nuevo detectado: {archivo}")
-            return list(archivos_detectados)
+    previos = _archivos_previos(download_path, old_state)
+    if seguimiento is not None:
+        limite = time.monotonic() + timeout
+        completadas = []
+        try:
+            while True:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                esperar_descargas_cdp(seguimiento, num_descargas, min(INTERVALO_CARPETA_CDP, restante), completadas)
+                archivos = []
+                for descarga in completadas:
+                    ruta = _resolver_archivo_descargado(download_path, descarga["nombre"], excluir=archivos, estado_previo=old_state)
+                    if ruta:
+                        archivos.append(ruta)
+                if len(archivos) >= num_descargas:
+                    nombres = [os.path.basename(ruta) for ruta in archivos]
+                    for archivo in nombres:
+                        logging.info(f"Archivo nuevo detectado: {archivo}")
+                    return nombres
+                en_carpeta = vigilanteCarpetas.esperar_archivos(download_path, "*", num_descargas, 0, previos=previos)
+                if len(en_carpeta) >= num_descargas:
+                    logging.warning("Los eventos de descarga no cubren todas las descargas, se usan los archivos de la carpeta.")
+                    break
+        finally:
+            eventosCDP.cancelar_suscripcion(seguimiento)
+        timeout = 0
+    return _esperar_descargas_en_carpeta(download_path, old_state, num_descargas, timeout, previos)
+
+def _archivos_previos(download_path: str, old_state: dict) -> dict:
+    """
+    Devuelve {nombre: fecha de modificación} de los archivos de 'old_state' que siguen en la carpeta.
+    """
+    return {
+        nombre: fecha for nombre, fecha in vigilanteCarpetas.estado_carpeta(download_path).items()
+        if nombre in set(old_state["files"])
+    }
+
+def _esperar_descargas_en_carpeta(download_path: str, old_state: dict, num_descargas: int, timeout: int, previos: dict = None) -> list:
+    """
+    Vigila la carpeta (vigilanteCarpetas) hasta detectar 'num_descargas' archivos nuevos: los que no estaban en
+    'old_state' (incluidos los renombrados "nombre (1).pdf") y los que estaban pero se han vuelto a escribir.
+    """
+    if previos is None:
+        previos = _archivos_previos(download_path, old_state)
+    rutas = vigilanteCarpetas.esperar_archivos(download_path, "*", num_descargas, timeout, previos=previos)
+    archivos_detectados = [os.path.basename(ruta) for ruta in rutas]
+    if len(archivos_detectados) >= num_descargas:
+        for archivo in archivos_detectados:
+            logging.info(f"Archivo nuevo detectado: {archivo}")
+        return archivos_detectados
 
     logging.error(f"No se detectaron todas las descargas esperadas ({num_descargas}). Solo detectados: {len(archivos_detectados)}")
-    return list(archivos_detectados)
+    return archivos_detectados
 
 # ------------------- FUNCIONES REUTILIZABLES PARA OTROS SCRIPTS -------------------
 
+def ruta_descarga(folder_name: str, product_name: str) -> str:
+    """
+    Crea (o utiliza, si ya existe) la carpeta BASE_DIR/descargas/[folder_name]/[product_name] y devuelve su ruta absoluta.
+    """
+    base_download_folder = os.path.join(BASE_DIR, "descargas")
+    return ensure_download_path(os.path.join(base_download_folder, folder_name, product_name))
+
 def setup_descarga(driver: webdriver.Chrome, folder_name: str, product_name: str) -> str:
     """
     Prepara el entorno de descargas para Selenium.
@@ -131,19 +162,7 @@ def setup_descarga(driver: webdriver.Chrome, folder_name: str, product_name: str
     Returns:
         str: Ruta absoluta de la carpeta de descargas.
     """
-    base_download_folder = os.path.join(BASE_DIR, "descargas")
-    
-    # Usar (o crear) la carpeta de la empresa
-    empresa_folder = os.path.join(base_download_folder, folder_name)
-    if not os.path.exists(empresa_folder):
-        os.makedirs(empresa_folder, exist_ok=True)
-    
-    # Usar (o crear) la carpeta del producto dentro de la empresa
-    producto_folder = os.path.join(empresa_folder, product_name)
-    if not os.path.exists(producto_folder):
-        os.makedirs(producto_folder, exist_ok=True)
-    
-    download_path = ensure_download_path(producto_folder)
+    download_path = ruta_descarga(folder_name, product_name)
     configure_driver_download_path(driver, download_path)
     logging.info(f"Descargas configuradas en: {download_path}")
     return download_path
@@ -155,3 +174,196 @@ def finalizar_descarga(driver: webdriver.Chrome):
     """
     driver.quit()
     logging.info("Driver cerrado tras la descarga.")
+
+# ------------------- SESIONES DE DESCARGA AISLADAS -------------------
+
+def esperar_archivo_completo(carpeta: str, patron: str = "*", timeout: int = 30, excluir=()) -> str:
+    """
+    Espera a que aparezca en 'carpeta' un archivo terminado (sin .crdownload/.tmp) que cumpla el patrón glob.
+    Si hay varios, devuelve siempre el más antiguo (y por nombre en caso de empate), nunca "el último que haya".
+
+    Args:
+        carpeta (str): Carpeta de descargas.
+        patron (str, optional): Patrón glob del nombre del archivo (p. ej. "*.xlsx").
+        timeout (int, optional): Tiempo máximo de espera en segundos.
+        excluir (iterable, optional): Rutas ya recogidas que no deben devolverse otra vez.
+
+    Returns:
+        str: Ruta absoluta del archivo descargado.
+
+    Raises:
+        TimeoutError: Si no se completa ninguna descarga en el tiempo indicado.
+    """
+    completos = vigilanteCarpetas.esperar_archivos(carpeta, patron, 1, timeout, excluir=excluir)
+    if not completos:
+        raise TimeoutError(f"Descarga '{patron}' no completada en {timeout}s en {carpeta}.")
+    return completos[0]
+
+@contextmanager
+def sesion_descarga(driver: webdriver.Chrome, prefijo: str = "descarga_"):
+    """
+    Context manager que da al driver una carpeta de descargas temporal y exclusiva durante el bloque 'with'.
+    Así varias descargas simultáneas (varios drivers o trabajos) no se mezclan como en ~/Downloads.
+    Al salir restaura la descarga por defecto del navegador y borra la carpeta con todo su contenido,
+    de modo que los archivos se deben leer (o copiar) dentro del bloque.
+
+    Devuelve un diccionario de sesión {"driver", "carpeta", "recibidos"} para usar con esperar_descarga_sesion.
+
+    Ejemplo:
+        with sesion_descarga(driver, "nubelus_") as sesion:
+            webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
+            ruta = esperar_descarga_sesion(sesion, "*.xlsx")
+            df = pd.read_excel(ruta)
+    """
+    carpeta = tempfile.mkdtemp(prefix=prefijo)
+    configure_driver_download_path(driver, carpeta)
+    sesion = {"driver": driver, "carpeta": carpeta, "recibidos": [], "completadas": [], "seguimiento": seguir_descargas(driver)}
+    logging.info(f"Sesión de descarga iniciada en: {carpeta}")
+    try:
+        yield sesion
+    finally:
+        if sesion["seguimiento"] is not None:
+            eventosCDP.cancelar_suscripcion(sesion["seguimiento"])
+        try:
+            driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "default"})
+        except Exception as e:
+            logging.warning(f"No se pudo restaurar la carpeta de descargas del navegador: {e}")
+        shutil.rmtree(carpeta, ignore_errors=True)
+        logging.info(f"Sesión de descarga cerrada, carpeta eliminada: {carpeta}")
+
+def mover_descargas(carpeta_origen: str, archivos: list, carpeta_destino: str) -> list:
+    """
+    Copia a 'carpeta_destino' los archivos descargados en una carpeta temporal (sesion_descarga) y devuelve sus
+    nombres finales, en el mismo orden. Si ya hay un archivo con ese nombre se usa "nombre (n).ext", como haría Chrome.
+    Cada nombre se reserva de forma atómica, de modo que varias sesiones pueden pasar archivos a la misma carpeta
+    a la vez sin pisarse.
+    """
+    carpeta_destino = ensure_download_path(carpeta_destino)
+    nombres = []
+    for archivo in archivos:
+        origen = os.path.join(carpeta_origen, archivo)
+        base, extension = os.path.splitext(archivo)
+        numero = 0
+        while True:
+            nombre = archivo if numero == 0 else f"{base} ({numero}){extension}"
+            destino = os.path.join(carpeta_destino, nombre)
+            try:
+                os.close(os.open(destino, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                numero += 1
+                continue
+            shutil.copy2(origen, destino)
+            break
+        logging.info(f"Archivo {archivo} pasado a {destino}")
+        nombres.append(nombre)
+    return nombres
+
+def esperar_descarga_sesion(sesion: dict, patron: str = "*", timeout: int = 30) -> str:
+    """
+    Espera a la siguiente descarga completa de la sesión que cumpla el patrón y la marca como recibida,
+    de modo que llamadas sucesivas devuelven archivos distintos en el orden en que terminaron.
+
+    Si la sesión recibe los eventos de descarga de Chrome, responde en cuanto la descarga termina;
+    si no, vigila la carpeta.
+
+    Raises:
+        TimeoutError: Si no se completa ninguna descarga nueva en el tiempo indicado.
+    """
+    ruta = None
+    if sesion["seguimiento"] is not None:
+        ruta = _esperar_descarga_sesion_cdp(sesion, patron, timeout)
+    if ruta is None:
+        # Sin eventos (o no han llegado): se comprueba la carpeta
+        espera = 0 if sesion["seguimiento"] is not None else timeout
+        ruta = esperar_archivo_completo(sesion["carpeta"], patron, espera, excluir=sesion["recibidos"])
+    sesion["recibidos"].append(ruta)
+    logging.info(f"Archivo descargado: {ruta}")
+    return ruta
+
+# ------------------- SEGUIMIENTO DE DESCARGAS POR EVENTOS CDP -------------------
+
+def seguir_descargas(driver: webdriver.Chrome):
+    """
+    Empieza a escuchar los eventos de descarga de Chrome (Page/Browser.downloadWillBegin y downloadProgress).
+    Debe llamarse antes de lanzar las descargas. Devuelve None si el driver no registra eventos CDP;
+    en ese caso las esperas vigilan la carpeta.
+    """
+    if not eventosCDP.disponible(driver):
+        return None
+    return eventosCDP.suscribir(driver, "Page.download", "Browser.download")
+
+def esperar_descargas_cdp(seguimiento: dict, num_descargas: int = 1, timeout: float = 30, completadas: list = None) -> list:
+    """
+    Espera a que Chrome notifique 'num_descargas' descargas completadas.
+
+    Returns:
+        list: Descargas completadas [{"guid", "nombre", "url", "tamano", "estado"}] en orden de finalización
+        (puede tener menos elementos si se agota el tiempo).
+    """
+    completadas = completadas if completadas is not None else []
+    descargas = seguimiento.setdefault("descargas", {})
+    limite = time.monotonic() + timeout
+    while len(completadas) < num_descargas:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        evento = eventosCDP.siguiente_evento(seguimiento, restante)
+        if evento is None:
+            break
+        parametros = evento["params"]
+        descarga = descargas.setdefault(parametros.get("guid"), {
+            "guid": parametros.get("guid"), "nombre": None, "url": None, "tamano": 0, "estado": "inProgress"
+        })
+        if evento["metodo"].endswith("downloadWillBegin"):
+            descarga["nombre"] = parametros.get("suggestedFilename")
+            descarga["url"] = parametros.get("url")
+            logging.info(f"Descarga iniciada: {descarga['nombre']} ({descarga['guid']})")
+        elif evento["metodo"].endswith("downloadProgress") and descarga["estado"] == "inProgress":
+            descarga["tamano"] = parametros.get("receivedBytes", descarga["tamano"])
+            if parametros.get("state") == "completed":
+                descarga["estado"] = "completed"
+                completadas.append(descarga)
+                logging.info(f"Descarga completada: {descarga['nombre']} ({descarga['tamano']} bytes, {descarga['guid']})")
+            elif parametros.get("state") == "canceled":
+                descarga["estado"] = "canceled"
+                logging.warning(f"Descarga cancelada: {descarga['nombre']} ({descarga['guid']})")
+    return completadas
+
+def _resolver_archivo_descargado(carpeta: str, nombre: str, excluir=(), estado_previo: dict = None, espera: float = 2):
+    """
+    Devuelve la ruta del archivo en el que Chrome ha guardado la descarga 'nombre': el propio nombre o, si ya existía,
+    la variante "nombre (n).ext". Espera hasta 'espera' segundos a que el archivo termine de renombrarse.
+    Devuelve None si no aparece.
+    """
+    previos = set((estado_previo or {}).get("files", []))
+    base, extension = os.path.splitext(nombre or "")
+    limite = time.monotonic() + espera
+    while True:
+        candidatos = []
+        if nombre:
+            candidatos.append(os.path.join(carpeta, nombre))
+            candidatos += sorted(glob.glob(os.path.join(carpeta, f"{glob.escape(base)} (*){glob.escape(extension)}")))
+        for ruta in candidatos:
+            if os.path.isfile(ruta) and ruta not in excluir and os.path.basename(ruta) not in previos:
+                return ruta
+        if time.monotonic() >= limite:
+            return None
+        time.sleep(0.02)
+
+def _esperar_descarga_sesion_cdp(sesion: dict, patron: str, timeout: float):
+    """
+    Espera por eventos CDP a la siguiente descarga de la sesión cuyo nombre cumple el patrón y devuelve su ruta
+    (o None si no llega a tiempo).
+    """
+    limite = time.monotonic() + timeout
+    while True:
+        for descarga in list(sesion["completadas"]):
+            if fnmatch.fnmatch(descarga["nombre"] or "", patron):
+                ruta = _resolver_archivo_descargado(sesion["carpeta"], descarga["nombre"], excluir=sesion["recibidos"])
+                if ruta:
+                    sesion["completadas"].remove(descarga)
+                    return ruta
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return None
+        esperar_descargas_cdp(sesion["seguimiento"], len(sesion["completadas"]) + 1, restante, sesion["completadas"])
@@ -0,0 +1,328 @@
+"""
+Módulo: driverPool.py
+
+Este módulo mantiene un pool acotado de instancias de Chrome (Selenium WebDriver) precalentadas,
+para que las búsquedas NIMA no paguen el arranque completo de Chrome + chromedriver en cada petición.
+
+Funcionamiento:
+  - iniciar_pool(tamano, max_usos): crea y arranca 'tamano' drivers en paralelo (normalmente al arrancar el servidor).
+  - driver_prestado(): context manager que presta un driver del pool y lo devuelve al terminar.
+      * Antes de prestarlo se comprueba que sigue vivo (health-check); si no, se descarta y se crea otro.
+      * Al devolverlo se limpia (pestañas extra, cookies, about:blank) para que no se mezclen sesiones.
+      * Tras 'max_usos' préstamos, o si el driver ha fallado, se cierra y se sustituye por uno nuevo.
+  - cerrar_pool(): cierra todos los drivers (normalmente al parar el servidor).
+  - crear_cancelacion() / con_cancelacion() / cancelar(): permiten abortar desde otro hilo las búsquedas
+    que ya no hacen falta, cerrando los drivers que tienen prestados en ese momento.
+
+Si el pool no se ha iniciado (por ejemplo, al ejecutar un script suelto), driver_prestado() crea un driver
+nuevo y lo cierra al terminar, igual que se hacía antes.
+
+Ejemplo de uso:
+    driverPool.iniciar_pool(tamano=2)
+    with driverPool.driver_prestado() as driver:
+        webFunctions.abrir_web(driver, "https://example.com")
+    driverPool.cerrar_pool()
+"""
+
+import loggerConfig
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import eventosCDP
+import redCDP
+import webConfiguration
+
+TAMANO_POOL_POR_DEFECTO = 2
+MAX_USOS_POR_DRIVER = 25
+TIMEOUT_PRESTAMO = 120  # Segundos máximos esperando a que quede un driver libre
+
+# Las búsquedas no necesitan ver la página entera: perfil ligero (ver webConfiguration), con ventana por defecto
+PERFIL_POOL = webConfiguration.PERFIL_LIGERO
+HEADLESS_POOL = False
+
+_pool = None
+_lock = threading.Lock()
+_contexto = threading.local()
+
+
+def _crear_driver():
+    """
+    Crea un driver nuevo mediante webConfiguration.configure() con PERFIL_POOL y HEADLESS_POOL.
+    Lanza RuntimeError si no se ha podido arrancar el navegador.
+    """
+    inicio = time.perf_counter()
+    driver = webConfiguration.configure(perfil=PERFIL_POOL, headless=HEADLESS_POOL)
+    if driver is None:
+        raise RuntimeError("No se ha podido arrancar el navegador para el pool.")
+    logging.info(f"Driver creado para el pool en {time.perf_counter() - inicio:.2f}s.")
+    return driver
+
+
+def _cerrar_driver(driver):
+    """
+    Cierra un driver ignorando los errores (puede estar ya caído).
+    """
+    redCDP.olvidar_driver(driver)
+    eventosCDP.olvidar_driver(driver)
+    webConfiguration.olvidar_driver(driver)
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"Error cerrando driver del pool: {e}")
+
+
+def _driver_sano(driver) -> bool:
+    """
+    Comprueba que el driver sigue respondiendo (el navegador no se ha cerrado ni colgado).
+    """
+    try:
+        driver.current_url
+        return len(driver.window_handles) > 0
+    except Exception:
+        return False
+
+
+def _limpiar_driver(driver):
+    """
+    Deja el driver en un estado neutro entre préstamos: cierra las pestañas extra,
+    borra las cookies de todas las webs, restaura la carpeta de descargas por defecto y navega a about:blank.
+    """
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "default"})
+    driver.get("about:blank")
+    # Descarta los eventos CDP acumulados durante el préstamo
+    eventosCDP.drenar(driver)
+
+
+def iniciar_pool(tamano: int = TAMANO_POOL_POR_DEFECTO, max_usos: int = MAX_USOS_POR_DRIVER) -> None:
+    """
+    Crea el pool y arranca en paralelo 'tamano' drivers.
+    Si el pool ya estaba iniciado no hace nada.
+
+    Args:
+        tamano (int): Número máximo de drivers simultáneos (también los que se precalientan).
+        max_usos (int): Número de préstamos tras el cual un driver se recicla.
+    """
+    global _pool
+    with _lock:
+        if _pool is not None:
+            logging.info("El pool de drivers ya estaba iniciado.")
+            return
+        _pool = {
+            "libres": queue.LifoQueue(),
+            "usos": {},
+            "tamano": tamano,
+            "max_usos": max_usos,
+            "semaforo": threading.BoundedSemaphore(tamano),
+        }
+
+    inicio = time.perf_counter()
+
+    def precalentar():
+        try:
+            driver = _crear_driver()
+            _pool["usos"][driver.session_id] = 0
+            _pool["libres"].put(driver)
+        except Exception as e:
+            logging.error(f"No se pudo precalentar un driver del pool: {e}")
+
+    hilos = [threading.Thread(target=precalentar) for _ in range(tamano)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    logging.info(f"Pool de drivers iniciado con {_pool['libres'].qsize()}/{tamano} drivers en {time.perf_counter() - inicio:.2f}s.")
+
+
+def cerrar_pool() -> None:
+    """
+    Cierra todos los drivers libres del pool y lo desactiva.
+    Los drivers que estén prestados en ese momento se cierran al devolverse.
+    """
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    while True:
+        try:
+            _cerrar_driver(pool["libres"].get_nowait())
+        except queue.Empty:
+            break
+    logging.info("Pool de drivers cerrado.")
+
+
+def estado_pool() -> dict:
+    """
+    Devuelve un resumen del estado del pool (para health checks y logs).
+    """
+    pool = _pool
+    if pool is None:
+        return {"activo": False}
+    return {
+        "activo": True,
+        "tamano": pool["tamano"],
+        "libres": pool["libres"].qsize(),
+        "max_usos": pool["max_usos"],
+    }
+
+
+def _obtener_driver(pool):
+    """
+    Saca un driver sano de la cola de libres, o crea uno nuevo si no queda ninguno.
+    """
+    while True:
+        try:
+            driver = pool["libres"].get_nowait()
+        except queue.Empty:
+            driver = _crear_driver()
+            pool["usos"][driver.session_id] = 0
+            return driver
+        if _driver_sano(driver):
+            return driver
+        logging.warning("Driver del pool caído, se descarta y se sustituye.")
+        pool["usos"].pop(driver.session_id, None)
+        _cerrar_driver(driver)
+
+
+def _devolver_driver(pool, driver, fallo: bool):
+    """
+    Devuelve un driver al pool, o lo cierra si ha fallado, ha agotado sus usos o el pool se ha cerrado.
+    """
+    pool["usos"][driver.session_id] = pool["usos"].get(driver.session_id, 0) + 1
+    reciclar = (
+        pool is not _pool
+        or pool["usos"][driver.session_id] >= pool["max_usos"]
+        or (fallo and not _driver_sano(driver))
+    )
+    if not reciclar:
+        try:
+            _limpiar_driver(driver)
+            pool["libres"].put(driver)
+            return
+        except Exception as e:
+            logging.warning(f"No se pudo limpiar el driver, se recicla: {e}")
+    pool["usos"].pop(driver.session_id, None)
+    _cerrar_driver(driver)
+
+
+def crear_cancelacion() -> dict:
+    """
+    Crea un token de cancelación para un grupo de búsquedas que se ejecutan en varios hilos.
+    """
+    return {"evento": threading.Event(), "drivers": set(), "lock": threading.Lock()}
+
+
+def cancelacion_actual():
+    """
+    Devuelve el token de cancelación asociado al hilo actual (o None).
+    """
+    return getattr(_contexto, "cancelacion", None)
+
+
+@contextmanager
+def con_cancelacion(cancelacion):
+    """
+    Asocia un token de cancelación al hilo actual: los drivers prestados dentro del bloque
+    quedan registrados en el token y se cierran si se llama a cancelar(token).
+    """
+    anterior = cancelacion_actual()
+    _contexto.cancelacion = cancelacion
+    try:
+        yield cancelacion
+    finally:
+        _contexto.cancelacion = anterior
+
+
+def cancelar(cancelacion) -> None:
+    """
+    Marca el token como cancelado y cierra los drivers que tiene prestados en este momento,
+    de modo que las búsquedas que los usan terminan cuanto antes. Esos drivers se reciclan al devolverse.
+    """
+    with cancelacion["lock"]:
+        cancelacion["evento"].set()
+        drivers = list(cancelacion["drivers"])
+        cancelacion["drivers"].clear()
+    for driver in drivers:
+        logging.info("Cerrando driver de una búsqueda cancelada.")
+        _cerrar_driver(driver)
+
+
+def _registrar_en_cancelacion(cancelacion, driver):
+    with cancelacion["lock"]:
+        if cancelacion["evento"].is_set():
+            raise RuntimeError("Búsqueda cancelada antes de empezar.")
+        cancelacion["drivers"].add(driver)
+
+
+def _desregistrar_de_cancelacion(cancelacion, driver) -> bool:
+    """
+    Quita del token un driver registrado y devuelve True si cancelar() ya se lo ha llevado para cerrarlo.
+    """
+    with cancelacion["lock"]:
+        if driver in cancelacion["drivers"]:
+            cancelacion["drivers"].discard(driver)
+            return False
+        return cancelacion["evento"].is_set()
+
+
+@contextmanager
+def driver_prestado(timeout: int = TIMEOUT_PRESTAMO):
+    """
+    Presta un driver del pool durante el bloque 'with' y lo devuelve (o recicla) al salir.
+    Si el pool no está iniciado, crea un driver nuevo y lo cierra al salir.
+
+    Args:
+        timeout (int): Segundos máximos esperando a que haya un hueco libre en el pool.
+
+    Raises:
+        TimeoutError: Si el pool está completo durante más de 'timeout' segundos.
+        RuntimeError: Si no se ha podido arrancar el navegador.
+    """
+    cancelacion = cancelacion_actual()
+    if cancelacion is not None and cancelacion["evento"].is_set():
+        raise RuntimeError("Búsqueda cancelada antes de empezar.")
+
+    pool = _pool
+    if pool is None:
+        driver = _crear_driver()
+        registrado = False
+        try:
+            if cancelacion is not None:
+                # Si se cancela mientras arranca Chrome, el registro falla y el driver se cierra aquí
+                _registrar_en_cancelacion(cancelacion, driver)
+                registrado = True
+            yield driver
+        finally:
+            if not registrado or not _desregistrar_de_cancelacion(cancelacion, driver):
+                _cerrar_driver(driver)
+        return
+
+    if not pool["semaforo"].acquire(timeout=timeout):
+        raise TimeoutError(f"No hay drivers libres en el pool tras {timeout}s.")
+    try:
+        driver = _obtener_driver(pool)
+        fallo = False
+        registrado = False
+        try:
+            if cancelacion is not None:
+                _registrar_en_cancelacion(cancelacion, driver)
+                registrado = True
+            yield driver
+        except BaseException:
+            fallo = True
+            raise
+        finally:
+            if registrado and _desregistrar_de_cancelacion(cancelacion, driver):
+                fallo = True
+            _devolver_driver(pool, driver, fallo)
+    finally:
+        pool["semaforo"].release()
@@ -0,0 +1,521 @@
+"""
+Módulo: envioCertificados.py
+
+Este módulo es el motor común de envío de notificaciones (XML E3L) a la sede de MITECO con certificado,
+usado por mainCertificados.py y mainCertificadosMetalls.py. Lo que cambia entre ambos flujos se describe en un
+perfil de envío (PERFILES), de modo que la reutilización de sesión, los tiempos por paso y el resto de mejoras
+se implementan una sola vez.
+
+Cada perfil es un diccionario con:
+  - "nombre": nombre del flujo (para el log).
+  - "info_certs": archivo data/informacionCerts*.txt con el certificado y los datos del formulario.
+  - "pasos_previos": función (driver, contexto) con los pasos antes de rellenar el formulario, o None
+    (p. ej. presentar_en_representacion).
+  - "nif": función (subcarpeta) que devuelve el NIF del remitente, o None.
+  - "adjuntar_pdf": si se adjunta el PDF de la subcarpeta y se mueve a trash al terminar.
+  - "notificar_contratos": si antes de enviar se marcan como notificados los contratos en Nubelus.
+
+Flujo general:
+  1. Procesa todas las subcarpetas dentro de la carpeta /input.
+  2. En cada subcarpeta, procesa todos los archivos XML y mueve el XML procesado a /trash/{nombre_productor}.
+     Todos los XML se envían con la misma sesión de navegador: el certificado solo se vuelve a pedir si la sesión
+     de MITECO caduca, y tras cada envío se vuelve directamente al formulario (URL_FORMULARIO_MITECO).
+     Antes de abrir el navegador, los XML de todas las subcarpetas se preparan en segundo plano (HILOS_PREPARACION):
+     se validan, se actualizan sus fechas y se extraen sus metadatos E3L, para que el bucle de envío solo suba y firme.
+  3. Si el perfil adjunta PDF, cuando no quedan XML mueve el PDF de la subcarpeta a la carpeta del último
+     {nombre_productor} en /trash.
+
+Ejemplo de uso:
+    envioCertificados.main(envioCertificados.PERFILES["metalls"])
+"""
+
+import loggerConfig
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pandas as pd
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+import autoFirmaHandler
+import certHandler
+import excelFunctions
+import extraerXMLE3L
+import funcionesNubelus
+import webConfiguration
+import webFunctions
+from config import BASE_DIR, cargar_variables
+
+# Variables de configuración
+WEB_MITECO = (
+    "https://sede.miteco.gob.es/portal/site/seMITECO/login?"
+    "urlLoginRedirect=L3BvcnRhbC9zaXRlL3NlTUlURUNPL3BvcnRsZXRfYnVzP2lkX3Byb2NlZGltaWVudG89NzM2"
+    "JmlkZW50aWZpY2Fkb3JfcGFzbz1QUkVJTklDSU8mc3ViX29yZ2Fubz0xMSZwcmV2aW9fbG9naW49MQ=="
+)
+# Formulario de envío al que redirige WEB_MITECO tras iniciar sesión
+URL_FORMULARIO_MITECO = (
+    "https://sede.miteco.gob.es/portal/site/seMITECO/portlet_bus?"
+    "id_procedimiento=736&identificador_paso=PREINICIO&sub_organo=11&previo_login=1"
+)
+URL_CONTRATOS_TRATAMIENTOS = "https://portal.nubelus.es/?clave=waster2_gestionContratosTratamiento"
+INPUT_DIR = os.path.join(BASE_DIR, "input")
+EXCEL_INPUT_DIR = os.path.join(BASE_DIR, "entrada", "excel_input.xls")  # Ruta del Excel de entrada
+TRASH_DIR = os.path.join(BASE_DIR, "trash")
+
+# Hilos que preparan los XML (validación, fechas y metadatos) mientras el navegador envía
+HILOS_PREPARACION = 4
+
+# XML ya preparados: ruta -> {"firma", "fecha", "metadatos"}
+_preparados = {}
+_lock_preparados = threading.Lock()
+
+def get_pdf_file_from_folder(folder_path):
+    """
+    Busca el primer archivo PDF en la carpeta indicada.
+    Si no encuentra ninguno, devuelve None.
+    """
+    for f in os.listdir(folder_path):
+        if f.lower().endswith('.pdf'):
+            logging.info(f"Archivo PDF encontrado: {f}")
+            return os.path.join(folder_path, f)
+    logging.error(f"No se encontró ningún archivo PDF en la carpeta '{folder_path}'.")
+    return None
+
+def actualizar_fechas_xml(xml_path):
+    """
+    Modifica las fechas del XML en las etiquetas <prepared> y atributos NTDate, NTStartDate, NTEndDate de <wasteNT>.
+    Procesa el archivo como texto plano, sin usar ElementTree.
+    """
+    hoy = datetime.now()
+
+    with open(xml_path, "r", encoding="utf-8") as f:
+        xml_text = f.read()
+
+    xml_text = actualizar_fechas_texto(xml_text, hoy)
+
+    with open(xml_path, "w", encoding="utf-8") as f:
+        f.write(xml_text)
+    return xml_path
+
+def actualizar_fechas_texto(xml_text, hoy=None):
+    """
+    Devuelve el texto del XML con las fechas de <prepared> y de <wasteNT> actualizadas a 'hoy'
+    y la raíz <ns2:e3l> con los namespaces requeridos.
+    """
+    hoy = hoy or datetime.now()
+    hoy_str = hoy.strftime("%Y-%m-%d")
+    hoy_iso = hoy.strftime("%Y-%m-%dT%H:%M:%S")
+    start_date = (hoy + timedelta(days=11)).strftime("%Y-%m-%d")
+    end_date = (hoy + timedelta(days=3*365)).strftime("%Y-%m-%d")  # Aproximación de 3 años
+
+    # Reemplazar <prepared>...</prepared>
+    xml_text = re.sub(r"<prepared>.*?</prepared>", f"<prepared>{hoy_iso}</prepared>", xml_text, flags=re.DOTALL)
+
+    # Reemplazar atributos en <wasteNT ...>
+    def replace_nt_attrs(match):
+        tag = match.group(0)
+        tag = re.sub(r'NTDate="[^"]*"', f'NTDate="{hoy_str}"', tag)
+        tag = re.sub(r'NTStartDate="[^"]*"', f'NTStartDate="{start_date}"', tag)
+        tag = re.sub(r'NTEndDate="[^"]*"', f'NTEndDate="{end_date}"', tag)
+        return tag
+
+    xml_text = re.sub(r"<wasteNT\b[^>]*>", replace_nt_attrs, xml_text)
+
+    # Asegurar que la raíz sea <ns2:e3l> con los namespaces requeridos
+    ns2_tag = '<ns2:e3l xmlns:ns2="e3l://eterproject.org/3.0/e3l" xmlns:ns3="e3l://eterproject.org/3.0/documentation" schemaVersion="3.0">'
+    xml_text = re.sub(r"<e3l\b[^>]*>", ns2_tag, xml_text, count=1)
+    xml_text = re.sub(r"<ns2:e3l\b[^>]*>", ns2_tag, xml_text, count=1)
+    return xml_text
+
+def guardar_regage_json(data, output_dir):
+    """
+    Guarda el contenido en un archivo regage.json en output_dir.
+    Si ya existe, crea regage_1.json, regage_2.json, etc. para no sobrescribir.
+    """
+    base_name = "regage"
+    ext = ".json"
+    filename = base_name + ext
+    counter = 1
+    full_path = os.path.join(output_dir, filename)
+    while os.path.exists(full_path):
+        filename = f"{base_name}_{counter}{ext}"
+        full_path = os.path.join(output_dir, filename)
+        counter += 1
+    with open(full_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return full_path
+
+def mover_a_trash(origen, nombre_productor):
+    """
+    Mueve un archivo a la carpeta /trash/{nombre_productor}.
+    """
+    destino_dir = os.path.join(TRASH_DIR, nombre_productor)
+    os.makedirs(destino_dir, exist_ok=True)
+    destino = os.path.join(destino_dir, os.path.basename(origen))
+    shutil.move(origen, destino)
+    logging.info(f"Archivo '{os.path.basename(origen)}' movido a '{destino_dir}'.")
+
+def rellenar_formulario(driver, info):
+    """
+    Rellena el formulario principal de la web de MITECO con los datos del certificado.
+    """
+    webFunctions.escribir_en_elemento_por_id(driver, "id_direccion", info.get("DIRECCION"))
+    webFunctions.seleccionar_elemento_por_id(driver, "id_pais", info.get("PAIS"))
+    webFunctions.seleccionar_elemento_por_id(driver, "id_provincia", info.get("PROVINCIA"))
+    webFunctions.seleccionar_elemento_por_id(driver, "id_municipio", info.get("MUNICIPIO"))
+    webFunctions.escribir_en_elemento_por_id(driver, "id_codigo_postal", info.get("CODIGO_POSTAL"))
+    webFunctions.escribir_en_elemento_por_id(driver, "id_correo_electronico", info.get("CORREO_ELECTRONICO"))
+
+def autenticar_y_seleccionar_certificado(driver, info):
+    """
+    Realiza el proceso de autenticación y selección de certificado en la web de MITECO.
+    """
+    webFunctions.clickar_boton_por_value(driver, "acceder")
+    webFunctions.clickar_boton_por_texto(driver, "Acceso DNIe / Certificado electrónico")
+    certHandler.seleccionar_certificado_chrome(info.get("NOMBRE_CERT"))
+
+# ------------------- PREPARACIÓN DE LOS XML -------------------
+
+def _firma_archivo(ruta):
+    datos = os.stat(ruta)
+    return datos.st_mtime_ns, datos.st_size
+
+def preparar_xml(xml_path):
+    """
+    Deja un XML listo para enviar: lo valida, actualiza sus fechas (en una sola lectura y escritura)
+    y extrae sus metadatos E3L. El resultado se guarda en caché mientras el archivo no cambie y sea del mismo día.
+
+    Returns:
+        dict: {"firma", "fecha", "metadatos"}.
+
+    Raises:
+        ValueError: Si el XML no se puede leer o no es una notificación E3L (sin <wasteNT>).
+    """
+    hoy = datetime.now()
+    with _lock_preparados:
+        preparado = _preparados.get(xml_path)
+    if preparado and preparado["fecha"] == hoy.date() and preparado["firma"] == _firma_archivo(xml_path):
+        return preparado
+
+    with open(xml_path, "r", encoding="utf-8") as f:
+        xml_text = actualizar_fechas_texto(f.read(), hoy)
+    try:
+        root = ET.fromstring(xml_text)
+    except ET.ParseError as e:
+        raise ValueError(f"XML mal formado: {e}")
+    if root.find(".//wasteNT") is None:
+        raise ValueError("El XML no contiene <wasteNT>.")
+    metadatos = extraerXMLE3L.extraer_metadatos(root)
+    vacios = [campo for campo, valor in metadatos.items() if not valor]
+    if vacios:
+        logging.warning(f"{os.path.basename(xml_path)} no tiene {', '.join(vacios)}.")
+
+    with open(xml_path, "w", encoding="utf-8") as f:
+        f.write(xml_text)
+    preparado = {"firma": _firma_archivo(xml_path), "fecha": hoy.date(), "metadatos": metadatos}
+    with _lock_preparados:
+        _preparados[xml_path] = preparado
+    return preparado
+
+def _preparar_o_error(xml_path):
+    try:
+        return preparar_xml(xml_path)
+    except Exception as e:
+        logging.error(f"No se pudo preparar '{os.path.basename(xml_path)}': {e}")
+        return {"error": str(e)}
+
+def listar_xml(subdir):
+    """
+    Devuelve las rutas de los XML de una subcarpeta, ordenadas.
+    """
+    return sorted([os.path.join(subdir, f) for f in os.listdir(subdir) if f.lower().endswith('.xml')])
+
+def preparar_subcarpeta(subdir, executor):
+    """
+    Prepara en el pool todos los XML de la subcarpeta. Devuelve {ruta: futuro} (cada futuro da el resultado
+    de preparar_xml o {"error"}).
+    """
+    return {xml_path: executor.submit(_preparar_o_error, xml_path) for xml_path in listar_xml(subdir)}
+
+# ------------------- PERFILES DE ENVÍO -------------------
+
+def presentar_en_representacion(driver, contexto):
+    """
+    Indica que la solicitud se presenta en representación del NIF remitente de la subcarpeta.
+    """
+    webFunctions.clickar_boton_por_id(driver, "id_presenta_solicitud_3")
+    webFunctions.escribir_en_elemento_por_id(driver, "id_nif_remitente", contexto["nif"])
+    webFunctions.clickar_boton_por_id(driver, "id_btnOtroSol")
+    time.sleep(1)
+
+def nif_de_subcarpeta(subdir):
+    """
+    Devuelve el NIF del remitente: la primera palabra del nombre de la subcarpeta.
+    """
+    return os.path.basename(subdir).split()[0]
+
+PERFILES = {
+    "estandar": {
+        "nombre": "estandar",
+        "info_certs": os.path.join(BASE_DIR, "data", "informacionCerts.txt"),
+        "pasos_previos": None,
+        "nif": None,
+        "adjuntar_pdf": True,
+        "notificar_contratos": True,
+    },
+    "metalls": {
+        "nombre": "metalls",
+        "info_certs": os.path.join(BASE_DIR, "data", "informacionCertsMetalls.txt"),
+        "pasos_previos": presentar_en_representacion,
+        "nif": nif_de_subcarpeta,
+        "adjuntar_pdf": False,
+        "notificar_contratos": False,
+    },
+}
+
+# ------------------- SESIÓN DE ENVÍO -------------------
+
+@contextmanager
+def medir(tiempos, paso):
+    """
+    Suma a tiempos[paso] los segundos que tarda el bloque 'with'.
+    """
+    inicio = time.monotonic()
+    try:
+        yield
+    finally:
+        tiempos[paso] = tiempos.get(paso, 0) + time.monotonic() - inicio
+
+def nueva_sesion(perfil):
+    """
+    Devuelve una sesión de envío para el perfil (con sus datos de certificado cargados);
+    el navegador se abre con el primer XML.
+    """
+    return {"perfil": perfil, "info": cargar_variables(perfil["info_certs"]), "driver": None, "envios": 0}
+
+def cerrar_sesion(sesion):
+    """
+    Cierra el navegador de la sesión (si lo hay).
+    """
+    if sesion["driver"] is not None:
+        try:
+            sesion["driver"].quit()
+        except Exception as e_quit:
+            logging.error(f"Error cerrando driver: {e_quit}")
+        sesion["driver"] = None
+
+def abrir_formulario(sesion, tiempos):
+    """
+    Deja el navegador de la sesión en el formulario de envío de MITECO.
+    Abre el navegador si aún no existe y se autentica con el certificado solo si MITECO pide iniciar sesión
+    (primera vez o sesión caducada).
+    """
+    if sesion["driver"] is None:
+        with medir(tiempos, "arranque"):
+            # El envío no espera descargas ni peticiones por eventos CDP
+            sesion["driver"] = webConfiguration.configure(eventos_cdp=False)
+        if sesion["driver"] is None:
+            raise RuntimeError("No se pudo iniciar el navegador.")
+    driver = sesion["driver"]
+
+    with medir(tiempos, "navegacion"):
+        webFunctions.abrir_web(driver, URL_FORMULARIO_MITECO)
+        WebDriverWait(driver, 15).until(EC.any_of(
+            EC.presence_of_element_located((By.ID, "wrapper")),
+            EC.presence_of_element_located((By.XPATH, "//*[@value='acceder']")),
+        ))
+    if not driver.find_elements(By.XPATH, "//*[@value='acceder']"):
+        return
+
+    logging.info("La sesión de MITECO no está iniciada o ha caducado, se inicia con el certificado.")
+    with medir(tiempos, "autenticacion"):
+        webFunctions.abrir_web(driver, WEB_MITECO)
+        webFunctions.esperar_elemento_por_id(driver, "breadcrumb")
+        autenticar_y_seleccionar_certificado(driver, sesion["info"])
+        webFunctions.esperar_elemento_por_id(driver, "wrapper", timeout=15)
+
+def procesar_xml(xml_path, sesion, contexto):
+    """
+    Procesa un archivo XML: automatiza el flujo web, ejecuta la firma y extrae la información relevante.
+    Reutiliza el navegador ya autenticado de la sesión y lo deja abierto para el siguiente XML.
+    'contexto' tiene los datos de la subcarpeta que usa el perfil: {"nif", "pdf"} (función que devuelve el PDF)
+    y los XML en preparación ("preparados", ver preparar_subcarpeta).
+    Si ocurre cualquier error, se informa y se cierra el driver actual (el siguiente XML abre uno nuevo).
+    """
+    logging.info(f"--- Procesando archivo XML: {os.path.basename(xml_path)} ---")
+    perfil = sesion["perfil"]
+    tiempos = {}
+    inicio = time.monotonic()
+    with medir(tiempos, "preparacion"):
+        futuro = contexto.get("preparados", {}).get(xml_path)
+        preparado = futuro.result() if futuro else _preparar_o_error(xml_path)
+        if "error" not in preparado and preparado["fecha"] != datetime.now().date():
+            # Preparado otro día: se actualizan de nuevo las fechas
+            preparado = _preparar_o_error(xml_path)
+    if "error" in preparado:
+        # XML no válido: no se envía y la sesión sigue abierta para el siguiente
+        return None
+
+    try:
+        abrir_formulario(sesion, tiempos)
+        driver = sesion["driver"]
+
+        with medir(tiempos, "formulario"):
+            if perfil["pasos_previos"]:
+                perfil["pasos_previos"](driver, contexto)
+            rellenar_formulario(driver, sesion["info"])
+            webFunctions.clickar_boton_por_id(driver, "btnForm")
+            time.sleep(5)
+
+        with medir(tiempos, "envio"):
+            webFunctions.clickar_boton_por_id(driver, "tipoEnvioNtA")
+            webFunctions.escribir_en_elemento_por_id(driver, "file", xml_path)
+
+            webFunctions.clickar_boton_por_clase(driver, "loginBtn")
+            webFunctions.clickar_boton_por_texto(driver, "Continuar")
+            if perfil["adjuntar_pdf"]:
+                pdf_file = contexto["pdf"]()
+                webFunctions.escribir_en_elemento_por_id(driver, "idFichero", pdf_file)
+            webFunctions.clickar_boton_por_id(driver, "btnForm")
+            webFunctions.clickar_boton_por_id(driver, "bSiguiente")
+
+        with medir(tiempos, "firma"):
+            webFunctions.clickar_boton_por_id(driver, "idFirmarRegistrar")
+            time.sleep(2)
+            webFunctions.clickar_boton_por_id(driver, "idFirmarRegistrar")
+
+            autoFirmaHandler.firmar_en_autofirma()
+
+            regage = webFunctions.obtener_texto_por_parte(driver, "Descargar Justificante:").split()[-1]
+        logging.info(f"Código de justificante obtenido: {regage}")
+
+        json_result = extraerXMLE3L.registrar_envio(preparado["metadatos"], regage)
+        logging.info(f"Información extraída del XML: {json_result}")
+        sesion["envios"] += 1
+
+        return json_result
+
+    except Exception as e:
+        logging.error(f"Error procesando '{os.path.basename(xml_path)}': {e}", exc_info=True)
+        cerrar_sesion(sesion)
+    finally:
+        detalle = ", ".join(f"{paso} {segundos:.1f}s" for paso, segundos in tiempos.items())
+        logging.info(f"Tiempos de {os.path.basename(xml_path)}: total {time.monotonic() - inicio:.1f}s ({detalle})")
+
+# ------------------- RECORRIDO DE /input -------------------
+
+def procesar_archivos_xml_en_subcarpetas(perfil):
+    """
+    Procesa todas las subcarpetas dentro de INPUT_DIR con el perfil de envío indicado.
+    En cada subcarpeta, procesa los XML y mueve los archivos igual que antes.
+    Al terminar con una subcarpeta, pasa a la siguiente.
+    """
+    subcarpetas = [os.path.join(INPUT_DIR, d) for d in os.listdir(INPUT_DIR) if os.path.isdir(os.path.join(INPUT_DIR, d))]
+    if not subcarpetas:
+        logging.info("No se encontraron subcarpetas en la carpeta 'input'.")
+        return
+
+    sesion = nueva_sesion(perfil)
+    # Todas las subcarpetas se preparan en segundo plano: la primera está lista casi enseguida
+    # y las demás se preparan mientras el navegador envía
+    with ThreadPoolExecutor(max_workers=HILOS_PREPARACION, thread_name_prefix="preparar-xml") as executor:
+        preparados = {subdir: preparar_subcarpeta(subdir, executor) for subdir in subcarpetas}
+        try:
+            for subdir in subcarpetas:
+                procesar_subcarpeta(subdir, sesion, preparados[subdir])
+        finally:
+            cerrar_sesion(sesion)
+
+    logging.info(f"Proceso completado. Todas las subcarpetas procesadas ({sesion['envios']} envíos, perfil {perfil['nombre']}).")
+
+def procesar_subcarpeta(subdir, sesion, preparados=None):
+    """
+    Procesa los XML de una subcarpeta de INPUT_DIR con la sesión de envío indicada.
+    'preparados' son los XML ya en preparación (preparar_subcarpeta); los que no estén se preparan al enviarlos.
+    """
+    perfil = sesion["perfil"]
+    logging.info(f"Procesando subcarpeta: {os.path.basename(subdir)}")
+    xml_files = listar_xml(subdir)
+    pdf_files = [os.path.join(subdir, f) for f in os.listdir(subdir) if f.lower().endswith('.pdf')]
+    ultimo_nombre_productor = None
+
+    def get_pdf_file_sub():
+        for f in pdf_files:
+            if os.path.exists(f):
+                logging.info(f"Archivo PDF encontrado: {f}")
+                return f
+        logging.error(f"No se encontró ningún archivo PDF en la carpeta '{subdir}'.")
+        return None
+
+    contexto = {
+        "nif": perfil["nif"](subdir) if perfil["nif"] else None,
+        "pdf": get_pdf_file_sub,
+        "preparados": preparados or {},
+    }
+
+    while xml_files:
+        procesados_esta_vuelta = []
+        for xml_file in xml_files:
+            try:
+                resultado = procesar_xml(xml_file, sesion, contexto)
+                if resultado is None:
+                    continue
+                nombre_productor = resultado.get("nombre_productor", "desconocido").replace(" ", "_")
+                mover_a_trash(xml_file, nombre_productor)
+                ultimo_nombre_productor = nombre_productor
+                procesados_esta_vuelta.append(xml_file)
+            except Exception as e:
+                logging.error(f"Error procesando '{os.path.basename(xml_file)}': {e}")
+
+        xml_files = listar_xml(subdir)
+        if not procesados_esta_vuelta and xml_files:
+            logging.error(f"No se ha podido procesar ninguno de los archivos XML restantes en {subdir}.")
+            break
+
+    # Cuando no quedan XML, mover el PDF a la carpeta del último productor
+    if perfil["adjuntar_pdf"]:
+        pdf_file = get_pdf_file_sub()
+        if ultimo_nombre_productor and pdf_file and os.path.exists(pdf_file):
+            logging.info(f"Moviendo PDF '{os.path.basename(pdf_file)}' a la carpeta '{ultimo_nombre_productor}' en trash.")
+            mover_a_trash(pdf_file, ultimo_nombre_productor)
+    logging.info(f"Procesamiento completado para subcarpeta: {os.path.basename(subdir)}")
+
+def notificar_contratos_tratamiento():
+    excel_input = pd.read_excel(EXCEL_INPUT_DIR)
+    fila = excel_input.iloc[0]  # Obtiene la primera fila del DataFrame
+    # Configura el navegador de Selenium
+    driver = webConfiguration.configure()
+    # Inicia sesión en Nubelus
+    funcionesNubelus.iniciar_sesion(driver)
+    webFunctions.abrir_web(driver, URL_CONTRATOS_TRATAMIENTOS)
+    
+    # Filtra la busqueda por el nombre del cliente
+    webFunctions.clickar_boton_por_on_click(driver, "filtrar()")
+    webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "waster2_gestionContratosTratamiento__fDenominacion_origen", fila.get("nombre_recogida"))
+    webFunctions.clickar_boton_por_clase(driver, "miBoton.buscar")
+    # Edita las notificaciones de peligrosos a: Sí
+    excelFunctions.editar_notificaciones_peligrosos(driver)
+    logging.info("Notificaciones de peligrosos editadas correctamente.")
+    driver.quit()
+
+def main(perfil):
+    """
+    Marca como notificados los contratos en Nubelus (si el perfil lo pide) e inicia el procesamiento
+    de los archivos XML en todas las subcarpetas de input.
+    """
+    if perfil["notificar_contratos"]:
+        notificar_contratos_tratamiento()
+        logging.info("Notificaciones de contratos de tratamiento editadas correctamente.")
+
+    procesar_archivos_xml_en_subcarpetas(perfil)
+    logging.info("Todos los procesos han finalizado correctamente.")
@@ -0,0 +1,153 @@
+"""
+Módulo: eventosCDP.py
+
+Este módulo reparte los eventos de Chrome DevTools (CDP) de un driver entre varios suscriptores.
+
+Selenium no entrega los eventos CDP de forma directa: Chrome los deja en el log "performance"
+(capability goog:loggingPrefs, ver webConfiguration.configure) y driver.get_log("performance") los devuelve
+y los borra. Si cada función leyera el log por su cuenta se robarían los eventos unas a otras, así que
+este módulo es el único que lo lee (drenar) y reparte cada evento a las suscripciones cuyo prefijo coincide.
+
+Funciones principales:
+  - disponible(driver): indica si el driver tiene activado el log de eventos CDP.
+  - suscribir(driver, "Page.download", ...): crea una suscripción que recibe los eventos a partir de ese momento.
+  - siguiente_evento(suscripcion, timeout): espera el siguiente evento de la suscripción (sondeo cada INTERVALO_SONDEO).
+  - cancelar_suscripcion(suscripcion) / olvidar_driver(driver).
+  - descartar_sin_suscripciones(driver): vacía el log cuando nadie está suscrito, para que no crezca sin límite.
+
+Ejemplo de uso:
+    suscripcion = eventosCDP.suscribir(driver, "Page.downloadProgress")
+    evento = eventosCDP.siguiente_evento(suscripcion, timeout=30)
+    eventosCDP.cancelar_suscripcion(suscripcion)
+"""
+
+import loggerConfig
+import json
+import logging
+import queue
+import threading
+import time
+
+# Segundos entre lecturas del log de eventos mientras se espera un evento
+INTERVALO_SONDEO = 0.05
+
+_despachadores = {}
+_lock = threading.Lock()
+
+
+def _despachador(driver) -> dict:
+    """
+    Devuelve (creándolo si hace falta) el estado de reparto de eventos del driver.
+    """
+    with _lock:
+        despachador = _despachadores.get(driver.session_id)
+        if despachador is None:
+            despachador = {"lock": threading.Lock(), "suscripciones": [], "disponible": None}
+            _despachadores[driver.session_id] = despachador
+        return despachador
+
+
+def drenar(driver) -> int:
+    """
+    Lee todos los eventos pendientes del log "performance" del driver y los reparte entre sus suscripciones.
+    Devuelve el número de entradas leídas (0 si el log no está disponible).
+    """
+    despachador = _despachador(driver)
+    with despachador["lock"]:
+        try:
+            entradas = driver.get_log("performance")
+        except Exception as e:
+            if despachador["disponible"] is not False:
+                logging.info(f"Eventos CDP no disponibles en este driver: {e}")
+            despachador["disponible"] = False
+            return 0
+        despachador["disponible"] = True
+
+        for entrada in entradas:
+            try:
+                mensaje = json.loads(entrada["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            metodo = mensaje.get("method", "")
+            for suscripcion in despachador["suscripciones"]:
+                if metodo.startswith(suscripcion["prefijos"]):
+                    suscripcion["cola"].put({
+                        "metodo": metodo,
+                        "params": mensaje.get("params", {}),
+                        "marca": entrada.get("timestamp"),
+                    })
+        return len(entradas)
+
+
+def disponible(driver) -> bool:
+    """
+    Indica si el driver registra los eventos CDP (log "performance" activado).
+    """
+    despachador = _despachador(driver)
+    if despachador["disponible"] is None:
+        drenar(driver)
+    return bool(despachador["disponible"])
+
+
+def suscribir(driver, *prefijos: str) -> dict:
+    """
+    Crea una suscripción a los eventos cuyo método empieza por alguno de los prefijos
+    (p. ej. "Page.download" o "Network.responseReceived"). Solo recibe los eventos posteriores a la suscripción:
+    los pendientes se reparten antes a las suscripciones que ya existían.
+    """
+    despachador = _despachador(driver)
+    drenar(driver)
+    suscripcion = {"driver": driver, "prefijos": tuple(prefijos), "cola": queue.Queue()}
+    with despachador["lock"]:
+        despachador["suscripciones"].append(suscripcion)
+    return suscripcion
+
+
+def cancelar_suscripcion(suscripcion: dict) -> None:
+    """
+    Deja de repartir eventos a la suscripción.
+    """
+    despachador = _despachador(suscripcion["driver"])
+    with despachador["lock"]:
+        if suscripcion in despachador["suscripciones"]:
+            despachador["suscripciones"].remove(suscripcion)
+
+
+def siguiente_evento(suscripcion: dict, timeout: float):
+    """
+    Devuelve el siguiente evento de la suscripción ({"metodo", "params", "marca"}),
+    o None si no llega ninguno en 'timeout' segundos.
+    """
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            return suscripcion["cola"].get_nowait()
+        except queue.Empty:
+            pass
+        drenar(suscripcion["driver"])
+        try:
+            restante = limite - time.monotonic()
+            return suscripcion["cola"].get(timeout=max(0, min(INTERVALO_SONDEO, restante)))
+        except queue.Empty:
+            if time.monotonic() >= limite:
+                return None
+
+
+def descartar_sin_suscripciones(driver) -> None:
+    """
+    Vacía el log "performance" del driver si no tiene ninguna suscripción.
+    Chrome guarda los eventos hasta que alguien los lee: en sesiones largas que no esperan eventos
+    (p. ej. varios envíos con el mismo navegador) el log crecería sin límite.
+    """
+    despachador = _despachador(driver)
+    if despachador["disponible"] is False or despachador["suscripciones"]:
+        return
+    drenar(driver)
+
+
+def olvidar_driver(driver) -> None:
+    """
+    Elimina el estado de reparto de un driver que se va a cerrar.
+    """
+    with _lock:
+        _despachadores.pop(getattr(driver, "session_id", None), None)
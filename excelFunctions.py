@@ -29,6 +29,7 @@ Ejemplo de uso:
 """
 
 import glob
+import io
 import os
 import time
 import pandas as pd
@@ -45,6 +46,7 @@ from selenium.webdriver.common.keys import Keys
 import shutil
 import funcionesNubelus
 import downloadFunctions
+import vigilanteCarpetas
 
 # Directorio donde se espera la descarga de archivos Excel
 DOWNLOAD_DIR = os.path.join(os.path.expanduser("~"), "Downloads")
@@ -126,16 +128,7 @@ def _esperar_descarga(carpeta: str, extension: str = ".xlsx", timeout: int = 30)
     Raises:
         TimeoutError: Si no se encuentra ningún archivo descargado en el tiempo indicado.
     """
-    tiempo_inicio = time.time()
-    while time.time() - tiempo_inicio < timeout:
-        archivos = glob.glob(os.path.join(carpeta, f"*{extension}"))
-        if archivos:
-            # Se aseguran de que el archivo no esté en proceso de descarga (sin extensión .crdownload)
-            finalizados = [f for f in archivos if not f.endswith('.crdownload')]
-            if finalizados:
-                return finalizados[0]
-        time.sleep(1)
-    raise TimeoutError("Descarga no completada en el tiempo esperado.")
+    return downloadFunctions.esperar_archivo_completo(carpeta, f"*{extension}", timeout)
 
 
 def _nif_no_encontrados_en_nubelus(cif_nubelus, datos_recogidas: pd.DataFrame) -> pd.DataFrame:
@@ -265,65 +258,45 @@ def añadir_empresa(driver: webdriver.Chrome, fila) -> None:
         webFunctions.esperar_elemento(driver, By.ID, "pDenominacion", timeout=10)
         webFunctions.escribir_en_elemento_por_id(driver, "pDenominacion", fila["nombre_recogida"])
         
-        # 2. Validar y completar el campo NIF
+        # 2-3. Completar el NIF y la forma fiscal: Física si el último carácter del CIF es letra, Jurídica si el primero es letra
         # validar_nif(fila["cif_recogida"])  # Validar el formato del NIF
-        webFunctions.escribir_en_elemento_por_name(driver, "pNif", fila["cif_recogida"])
-        
-        # 3. Completar el campo de forma fiscal: Física si el último carácter del CIF es letra, Jurídica si el primero es letra
         cif = str(fila["cif_recogida"]).strip()
         forma_fiscal = forma_fiscal_por_cif(cif)
-        webFunctions.seleccionar_elemento_por_nombre(driver, "pForma_fiscal", forma_fiscal)
+        webFunctions.rellenar_formulario(driver, {"pNif": fila["cif_recogida"], "pForma_fiscal": forma_fiscal})
 
-        time.sleep(1)
+        # Espera a que la web active los campos de la forma fiscal elegida
+        webFunctions.esperar_ajax_inactivo(driver)
         
         # 4. Completar el campo de Forma Jurídica y Nombre Fiscal si es Jurídica
+        campos = {}
         if forma_fiscal == "Jurídica":
             forma_juridica = forma_juridica_empresa(fila["cif_recogida"])
-            time.sleep(1)  # Espera para que el campo se active
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_forma_juridica" ,forma_juridica)
-            time.sleep(0.5)
             webFunctions.escribir_en_elemento_por_name_y_enter(driver, "pNombre_fiscal", fila["nombre_recogida"])
 
         # 4. Completar el campo Nombre y Apellidos si es una persona física
         elif forma_fiscal == "Física":
             nombre, *apellidos = str(fila["nombre_recogida"]).strip().split()
-            webFunctions.escribir_en_elemento_por_name(driver, "pNombre", nombre)
-            webFunctions.escribir_en_elemento_por_name(driver, "pApellidos", " ".join(apellidos))
-
-        # 5. Completar el campo Domicilio
-        webFunctions.escribir_en_elemento_por_name(driver, "pDomicilio", fila["direccion_recogida"])
-        print("antes de municipio")
-        # 6. Completar el campo Municipio
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_ine_municipio", str(fila["poblacion_recogida"]))
-        print("después de municipio")
-        # 7. Completar el campo Provincia
-        webFunctions.escribir_en_elemento_por_name(driver, "pPoblacion", fila["provincia_recogida"])
-        
-        # 8. Completar el campo CP
-        webFunctions.escribir_en_elemento_por_name(driver, "pCodigoPostal", str(fila["cp_recogida"]))
-        
-        # 9. Completar el campo Teléfono
-        webFunctions.escribir_en_elemento_por_name(driver, "pTelefono", str(fila["telf_recogida"]))
-        
-        # 10. Completar el campo Email
-        webFunctions.escribir_en_elemento_por_name(driver, "pEmail", fila["email_recogida"])
-
-        # 11. Añadir NIMA
-        webFunctions.escribir_en_elemento_por_name(driver, "pNima", str(fila.get("nima_codigo", "")))
-
-        # 12. Completar el campo Autorización
-        webFunctions.escribir_en_elemento_por_name(driver, "pAutorizacion_medioambiental", str(fila.get("nima_cod_peligrosos", "")))
-
-        # 13. Añadir tipo
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_ema", "P02")
-
-        # 14. Confirmar la adición (clic en botón de aceptar o cancelar o guardar según corresponda)
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.aceptar")
-
-
-        
-        # Espera para que la acción se procese
-        time.sleep(1)
+            campos["pNombre"] = nombre
+            campos["pApellidos"] = " ".join(apellidos)
+
+        # 5-13. Domicilio, municipio, provincia, CP, teléfono, email, NIMA, autorización y tipo.
+        # Los campos normales se rellenan juntos; el municipio y el tipo se teclean (son autocompletados).
+        campos.update({
+            "pDomicilio": fila["direccion_recogida"],
+            "pDenominacion_ine_municipio": str(fila["poblacion_recogida"]),
+            "pPoblacion": fila["provincia_recogida"],
+            "pCodigoPostal": str(fila["cp_recogida"]),
+            "pTelefono": str(fila["telf_recogida"]),
+            "pEmail": fila["email_recogida"],
+            "pNima": str(fila.get("nima_codigo", "")),
+            "pAutorizacion_medioambiental": str(fila.get("nima_cod_peligrosos", "")),
+            "pDenominacion_ema": "P02",
+        })
+        webFunctions.rellenar_formulario(driver, campos)
+
+        # 14. Confirmar la adición y esperar a que se procese
+        webFunctions.clickar_y_esperar_cierre(driver, "miBoton.aceptar")
     except Exception as error:
         logging.error(f"Error al añadir la empresa {fila.get('nombre_recogida', '')}: {error}")
         if funcionesNubelus.preguntar_por_pantalla():
@@ -584,41 +557,23 @@ def añadir_centro(nombre_empresa, driver: webdriver.Chrome, fila) -> None:
         webFunctions.esperar_elemento(driver, By.ID, "pDenominacion", timeout=10)
         webFunctions.escribir_en_elemento_por_id(driver, "pDenominacion", fila["nombre_recogida"])
 
-        # 2. Completar el campo Entidad MA
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_ema", fila["nombre_empresa"])
-
-        # 3. Completar el campo Domicilio
-        webFunctions.escribir_en_elemento_por_name(driver, "pDomicilio", fila["direccion_recogida"])
-
-        # 4. Completar el campo Municipio
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_ine_municipio", str(fila["poblacion_recogida"]))
-
-        # 5. Completar el campo Provincia
-        webFunctions.escribir_en_elemento_por_name(driver, "pPoblacion", fila["provincia_recogida"])
-
-        # 6. Completar el campo Código Postal
-        webFunctions.escribir_en_elemento_por_name(driver, "pCodigoPostal", str(fila["cp_recogida"]))
-
-        # 7. Completar el campo Teléfono
-        webFunctions.escribir_en_elemento_por_name(driver, "pTelefono", str(fila["telf_recogida"]))
-        
-        # 8. Completar el campo Email
-        webFunctions.escribir_en_elemento_por_name(driver, "pEmail", fila["email_recogida"])
-
-        # 9. Completar el campo NIMA
-        webFunctions.escribir_en_elemento_por_name(driver, "pNima", str(fila.get("nima_codigo", "")))
-
-        # 10. Completar el campo Autorización
-        webFunctions.escribir_en_elemento_por_name(driver, "pAutorizacion_medioambiental", str(fila.get("nima_cod_peligrosos", "")))
-
-        # 11. Completar el campo Tipo
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_tipo_ema", "P02")
-
-        # 9. Confirmar la adición (clic en botón de aceptar o guardar)
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.aceptar")
-
-        # Espera para que la acción se procese
-        time.sleep(1)
+        # 2-11. Entidad MA, domicilio, municipio, provincia, CP, teléfono, email, NIMA, autorización y tipo.
+        # Los campos normales se rellenan juntos; entidad, municipio y tipo se teclean (son autocompletados).
+        webFunctions.rellenar_formulario(driver, {
+            "pDenominacion_ema": fila["nombre_empresa"],
+            "pDomicilio": fila["direccion_recogida"],
+            "pDenominacion_ine_municipio": str(fila["poblacion_recogida"]),
+            "pPoblacion": fila["provincia_recogida"],
+            "pCodigoPostal": str(fila["cp_recogida"]),
+            "pTelefono": str(fila["telf_recogida"]),
+            "pEmail": fila["email_recogida"],
+            "pNima": str(fila.get("nima_codigo", "")),
+            "pAutorizacion_medioambiental": str(fila.get("nima_cod_peligrosos", "")),
+            "pDenominacion_tipo_ema": "P02",
+        })
+
+        # 9. Confirmar la adición y esperar a que se procese
+        webFunctions.clickar_y_esperar_cierre(driver, "miBoton.aceptar")
 
         # Añade las autorizaciones del centro
         añadir_autorizaciones(driver, fila)
@@ -642,137 +597,95 @@ def añadir_centros(driver: webdriver.Chrome, centros_añadir: pd.DataFrame) ->
         añadir_centro(driver, centro)
 
 
-def extraer_datos_centro_castilla_desde_excel(ruta_excel):
+# Columnas del Excel de Castilla-La Mancha -> claves de cada centro
+COLUMNAS_CENTRO_CASTILLA = {
+    "NIMA": "nima",
+    "Nº AUTORIZACIÓN": "num_autorizacion",
+    "TIPO EXPEDIENTEs": "tipo_expediente",
+    "NOMBRE": "nombre",
+    "PROVINCIA": "provincia",
+    "LOCALIDAD": "municipio",
+    "DOMICILIO": "direccion",
+    "E-MAIL": "email",
+    "COORDENADAS": "coordenadas",
+    "CODIGO LER": "codigo_ler",
+    "CODIGO RAEE": "codigo_raee",
+    "DESCRICPCION CODIGO": "descripcion_codigo",
+}
+CLAVES_EMPRESA_CASTILLA = ["nombre", "provincia", "municipio", "direccion", "telefono", "email", "coordenadas"]
+
+def datos_centro_castilla_desde_dataframe(datos_castilla: pd.DataFrame) -> dict:
     """
-    Lee un archivo Excel (.xls) y devuelve un JSON estructurado con la información de la sede y los centros.
+    Convierte el DataFrame del Excel de Castilla-La Mancha en un JSON con la información de la sede y los centros.
+    Las filas válidas son las que tienen un número entero positivo en 'Unnamed: 0'; la primera es la sede.
     """
-    logging.info(f"Procesando archivo Excel: {ruta_excel}")
-    datos_castilla = pd.read_excel(ruta_excel, header=1)
-    logging.info(f"{datos_castilla}")
-    ruta_xlsx = ruta_excel.replace('.xls', '.xlsx')
-    logging.info(f"Guardando datos en: {ruta_xlsx}")
-    try:
-        datos_castilla.to_excel(ruta_xlsx, index=False)
-    except Exception as e:
-        logging.error(f"Error al guardar el archivo Excel: {e}")
-        raise
-
-    # Filtra filas válidas (donde 'Unnamed: 0' es un número)
-    filas_validas = datos_castilla[datos_castilla['Unnamed: 0'].apply(
-        lambda x: isinstance(x, (int, float)) and x > 0 and float(x).is_integer()
-    )]
-
-    # --- Empresa: toma la primera fila válida ---
-    if not filas_validas.empty:
-        fila_empresa = filas_validas.iloc[0]
-        telefono_empresa = fila_empresa.get('TELÉFONO', 0)
-        if pd.isnull(telefono_empresa):
-            telefono_empresa = 0
-        else:
-            try:
-                telefono_empresa = int(telefono_empresa)
-            except Exception:
-                telefono_empresa = 0
-        empresa = {
-            "nombre": fila_empresa.get('NOMBRE', ''),
-            "provincia": fila_empresa.get('PROVINCIA', ''),
-            "municipio": fila_empresa.get('LOCALIDAD', ''),
-            "direccion": fila_empresa.get('DOMICILIO', ''),
-            "telefono": telefono_empresa,
-            "email": fila_empresa.get('E-MAIL', ''),
-            "coordenadas": fila_empresa.get('COORDENADAS', ''),
-        }
-        # Eliminar nif si por alguna razón está presente
-        empresa.pop('nif', None)
+    numero_fila = pd.to_numeric(datos_castilla.get("Unnamed: 0"), errors="coerce")
+    filas_validas = datos_castilla[(numero_fila > 0) & (numero_fila % 1 == 0)]
+
+    centros_df = filas_validas.reindex(columns=list(COLUMNAS_CENTRO_CASTILLA), fill_value="")
+    centros_df = centros_df.rename(columns=COLUMNAS_CENTRO_CASTILLA)
+    # Teléfono como entero; 0 si está vacío o no es un número
+    if "TELÉFONO" in filas_validas:
+        telefonos = pd.to_numeric(filas_validas["TELÉFONO"], errors="coerce").fillna(0).astype("int64")
     else:
-        empresa = {}
-
-    # --- Centros: todas las filas válidas ---
-    centros = []
-    for _, fila in filas_validas.iterrows():
-        telefono_centro = fila.get('TELÉFONO', 0)
-        if pd.isnull(telefono_centro):
-            telefono_centro = 0
-        else:
-            try:
-                telefono_centro = int(telefono_centro)
-            except Exception:
-                telefono_centro = 0
-        centro = {
-            "nima": fila.get('NIMA', ''),
-            "num_autorizacion": fila.get('Nº AUTORIZACIÓN', ''),
-            "tipo_expediente": fila.get('TIPO EXPEDIENTEs', ''),
-            "nombre": fila.get('NOMBRE', ''),
-            "provincia": fila.get('PROVINCIA', ''),
-            "municipio": fila.get('LOCALIDAD', ''),
-            "direccion": fila.get('DOMICILIO', ''),
-            "telefono": telefono_centro,
-            "email": fila.get('E-MAIL', ''),
-            "coordenadas": fila.get('COORDENADAS', ''),
-            "codigo_ler": fila.get('CODIGO LER', ''),
-            "codigo_raee": fila.get('CODIGO RAEE', ''),
-            "descripcion_codigo": fila.get('DESCRICPCION CODIGO', ''),
-        }
-        # Eliminar nif si por alguna razón está presente
-        centro.pop('nif', None)
-        centros.append(centro)
-
-    resultado = {
+        telefonos = 0
+    centros_df.insert(list(centros_df.columns).index("email"), "telefono", telefonos)
+
+    centros = centros_df.to_dict(orient="records")
+    empresa = {clave: centros[0][clave] for clave in CLAVES_EMPRESA_CASTILLA} if centros else {}
+    return {
         "empresa": empresa,
         "centros": centros
     }
-    return resultado
-
-
-def esperar_y_guardar_datos_centro_json_Castilla(extension=".xls", timeout=60):
-    import glob, os, time, logging
-
-    carpeta_descargas = os.path.join(os.path.expanduser("~"), "Downloads")
-    tiempo_inicio = time.time()
-    archivo_final = None
-
-    while time.time() - tiempo_inicio < timeout:
-        archivos = glob.glob(os.path.join(carpeta_descargas, f"*{extension}"))
-        finalizados = [f for f in archivos if not f.endswith('.crdownload')]
-        if finalizados:
-            archivo_final = max(finalizados, key=os.path.getmtime)
-            size = -1
-            while True:
-                new_size = os.path.getsize(archivo_final)
-                if new_size == size:
-                    break
-                size = new_size
-                time.sleep(1)
-            break
-
-    datos_dict = None
-    archivo_xlsx = None
+
+def extraer_datos_centro_castilla_desde_excel(origen):
+    """
+    Lee el Excel (.xls) de Castilla-La Mancha una sola vez y devuelve un JSON estructurado con la información
+    de la sede y los centros.
+
+    Args:
+        origen (str or bytes): Ruta del archivo o su contenido ya leído en memoria.
+    """
+    logging.info(f"Procesando Excel de Castilla ({'en memoria' if isinstance(origen, bytes) else origen}).")
+    datos_castilla = pd.read_excel(io.BytesIO(origen) if isinstance(origen, bytes) else origen, header=1)
+    logging.info(f"{datos_castilla}")
+    return datos_centro_castilla_desde_dataframe(datos_castilla)
+
+
+def esperar_y_guardar_datos_centro_json_Castilla(extension=".xls", timeout=60, sesion=None):
+    """
+    Espera a que termine la descarga del Excel de Castilla-La Mancha, lo lee en memoria, lo borra del disco
+    y devuelve los datos extraídos (ver extraer_datos_centro_castilla_desde_excel), o None si no se descarga a tiempo.
+
+    Args:
+        extension (str, opcional): Extensión del archivo descargado.
+        timeout (int, opcional): Tiempo máximo de espera en segundos.
+        sesion (dict, opcional): Sesión de descarga propia de la búsqueda (downloadFunctions.sesion_descarga).
+            Si no se indica se usa DOWNLOAD_DIR, que es compartida y no admite varias búsquedas a la vez.
+    """
     try:
-        if not archivo_final:
-            logging.error("No se descargó ningún archivo en el tiempo esperado.")
-            return None
+        if sesion is not None:
+            archivo_final = downloadFunctions.esperar_descarga_sesion(sesion, f"*{extension}", timeout)
+        else:
+            archivo_final = _esperar_descarga(DOWNLOAD_DIR, extension=extension, timeout=timeout)
+    except TimeoutError:
+        logging.error("No se descargó ningún archivo en el tiempo esperado.")
+        return None
 
+    try:
         logging.info(f"Archivo descargado: {archivo_final}")
-        datos_dict = extraer_datos_centro_castilla_desde_excel(archivo_final)
-        logging.info("Datos extraídos del Excel.")
-        archivo_xlsx = archivo_final.replace('.xls', '.xlsx')
+        with open(archivo_final, "rb") as archivo:
+            contenido = archivo.read()
     finally:
-        # Borrar el archivo .xls
-        if archivo_final and os.path.exists(archivo_final):
-            try:
-                os.remove(archivo_final)
-                logging.info(f"Archivo eliminado: {archivo_final}")
-            except Exception as e:
-                logging.error(f"No se pudo eliminar el archivo: {archivo_final}. Error: {e}")
-
-        # Borrar el archivo .xlsx generado
-        if archivo_xlsx and os.path.exists(archivo_xlsx):
-            try:
-                os.remove(archivo_xlsx)
-                logging.info(f"Archivo eliminado: {archivo_xlsx}")
-            except Exception as e:
-                logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
+        # Borrar el archivo descargado: a partir de aquí se trabaja en memoria
+        try:
+            os.remove(archivo_final)
+            logging.info(f"Archivo eliminado: {archivo_final}")
+        except Exception as e:
+            logging.error(f"No se pudo eliminar el archivo: {archivo_final}. Error: {e}")
 
+    datos_dict = extraer_datos_centro_castilla_desde_excel(contenido)
+    logging.info("Datos extraídos del Excel.")
     return datos_dict
 
 def añadir_horario(driver, fila):
@@ -781,14 +694,14 @@ def añadir_horario(driver, fila):
     """
     try:
         webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Otros")
-        time.sleep(1)
+        webFunctions.esperar_ajax_inactivo(driver)
         webFunctions.clickar_boton_con_titulo(driver, "Editar")
         oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_cambiar_aviso")
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_cambiar_aviso")
         str_horario = "MAÑANAS: " + str(fila.get("horario_m_1", "")) + " - " + str(fila.get("horario_m_2", "")) + "\n" + \
             "TARDES: " + str(fila.get("horario_t_1", "")) + " - " + str(fila.get("horario_t_2", ""))
         webFunctions.escribir_en_elemento_por_name(popup, "pAviso", str_horario)
-        webFunctions.clickar_boton_por_clase(popup, "miBoton.aceptar")
+        webFunctions.clickar_y_esperar_cierre(popup, "miBoton.aceptar")
         driver = oldDriver
     except Exception as error:
         logging.error(f"Error al añadir horario para la empresa.")
@@ -799,21 +712,22 @@ def rellenar_datos_medioambientales(driver, fila):
     """
     try:
         webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Datos medioambientales")
-        time.sleep(1)
+        webFunctions.esperar_ajax_inactivo(driver)
         webFunctions.clickar_boton_por_clase(driver, "miBoton.editar.solapa_descripcion")
 
         oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_editar_DATOS_MEDIOAMBIENTALES")
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_editar_DATOS_MEDIOAMBIENTALES")
         webFunctions.esperar_elemento(popup, By.CLASS_NAME, "pNima")
         # Rellenar campos con los datos de la empresa
-        webFunctions.escribir_en_elemento_por_name(popup, "pNima", str(fila.get("nima_codigo", "")))
-        webFunctions.escribir_en_elemento_por_name(popup, "pResponsable_ma_nombre", str(fila.get("nombre_recogida", "")))
-        webFunctions.escribir_en_elemento_por_name(popup, "pResponsable_ma_nif", str(fila.get("cif_recogida", "")))
-        webFunctions.escribir_en_elemento_por_name(popup, "pResponsable_ma_cargo", str(fila.get("nombre_recogida", "")))
-        webFunctions.escribir_en_elemento_por_name_y_enter_pausa(popup, "pDenominacion_ine_municipio", str(fila.get("poblacion_recogida", "")))
-
-        time.sleep(1)
-        webFunctions.clickar_boton_por_clase(popup, "miBoton.aceptar")
+        webFunctions.rellenar_formulario(popup, {
+            "pNima": str(fila.get("nima_codigo", "")),
+            "pResponsable_ma_nombre": str(fila.get("nombre_recogida", "")),
+            "pResponsable_ma_nif": str(fila.get("cif_recogida", "")),
+            "pResponsable_ma_cargo": str(fila.get("nombre_recogida", "")),
+            "pDenominacion_ine_municipio": str(fila.get("poblacion_recogida", "")),
+        })
+
+        webFunctions.clickar_y_esperar_cierre(popup, "miBoton.aceptar")
         driver = oldDriver
     except Exception as error:
         logging.error(f"Error al rellenar datos medioambientales para la empresa {fila.get('nombre_recogida', '')}: {error}")
@@ -919,14 +833,12 @@ def añadir_acuerdo_representacion(driver, fila):
     intentos = 5
     for intento in range(intentos):
         try:
-            time.sleep(1)
             webFunctions.completar_campo_y_enter_por_name(driver, "pDenominacion_ema_representada", str(fila.get("nombre_recogida", "")))
             fecha_inicio = obtener_fecha_modificada(str(fila.get("fecha_inicio", "")))
             fecha_fin = obtener_fecha_modificada(str(fila.get("fecha_fin", "")))
             webFunctions.escribir_en_elemento_por_name(driver, "pFecha", fecha_inicio)
             webFunctions.escribir_en_elemento_por_name(driver, "pFecha_caducidad", fecha_fin)
-            webFunctions.clickar_boton_por_clase(driver, "miBoton.aceptar")
-            time.sleep(1)  # Espera para que la acción se procese
+            webFunctions.clickar_y_esperar_cierre(driver, "miBoton.aceptar")
             return
         except Exception as error:
             logging.error(f"Error al añadir acuerdo de representación para la empresa (intento {intento+1}): {error}")
@@ -971,11 +883,11 @@ def añadir_autorizaciones(driver, fila):
     """
     try:
         webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Autorizaciones")
-        time.sleep(1)
+        webFunctions.esperar_ajax_inactivo(driver)
         webFunctions.clickar_boton_por_texto(driver, "Añadir autorización")
 
         oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_nuevo_AUTORIZACIONES")
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_nuevo_AUTORIZACIONES")
 
         # Completar campos del formulario de autorización
         webFunctions.escribir_en_elemento_por_name(popup, "pAutorizacion_medioambiental", str(fila.get('nima_cod_peligrosos', '')))
@@ -985,10 +897,10 @@ def añadir_autorizaciones(driver, fila):
 
         # Completar el campo Tipo
         webFunctions.escribir_en_elemento_por_name(popup, "pDenominacion_ema", "P02")
-        time.sleep(1)
-        
+        webFunctions.esperar_autocompletado_abierto(driver)
         webFunctions.clickar_boton_por_clase(driver, "BUSCAR_TIPO_ENTIDAD_MEDIOAMBIENTAL.noref.ui-menu-item")
-        webFunctions.clickar_boton_por_clase(popup, "miBoton.aceptar")
+        webFunctions.esperar_valor_confirmado(popup, By.NAME, "pDenominacion_ema", "P02")
+        webFunctions.clickar_y_esperar_cierre(popup, "miBoton.aceptar")
         driver = oldDriver
     except Exception as error:
         logging.error(f"Error al añadir autorización para la empresa {fila.get('nombre_recogida', '')}: {error}")
@@ -1012,11 +924,13 @@ def añadir_usuario(driver, fila):
     try:
         
         # Completar campos del formulario
-        webFunctions.escribir_en_elemento_por_name(driver, "pUsuario", fila["nombre_recogida"].replace(" ", ""))
-        webFunctions.escribir_en_elemento_por_name(driver, "pAlias", fila["nombre_recogida"])
-        webFunctions.escribir_en_elemento_por_name(driver, "pEmail", fila["email_recogida"])
-        webFunctions.escribir_en_elemento_por_name(driver, "pTelefono", fila["telf_recogida"])
-        webFunctions.seleccionar_elemento_por_name(driver, "pRol", "EMA")
+        webFunctions.rellenar_formulario(driver, {
+            "pUsuario": fila["nombre_recogida"].replace(" ", ""),
+            "pAlias": fila["nombre_recogida"],
+            "pEmail": fila["email_recogida"],
+            "pTelefono": fila["telf_recogida"],
+            "pRol": "EMA",
+        })
         try:
             webFunctions.completar_campo_y_confirmar_seleccion_por_name(
                 driver, "pDenominacion_ema", str(fila.get("nombre_recogida", "")), "BUSCAR_ENTIDAD_MEDIOAMBIENTAL.noref.ui-menu-item"
@@ -1027,10 +941,7 @@ def añadir_usuario(driver, fila):
         except Exception as e:
             logging.error(f"Error al completar campos de denominación EMA o centro: {e}")
         # Confirmar la adición
-        webFunctions.esperar_elemento(driver, By.CLASS_NAME, "miBoton.aceptar")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.aceptar")
-        
-        time.sleep(1)  # Espera para que la acción se procese
+        webFunctions.clickar_y_esperar_cierre(driver, "miBoton.aceptar")
     except Exception as error:
         logging.error(f"Error al añadir usuario para la empresa {fila.get('nombre_recogida', '')}: {error}")
         continuar = funcionesNubelus.preguntar_por_pantalla()
@@ -1054,20 +965,15 @@ def añadir_contrato_tratamiento(driver, fila, residuo):
         fecha_inicio = obtener_fecha_modificada(fila["fecha_inicio"])
 
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pFecha", fecha_inicio)
-        time.sleep(0.5)
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pFecha_caducidad", fecha_caducidad_3(fecha_inicio))
-        time.sleep(0.5)
         # Si es un segundo centro, se selecciona como centro de recogida, si no toma el nombre de la empresa
         if fila['nombre_empresa'] is not None and fila['nombre_empresa'].strip() != "":
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_origen", fila.get("nombre_empresa", ""))
-            time.sleep(0.5)
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_origen_centro", fila.get("nombre_recogida", ""))
         else:
            webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_origen", fila.get("nombre_recogida", "")) 
-        time.sleep(0.5)
 
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_destino", "METALLS DEL CAMP, S.L.") # METALLS DEL CAMP, S.L. siempre
-        time.sleep(0.5)
         provincia = str(fila.get("provincia_recogida", "")).strip().upper()
         provincia_normalizada = quitar_tildes(provincia)
         provincias_valencia = [
@@ -1079,7 +985,6 @@ def añadir_contrato_tratamiento(driver, fila, residuo):
         if provincia_normalizada in provincias_valencia_normalizadas or residuo.get("nombre", "").strip().upper() == "HIDROCARBUROS CON AGUA*":
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_destino_centro", "METALLS DEL CAMP ( SERRA D") # METALLS DEL CAMP ( SERRA D'ESPADA ) si es de valencia
             # Depende si el residuo es o no peligroso
-            time.sleep(1)
             if residuo.get("tipo") == "peligroso":  
                 webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_autorizacion_destino", "157/G02/CV")
             elif residuo.get("tipo") == "no peligroso":
@@ -1087,22 +992,19 @@ def añadir_contrato_tratamiento(driver, fila, residuo):
 
         else:
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_destino_centro", "METALLS DEL CAMP, S.L.U. (EL ROMERAL)") # Si es de otra parte
-            time.sleep(1)
             if residuo.get("tipo") == "peligroso":
                 webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_autorizacion_destino", "4570002919") # Siempre suponer que es peligroso
             elif residuo.get("tipo") == "no peligroso":
                 webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_autorizacion_destino", "G04") # Siempre suponer que es no peligroso
-        time.sleep(1)
 
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_operador_traslados", "ECO TITAN S.L.") # Siempre ECO TITAN
-        time.sleep(1)
         if residuo.get("tipo") == "peligroso":
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_autorizacion_operador_traslados", "87/A01/CV") # Si es peligroso
         elif residuo.get("tipo") == "no peligroso":
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_autorizacion_operador_traslados", "305/A02/CV")
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_residuo", residuo.get("nombre", ""))
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(driver, "pKilos_totales", residuo.get("cantidad", ""))
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.aceptar")
+        webFunctions.clickar_y_esperar_cierre(driver, "miBoton.aceptar")
     except Exception as error:
         logging.error(f"Error al añadir contrato de tratamiento para la empresa {fila.get('nombre_recogida', '')}: {error}")
         continuar = funcionesNubelus.preguntar_por_pantalla()
@@ -1138,15 +1040,12 @@ def añadir_contratos_tratamientos(driver, fila, nombre_empresa=None, ruta_desti
 
                 # Crear contrato de tratamiento para todos los residuos
                 añadir_contrato_tratamiento(driver, fila, contrato_residuo)
-                time.sleep(1)
                 # Añadir tratamientos para el residuo
                 añadir_tratamientos(driver, fila, item)
-                time.sleep(1)
                 # Solo para peligrosos, crear notificación
                 if "*" in nombre_residuo:
                     provincia = fila.get("provincia_recogida", "").strip().upper()
                     crear_notificacion_tratamiento(driver, ruta_destino, provincia)
-                    time.sleep(1)
 
                 # Crear facturación para todos los residuos
                 añadir_facturacion(driver, fila, contrato_residuo)
@@ -1169,7 +1068,7 @@ def crear_notificacion_tratamiento(driver, ruta_destino=None, provincia: str = "
     Descarga el archivo en la carpeta 'ruta_destino' si se indica, si no en 'input'.
     """
     webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Notificación")
-    time.sleep(1)
+    webFunctions.esperar_ajax_inactivo(driver)
     try:
         provincia_normalizada = quitar_tildes(str(provincia)).strip().upper()
         provincias_validas = [
@@ -1196,13 +1095,14 @@ def crear_notificacion_tratamiento(driver, ruta_destino=None, provincia: str = "
         downloadFunctions.configure_driver_download_path(driver, download_path)
 
         old_state = downloadFunctions.snapshot_folder_state(download_path)
+        seguimiento = downloadFunctions.seguir_descargas(driver)
 
         if provincia_normalizada not in provincias_validas_normalizadas:
             webFunctions.clickar_boton_por_clase(driver, "icon-magic")
-            nuevos = downloadFunctions.wait_for_new_download(download_path, old_state, num_descargas=1, timeout=120)
+            nuevos = downloadFunctions.wait_for_new_download(download_path, old_state, num_descargas=1, timeout=120, seguimiento=seguimiento)
         else:
             webFunctions.clickar_boton_por_on_click(driver, "adcr_notificar()")
-            nuevos = downloadFunctions.wait_for_new_download(download_path, old_state, num_descargas=1, timeout=120)
+            nuevos = downloadFunctions.wait_for_new_download(download_path, old_state, num_descargas=1, timeout=120, seguimiento=seguimiento)
             editar_notificacion_tratamiento(driver)
         if nuevos:
             logging.info(f"Archivo de notificación descargado en: {nuevos[0]}")
@@ -1222,11 +1122,11 @@ def crear_notificacion_tratamiento(driver, ruta_destino=None, provincia: str = "
 
 def editar_notificacion_tratamiento(driver):
     webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Notificación")
-    time.sleep(1)
+    webFunctions.esperar_ajax_inactivo(driver)
     webFunctions.clickar_boton_por_on_click(driver, "editar_NOTIFICACION()")
-    popup = webFunctions.encontrar_pop_up_por_id(driver, "div_editar_NOTIFICACION")
+    popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_editar_NOTIFICACION")
     webFunctions.seleccionar_elemento_por_name(popup, "pNt_notificada_sn", "Si")
-    webFunctions.clickar_boton_por_clase(popup, "icon-ok")
+    webFunctions.clickar_y_esperar_cierre(popup, "icon-ok")
 
 def editar_notificaciones_peligrosos(driver):
     """
@@ -1262,7 +1162,7 @@ def añadir_tratamientos(driver, fila, residuo):
     Usa el centro asociado que viene en residuo["centro"] o en residuo["centros"].
     """
     webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Tratamientos")
-    time.sleep(1)
+    webFunctions.esperar_ajax_inactivo(driver)
     try:
         nombre_residuo = residuo.get("nombre", "").strip().upper()
         centros = residuo.get("centros", [])
@@ -1290,18 +1190,13 @@ def añadir_tratamiento(driver, fila, residuo, indice=1):
     try:
         webFunctions.clickar_boton_por_clase(driver, f"miBoton.editar.editar_{indice}.sinTexto.dcha")
         oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, f"div_editar_tratamiento_posterior_{indice}")
-        time.sleep(0.5)
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, f"div_editar_tratamiento_posterior_{indice}")
         centro = residuo.get("centro", {})
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(popup, f"pDenominacion_ema_{indice}", centro.get("centro", ""))
-        time.sleep(0.5)
         webFunctions.escribir_en_elemento_por_name_y_enter_escape(popup, f"pTratamiento_posterior_{indice}_codigo_ler_2", centro.get("tratamiento", ""))
 
-        webFunctions.esperar_elemento(popup, By.CLASS_NAME, "icon-ok")
-
-        webFunctions.clickar_boton_por_clase(popup, "icon-ok")
+        webFunctions.clickar_y_esperar_cierre(popup, "icon-ok")
         driver = oldDriver
-        time.sleep(1)
     except Exception as error:
         logging.error(f"Error al añadir tratamiento {indice} para la empresa {fila.get('nombre_recogida', '')}: {error}")
         continuar = funcionesNubelus.preguntar_por_pantalla()
@@ -1343,11 +1238,11 @@ def añadir_facturacion(driver, fila, residuo):
     """
     try:
         webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Facturación")
-        time.sleep(2)
+        webFunctions.esperar_ajax_inactivo(driver)
 
         oldDriver = driver
         webFunctions.clickar_boton_por_on_click(driver, "nuevo_FACTURACION()")
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_nuevo_FACTURACION")
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_nuevo_FACTURACION")
 
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(popup, "pNombre_cliente", fila.get("nombre_recogida", ""))
         webFunctions.escribir_en_elemento_por_name_y_enter_pausa(popup, "pDenominacion_producto", residuo.get("nombre", ""))
@@ -1357,10 +1252,8 @@ def añadir_facturacion(driver, fila, residuo):
             webFunctions.seleccionar_elemento_por_name(popup, "pCantidad_modo", "Valor fijo")
             webFunctions.seleccionar_elemento_por_name(popup, "pPrecio_modo_venta", "T/Precio 1")
             webFunctions.escribir_en_elemento_por_name_y_enter_pausa(popup, "pCantidad_valor", "1")
-        time.sleep(2)
-        webFunctions.clickar_boton_por_clase(popup, "miBoton.aceptar")
+        webFunctions.clickar_y_esperar_cierre(popup, "miBoton.aceptar")
         driver = oldDriver
-        time.sleep(2)
     except Exception as error:
         logging.error(f"Error al añadir facturación para la empresa {fila.get('nombre_recogida', '')}: {error}")
         continuar = funcionesNubelus.preguntar_por_pantalla()
@@ -1442,277 +1335,84 @@ def esperar_descarga_completa(ruta_archivo, timeout=30):
     """
     Espera a que el archivo exista y no tenga extensión .crdownload.
     """
-    tiempo_inicio = time.time()
-    while True:
-        if os.path.exists(ruta_archivo) and not os.path.exists(ruta_archivo + ".crdownload"):
-            break
-        if time.time() - tiempo_inicio > timeout:
-            raise TimeoutError("Descarga no completada en el tiempo esperado.")
-        time.sleep(1)
+    carpeta, nombre = os.path.split(os.path.abspath(ruta_archivo))
+    if not vigilanteCarpetas.esperar_archivos(carpeta, glob.escape(nombre), 1, timeout):
+        raise TimeoutError("Descarga no completada en el tiempo esperado.")
 
-def descargar_excel_entidades(driver):
+def _descargar_excel_nubelus(driver, url, nombre_archivo, descripcion):
     """
-    Descarga el Excel de entidades desde Nubelus y devuelve un DataFrame con su contenido.
+    Genera el Excel de un listado de Nubelus y devuelve un DataFrame con su contenido.
+    La descarga se hace en una carpeta temporal propia (downloadFunctions.sesion_descarga), que se borra al terminar,
+    de modo que no se confunde con otros archivos de ~/Downloads ni con otras descargas simultáneas.
     """
     try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_ENTIDAD)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
+        with downloadFunctions.sesion_descarga(driver, "nubelus_") as sesion:
+            webFunctions.abrir_web(driver, url)
+            webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
+            webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
+            webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
+            oldDriver = driver
+            popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
+            try:
+                webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
+            except Exception as e:
+                logging.info(f"Error al aceptar el pop-up: {e}")
+            driver = oldDriver
 
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Entidades medioambientales.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
+            try:
+                archivo_xlsx = downloadFunctions.esperar_descarga_sesion(sesion, glob.escape(nombre_archivo))
+            except TimeoutError as e:
+                logging.error(e)
+                continuar = funcionesNubelus.preguntar_por_pantalla()
+                if not continuar:
+                    driver.quit()
+                    sys.exit()
+                return None
 
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
+            return pd.read_excel(archivo_xlsx)
     except Exception as error:
-        logging.error(f"Error al descargar el Excel de entidades: {error}")
+        logging.error(f"Error al descargar el Excel de {descripcion}: {error}")
         continuar = funcionesNubelus.preguntar_por_pantalla()
         if not continuar:
             driver.quit()
             sys.exit()
         return None
 
+def descargar_excel_entidades(driver):
+    """
+    Descarga el Excel de entidades desde Nubelus y devuelve un DataFrame con su contenido.
+    """
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_ENTIDAD, "Entidades medioambientales.xlsx", "entidades")
+
 def descargar_excel_centros(driver):
     """
     Descarga el Excel de centros desde Nubelus y devuelve un DataFrame con su contenido.
     """
-    try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_CENTROS)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
-
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Centros de entidades medioambientales.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
-
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
-    except Exception as error:
-        logging.error(f"Error al descargar el Excel de centros: {error}")
-        continuar = funcionesNubelus.preguntar_por_pantalla()
-        if not continuar:
-            driver.quit()
-            sys.exit()
-        return None
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_CENTROS, "Centros de entidades medioambientales.xlsx", "centros")
 
 def descargar_excel_clientes(driver):
     """
     Descarga el Excel de clientes desde Nubelus y devuelve un DataFrame con su contenido.
     """
-    try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_CLIENTES)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
-
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Clientes.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
-
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
-    except Exception as error:
-        logging.error(f"Error al descargar el Excel de clientes: {error}")
-        continuar = funcionesNubelus.preguntar_por_pantalla()
-        if not continuar:
-            driver.quit()
-            sys.exit()
-        return None
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_CLIENTES, "Clientes.xlsx", "clientes")
 
 def descargar_excel_usuarios(driver):
     """
     Descarga el Excel de usuarios desde Nubelus y devuelve un DataFrame con su contenido.
     """
-    try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_USUARIO)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
-
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Usuarios.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
-
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
-    except Exception as error:
-        logging.error(f"Error al descargar el Excel de usuarios: {error}")
-        continuar = funcionesNubelus.preguntar_por_pantalla()
-        if not continuar:
-            driver.quit()
-            sys.exit()
-        return None
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_USUARIO, "Usuarios.xlsx", "usuarios")
 
 def descargar_excel_acuerdos_representacion(driver):
     """
     Descarga el Excel de acuerdos de representación desde Nubelus y devuelve un DataFrame con su contenido.
     """
-    try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_ACUERDOS)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
-
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Acuerdos de representación.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
-
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
-    except Exception as error:
-        logging.error(f"Error al descargar el Excel de acuerdos de representación: {error}")
-        continuar = funcionesNubelus.preguntar_por_pantalla()
-        if not continuar:
-            driver.quit()
-            sys.exit()
-        return None
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_ACUERDOS, "Acuerdos de representación.xlsx", "acuerdos de representación")
 
 def descargar_excel_contratos(driver):
     """
     Descarga el Excel de contratos desde Nubelus y devuelve un DataFrame con su contenido.
     """
-    try:
-        webFunctions.abrir_web(driver, WEB_NUBELUS_CONTRATOS)
-        webFunctions.esperar_elemento_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_clase(driver, "miBoton.mas_opciones")
-        webFunctions.clickar_boton_por_id(driver, "moa_bGenerar_excel")
-        oldDriver = driver
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_relacion2excel")
-        try:
-            webFunctions.clickar_boton_por_on_click(popup, "aceptar_relacion2excel()")
-        except Exception as e:
-            logging.info(f"Error al aceptar el pop-up: {e}")
-        driver = oldDriver
-
-        archivo_xlsx = os.path.join(DOWNLOAD_DIR, "Contratos tratamiento.xlsx")
-        try:
-            esperar_descarga_completa(archivo_xlsx)
-            logging.info(f"Archivo descargado: {archivo_xlsx}")
-        except TimeoutError as e:
-            logging.error(e)
-            continuar = funcionesNubelus.preguntar_por_pantalla()
-            if not continuar:
-                driver.quit()
-                sys.exit()
-            return None
-
-        df = pd.read_excel(archivo_xlsx)
-        try:
-            os.remove(archivo_xlsx)
-            logging.info(f"Archivo eliminado: {archivo_xlsx}")
-        except Exception as e:
-            logging.error(f"No se pudo eliminar el archivo: {archivo_xlsx}. Error: {e}")
-        return df
-    except Exception as error:
-        logging.error(f"Error al descargar el Excel de contratos: {error}")
-        continuar = funcionesNubelus.preguntar_por_pantalla()
-        if not continuar:
-            driver.quit()
-            sys.exit()
-        return None
+    return _descargar_excel_nubelus(driver, WEB_NUBELUS_CONTRATOS, "Contratos tratamiento.xlsx", "contratos")
 
 def completar_datos_centro(driver, fila):
     """
@@ -1752,11 +1452,10 @@ def añadir_cliente_empresa(driver, fila):
     try:
         webFunctions.abrir_web(driver, WEB_NUBELUS_ENTIDAD)
         webFunctions.clickar_boton_por_clase(driver, "icon-bolt")
-        popup = webFunctions.encontrar_pop_up_por_id(driver, "div_buscar_1")
+        popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_buscar_1")
         webFunctions.completar_campo_y_enter_por_name(popup, 
             "pDenominacion", fila.get("nombre_recogida", ""))
-        webFunctions.clickar_boton_por_clase(popup, "miBoton.aceptar")
-        time.sleep(0.5)
+        webFunctions.clickar_y_esperar_cierre(popup, "miBoton.aceptar")
         funcionesNubelus.crear_proveedor(driver)
         funcionesNubelus.crear_cliente(driver)
     except Exception as error:
@@ -1810,12 +1509,9 @@ def crear_contratos_faltantes(driver, fila, coincidencias_contratos, ruta_destin
 
         añadir_contrato_tratamiento(driver, fila, contrato_residuo)
         provincia = fila.get("provincia_recogida", "").strip().upper()
-        time.sleep(1)
         añadir_tratamientos(driver, fila, item)
         if "*" in nombre_residuo:
-            time.sleep(1)
             crear_notificacion_tratamiento(driver, ruta_destino, provincia)
-            time.sleep(1)
 
         añadir_facturacion(driver, fila, contrato_residuo)
     editar_notificacion_nubelus(driver, fila)    
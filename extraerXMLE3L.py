@@ -2,6 +2,8 @@ import os
 import json
 import xml.etree.ElementTree as ET
 
+import historialEnvios
+
 def normalizar_nombre(nombre):
     """
     Normaliza el nombre para usarlo como nombre de archivo/carpeta.
@@ -37,36 +39,29 @@ def guardar_regage_json(data, output_dir, nombre_residuo, codigo_regage):
         json.dump(data, f, ensure_ascii=False, indent=2)
     return full_path
 
-# Guardar historial global en BASE_DIR/historial.json usando una función
 def guardar_historial(data):
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    historial_path = os.path.join(BASE_DIR, "historial.json")
-
-    # Leer historial existente o crear uno nuevo
-    if os.path.exists(historial_path):
-        with open(historial_path, "r", encoding="utf-8") as f:
-            try:
-                historial = json.load(f)
-                if not isinstance(historial, list):
-                    historial = []
-            except Exception:
-                historial = []
-    else:
-        historial = []
-
-    # Añadir el nuevo registro
-    historial.append(data)
-
-    # Guardar historial actualizado
-    with open(historial_path, "w", encoding="utf-8") as f:
-        json.dump(historial, f, ensure_ascii=False, indent=2)
+    """
+    Añade el registro al historial global de envíos (BASE_DIR/historial.jsonl, ver historialEnvios).
+    """
+    historialEnvios.añadir(data)
 
 def extraer_info_xml(path_xml, regage):
     """
-    Extrae información relevante del archivo E3L/XML para construir el objeto JSON solicitado.
+    Extrae información relevante del archivo E3L/XML para construir el objeto JSON solicitado
+    y lo registra (historial y output) con su regage.
+    """
+    return registrar_envio(extraer_metadatos_xml(path_xml), regage)
+
+def extraer_metadatos_xml(path_xml):
+    """
+    Lee el archivo E3L/XML y devuelve sus metadatos (representante, productor y residuo), sin regage.
+    """
+    return extraer_metadatos(ET.parse(path_xml).getroot())
+
+def extraer_metadatos(root):
+    """
+    Devuelve los metadatos (representante, productor y residuo) de la raíz de un E3L ya parseado.
     """
-    tree = ET.parse(path_xml)
-    root = tree.getroot()
 
     # Representante
     nif_representante = ""
@@ -108,16 +103,24 @@ def extraer_info_xml(path_xml, regage):
     if residuo is not None and residuo.text:
         nombre_residuo = residuo.text.strip()
 
-    # Construir el diccionario con los datos
-    data = {
+    return {
         "nombre_representante": nombre_representante,
         "nif_representante": nif_representante,
         "nombre_productor": nombre_productor,
         "nif_productor": nif_productor,
         "nombre_residuo": nombre_residuo,
-        "regage": regage
     }
 
+def registrar_envio(metadatos, regage):
+    """
+    Construye el objeto JSON de un envío (metadatos del XML + regage), lo añade al historial
+    y lo guarda en output/{nombre_representante}/{codigo_regage}_{nombre_residuo}.json.
+    """
+    # Construir el diccionario con los datos
+    data = dict(metadatos, regage=regage)
+    nombre_representante = data["nombre_representante"]
+    nombre_residuo = data["nombre_residuo"]
+
     guardar_historial(data)
     
     # Guardar el JSON en output/{nombre_productor}/{codigo_regage}_{nombre_residuo}.json
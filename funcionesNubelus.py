@@ -79,7 +79,7 @@ def crear_proveedor(driver):
         try:
             webFunctions.clickar_boton_por_on_click(driver, "crear_proveedor()")
             oldDriver = driver
-            popup = webFunctions.encontrar_pop_up_por_id(driver, "div_crear_proveedor")
+            popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_crear_proveedor")
             webFunctions.clickar_boton_por_clase(popup, "miBoton_cuadrado.aceptar")
             driver = oldDriver
             return
@@ -99,7 +99,7 @@ def crear_cliente(driver):
         try:
             webFunctions.clickar_boton_por_texto(driver, "Crear cliente")
             oldDriver = driver
-            popup = webFunctions.encontrar_pop_up_por_id(driver, "div_crear_cliente")
+            popup = webFunctions.esperar_pop_up_abierto_por_id(driver, "div_crear_cliente")
             webFunctions.clickar_boton_por_clase(popup, "miBoton_cuadrado.aceptar")
             driver = oldDriver
             return
@@ -114,7 +114,7 @@ def entrar_en_centro_medioambiental(driver):
   Accede a la sección 'Centros' dentro del área medioambiental y selecciona un registro.
   """
   webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Centros")
-  time.sleep(1)
+  webFunctions.esperar_ajax_inactivo(driver)
   webFunctions.clickar_boton_por_clase(driver, "registro")
 
 def comprobar_integridad(driver):
@@ -124,7 +124,7 @@ def comprobar_integridad(driver):
   Esta función hace clic en el botón 'Comprobar integridad' y acepta el pop-up correspondiente.
   """
   webFunctions.seleccionar_elemento_por_id(driver, "fContenido_seleccionado", "Integridad")
-  time.sleep(1)
+  webFunctions.esperar_ajax_inactivo(driver)
   try:
     mensaje = webFunctions.obtener_texto_elemento_por_xpath(driver, "//*[contains(text(), 'El contrato es E3L válido')]")
     if "El contrato es E3L válido" in mensaje:
@@ -0,0 +1,266 @@
+"""
+Módulo: historialEnvios.py
+
+Este módulo guarda el historial de envíos a MITECO (un registro por XML enviado, con su regage) en formato
+JSON Lines: historial.jsonl, una línea JSON por registro.
+
+Cada envío añade una sola línea al final del archivo (escritura única + fsync, con bloqueo de archivo para que
+varios procesos puedan escribir a la vez), en vez de leer y reescribir todo el historial.json como antes.
+Las búsquedas por regage o NIF usan un índice en memoria con la posición de cada línea, que solo lee las líneas
+añadidas desde la última consulta.
+
+Funciones principales:
+  - añadir(registro): añade un registro al historial.
+  - buscar_por_regage(regage) / buscar_por_nif(nif): registros de un regage o de un NIF (productor o representante).
+  - leer_todos(): todos los registros, en orden.
+  - exportar(destino): escribe el historial como array JSON (formato del antiguo historial.json).
+  - compactar(): reescribe el historial sin líneas corruptas ni registros repetidos.
+  - migrar_legado(): pasa el antiguo historial.json a historial.jsonl (se hace solo al primer uso).
+
+Uso desde línea de comandos:
+    python historialEnvios.py exportar [destino.json]
+    python historialEnvios.py compactar
+    python historialEnvios.py migrar
+"""
+
+import loggerConfig
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from config import BASE_DIR
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+RUTA_HISTORIAL = os.path.join(BASE_DIR, "historial.jsonl")
+RUTA_HISTORIAL_LEGADO = os.path.join(BASE_DIR, "historial.json")
+
+_lock = threading.Lock()
+_indice = {"ruta": None, "inodo": None, "tamano": 0, "regage": {}, "nif": {}}
+
+
+@contextmanager
+def _bloqueo():
+    """
+    Bloqueo exclusivo entre hilos y procesos (archivo historial.jsonl.lock) durante el bloque 'with'.
+    """
+    with _lock:
+        os.makedirs(os.path.dirname(RUTA_HISTORIAL), exist_ok=True)
+        with open(RUTA_HISTORIAL + ".lock", "a+b") as cerrojo:
+            if sys.platform == "win32":
+                cerrojo.seek(0)
+                msvcrt.locking(cerrojo.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(cerrojo.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if sys.platform == "win32":
+                    cerrojo.seek(0)
+                    msvcrt.locking(cerrojo.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(cerrojo.fileno(), fcntl.LOCK_UN)
+
+
+def _linea(registro: dict) -> bytes:
+    return (json.dumps(registro, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _escribir_atomico(ruta: str, contenido: bytes) -> None:
+    """
+    Escribe el archivo completo en un temporal y lo sustituye de una vez.
+    """
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(contenido)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def _migrar_sin_bloqueo() -> int:
+    if not os.path.exists(RUTA_HISTORIAL_LEGADO):
+        return 0
+    if os.path.exists(RUTA_HISTORIAL) and os.path.getsize(RUTA_HISTORIAL) > 0:
+        return 0
+    try:
+        with open(RUTA_HISTORIAL_LEGADO, "r", encoding="utf-8") as f:
+            registros = json.load(f)
+    except Exception as e:
+        logging.error(f"No se pudo leer {RUTA_HISTORIAL_LEGADO} para migrarlo: {e}")
+        return 0
+    if not isinstance(registros, list):
+        registros = []
+    _escribir_atomico(RUTA_HISTORIAL, b"".join(_linea(registro) for registro in registros))
+    os.replace(RUTA_HISTORIAL_LEGADO, RUTA_HISTORIAL_LEGADO + ".migrado")
+    logging.info(f"Historial migrado a {RUTA_HISTORIAL}: {len(registros)} registros.")
+    return len(registros)
+
+
+def migrar_legado() -> int:
+    """
+    Pasa el antiguo historial.json (array JSON) a historial.jsonl si este aún no existe o está vacío.
+    El archivo antiguo se conserva como historial.json.migrado. Devuelve el número de registros migrados.
+    """
+    with _bloqueo():
+        return _migrar_sin_bloqueo()
+
+
+def añadir(registro: dict) -> None:
+    """
+    Añade un registro al final del historial con una sola escritura (y fsync).
+    """
+    with _bloqueo():
+        _migrar_sin_bloqueo()
+        with open(RUTA_HISTORIAL, "ab") as f:
+            f.write(_linea(registro))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _leer_lineas(desde: int = 0):
+    """
+    Recorre las líneas completas del historial a partir de la posición 'desde'.
+    Devuelve tuplas (posición, posición siguiente, registro); el registro es None en las líneas corruptas.
+    """
+    if not os.path.exists(RUTA_HISTORIAL):
+        return
+    with open(RUTA_HISTORIAL, "rb") as f:
+        f.seek(desde)
+        posicion = desde
+        for linea in f:
+            if not linea.endswith(b"\n"):
+                break  # Línea a medio escribir por otro proceso
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                logging.warning(f"Línea corrupta en {RUTA_HISTORIAL} (posición {posicion}).")
+                registro = None
+            siguiente = posicion + len(linea)
+            yield posicion, siguiente, registro if isinstance(registro, dict) else None
+            posicion = siguiente
+
+
+def _actualizar_indice() -> None:
+    """
+    Añade al índice las líneas escritas desde la última consulta (o lo rehace si el archivo se ha sustituido,
+    por ejemplo tras compactar).
+    """
+    try:
+        datos = os.stat(RUTA_HISTORIAL)
+        inodo, tamano = datos.st_ino, datos.st_size
+    except FileNotFoundError:
+        inodo, tamano = None, 0
+    if _indice["ruta"] != RUTA_HISTORIAL or _indice["inodo"] != inodo or tamano < _indice["tamano"]:
+        _indice.update(ruta=RUTA_HISTORIAL, inodo=inodo, tamano=0, regage={}, nif={})
+    for posicion, siguiente, registro in _leer_lineas(_indice["tamano"]):
+        _indice["tamano"] = siguiente
+        if registro is None:
+            continue
+        if registro.get("regage"):
+            _indice["regage"].setdefault(registro["regage"], []).append(posicion)
+        for campo in ("nif_productor", "nif_representante"):
+            if registro.get(campo):
+                posiciones = _indice["nif"].setdefault(registro[campo].upper(), [])
+                if posicion not in posiciones:
+                    posiciones.append(posicion)
+
+
+def _leer_en(posiciones: list) -> list:
+    registros = []
+    with open(RUTA_HISTORIAL, "rb") as f:
+        for posicion in posiciones:
+            f.seek(posicion)
+            registros.append(json.loads(f.readline()))
+    return registros
+
+
+def buscar_por_regage(regage: str) -> list:
+    """
+    Devuelve los registros del historial con ese regage.
+    """
+    migrar_legado()
+    with _lock:
+        _actualizar_indice()
+        posiciones = list(_indice["regage"].get(regage, []))
+    return _leer_en(posiciones) if posiciones else []
+
+
+def buscar_por_nif(nif: str) -> list:
+    """
+    Devuelve los registros del historial en los que el NIF es el productor o el representante.
+    """
+    migrar_legado()
+    with _lock:
+        _actualizar_indice()
+        posiciones = list(_indice["nif"].get(nif.upper(), []))
+    return _leer_en(posiciones) if posiciones else []
+
+
+def leer_todos() -> list:
+    """
+    Devuelve todos los registros del historial, en el orden en que se añadieron.
+    """
+    migrar_legado()
+    return [registro for _, _, registro in _leer_lineas() if registro is not None]
+
+
+def exportar(destino: str = None) -> str:
+    """
+    Escribe el historial como array JSON con indent=2 (el formato del antiguo historial.json).
+    Devuelve la ruta escrita.
+    """
+    destino = destino or os.path.join(BASE_DIR, "historial_exportado.json")
+    registros = leer_todos()
+    _escribir_atomico(destino, json.dumps(registros, ensure_ascii=False, indent=2).encode("utf-8"))
+    logging.info(f"Historial exportado a {destino}: {len(registros)} registros.")
+    return destino
+
+
+def compactar() -> dict:
+    """
+    Reescribe el historial sin líneas corruptas ni registros repetidos (idénticos).
+    Devuelve {"antes": n, "despues": n}.
+    """
+    with _bloqueo():
+        _migrar_sin_bloqueo()
+        vistos = set()
+        lineas = []
+        antes = 0
+        if os.path.exists(RUTA_HISTORIAL):
+            with open(RUTA_HISTORIAL, "rb") as f:
+                antes = sum(1 for linea in f if linea.strip())
+        for _, _, registro in _leer_lineas():
+            if registro is None:
+                continue
+            linea = _linea(registro)
+            if linea not in vistos:
+                vistos.add(linea)
+                lineas.append(linea)
+        _escribir_atomico(RUTA_HISTORIAL, b"".join(lineas))
+    logging.info(f"Historial compactado: {antes} -> {len(lineas)} registros.")
+    return {"antes": antes, "despues": len(lineas)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestión del historial de envíos (historial.jsonl).")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    parser_exportar = subcomandos.add_parser("exportar", help="Escribe el historial como array JSON (formato antiguo).")
+    parser_exportar.add_argument("destino", nargs="?", default=None)
+    subcomandos.add_parser("compactar", help="Elimina líneas corruptas y registros repetidos.")
+    subcomandos.add_parser("migrar", help="Pasa historial.json a historial.jsonl.")
+    argumentos = parser.parse_args()
+
+    if argumentos.comando == "exportar":
+        print(exportar(argumentos.destino))
+    elif argumentos.comando == "compactar":
+        print(compactar())
+    else:
+        print(migrar_legado())
@@ -6,27 +6,32 @@ construye el enlace de detalle de expediente de MITECO para cada registro y lo a
 utilizando Selenium y las funciones auxiliares de webFunctions y downloadFunctions.
 
 Flujo general:
-  1. Lee todas las carpetas dentro de output.
-import shutil
-import shutil
-  2. Para cada archivo .json dentro de cada carpeta, construye el enlace personalizado de MITECO.
-  3. Abre el enlace en el navegador con Selenium, realiza la autenticación y descarga los archivos asociados en una carpeta única por iteración.
-  4. Repite el proceso para todos los registros.
+  1. Lee todas las carpetas dentro de output y añade cada registro .json a la cola persistente (colaRegage).
+  2. Abre SESIONES_SIMULTANEAS navegadores; cada uno se autentica con el certificado una sola vez
+     (de uno en uno, porque el popup del certificado es común) y va tomando regages de la cola.
+  3. Para cada regage construye el enlace personalizado de MITECO, descarga los archivos asociados en una carpeta
+     temporal de la sesión y los pasa después a su carpeta.
+     Los documentos se guardan en almacenDocumentos: si un regage ya se descargó, se restaura sin abrir el navegador.
+  4. Los regages que fallan se reintentan con espera creciente; los JSON con todos sus regages hechos se mueven a trash.
 
 Ejemplo de uso:
-    Ejecutar este script abrirá secuencialmente todos los enlaces de los .json en output en el navegador y descargará los archivos correspondientes.
+    Ejecutar este script descargará, con varias sesiones de navegador a la vez, los archivos de todos los .json en output.
+    Si se interrumpe, al volver a ejecutarlo continúa con los regages pendientes.
 """
 
 # Imports básicos de Python
 import os
 import json
 import shutil
+import threading
 import time
 import logging
 from typing import List
 
 # Imports propios del proyecto
+import almacenDocumentos
 import certHandler
+import colaRegage
 import downloadFunctions
 import webConfiguration
 import webFunctions
@@ -40,6 +45,13 @@ from config import BASE_DIR, cargar_variables
 INFO_CERTS = os.path.join(BASE_DIR, "data", "informacionCerts.txt")
 info = cargar_variables(INFO_CERTS)
 
+# Navegadores que descargan a la vez y número de documentos esperados por regage
+SESIONES_SIMULTANEAS = 3
+DOCUMENTOS_POR_REGAGE = 3
+
+# El popup de selección de certificado es una ventana del sistema: solo un navegador puede usarlo a la vez
+_lock_certificado = threading.Lock()
+
 def get_linkMiteco(regage_val, nif_productor, nif_representante):
     """
     Construye el enlace de detalle de expediente de MITECO para un registro dado.
@@ -70,12 +82,21 @@ def autenticar_y_seleccionar_certificado(driver):
     certHandler.seleccionar_certificado_chrome(info.get("NOMBRE_CERT"))
     time.sleep(5)
 
-def descargar_documentos(driver, linkMiteco, download_path, numDownloads=3):
+def requiere_autenticacion(driver) -> bool:
+    """
+    Indica si la página actual pide iniciar sesión (botón "acceder"), es decir, si la sesión no existe o ha caducado.
+    """
+    return bool(driver.find_elements(By.XPATH, "//*[@value='acceder']"))
+
+def descargar_documentos(driver, linkMiteco, download_path, numDownloads=3, abrir=True):
     """
     Lanza la descarga de los documentos asociados a un expediente MITECO.
+    Con abrir=False se usa la página ya abierta (linkMiteco).
     """
-    webFunctions.abrir_web(driver, linkMiteco)
+    if abrir:
+        webFunctions.abrir_web(driver, linkMiteco)
     old_state = downloadFunctions.snapshot_folder_state(download_path)
+    seguimiento = downloadFunctions.seguir_descargas(driver)
 
     # Lanzar descargas
     # Buscar y hacer clic en todos los enlaces que contienen ".pdf"
@@ -83,10 +104,30 @@ def descargar_documentos(driver, linkMiteco, download_path, numDownloads=3):
 
     # Esperar la descarga
     logging.info(f"Esperando {numDownloads} descargas en {download_path}...")
-    archivos_descargados = downloadFunctions.wait_for_new_download(download_path, old_state, numDownloads)
+    archivos_descargados = downloadFunctions.wait_for_new_download(download_path, old_state, numDownloads, seguimiento=seguimiento)
     logging.info(f"Archivos descargados: {archivos_descargados}")
     return archivos_descargados
 
+def guardar_en_almacen(download_path, archivos, nombre_productor, nombre_residuo, regage):
+    """
+    Pasa los archivos descargados al almacén de documentos (los errores solo se registran).
+    """
+    for archivo in archivos:
+        try:
+            almacenDocumentos.guardar_documento(
+                os.path.join(download_path, archivo), nombre_productor, nombre_residuo, regage
+            )
+        except Exception as e:
+            logging.error(f"No se pudo guardar {archivo} en el almacén de documentos: {e}")
+
+def _nombres_carpeta(registro):
+    """
+    Devuelve los nombres de carpeta (productor, residuo) de un registro.
+    """
+    nombre_productor = registro.get("nombre_productor", "desconocido").replace(" ", "_")
+    nombre_residuo = registro.get("nombre_residuo", "desconocido").replace(" ", "_").replace("*", "")
+    return nombre_productor, nombre_residuo
+
 def procesar_registro(registro):
     """
     Procesa un único registro de regage.json: abre el enlace, autentica, descarga y guarda los archivos.
@@ -94,8 +135,15 @@ def procesar_registro(registro):
     regage = registro.get("regage", "")
     nif_productor = registro.get("nif_productor", "")
     nif_representante = registro.get("nif_representante", "")
-    nombre_productor = registro.get("nombre_productor", "desconocido").replace(" ", "_")
-    nombre_residuo = registro.get("nombre_residuo", "desconocido").replace(" ", "_").replace("*", "")
+    nombre_productor, nombre_residuo = _nombres_carpeta(registro)
+
+    # Si los documentos de este regage ya están en el almacén, no hace falta volver a descargarlos
+    restaurados = almacenDocumentos.restaurar_regage(
+        regage, downloadFunctions.ruta_descarga(nombre_productor, nombre_residuo), DOCUMENTOS_POR_REGAGE
+    )
+    if restaurados:
+        logging.info(f"Documentos de {nombre_residuo} ({nombre_productor}) ya descargados, se omite {regage}.")
+        return restaurados
 
     linkMiteco = get_linkMiteco(regage, nif_productor, nif_representante)
     logging.info(f"Abrir enlace: {linkMiteco}")
@@ -107,28 +155,37 @@ def procesar_registro(registro):
     # Configurar carpeta de descargas única para este producto
     download_path = downloadFunctions.setup_descarga(driver, nombre_productor, nombre_residuo)
 
-    archivos_descargados = descargar_documentos(driver, linkMiteco, download_path)
+    archivos_descargados = descargar_documentos(driver, linkMiteco, download_path, DOCUMENTOS_POR_REGAGE)
     downloadFunctions.finalizar_descarga(driver)
+    # Una descarga incompleta no se guarda en el almacén: la próxima vez se vuelve a descargar entera
+    if len(archivos_descargados) < DOCUMENTOS_POR_REGAGE:
+        logging.warning(
+            f"Solo se descargaron {len(archivos_descargados)} de {DOCUMENTOS_POR_REGAGE} documentos de {regage}, "
+            "no se guardan en el almacén."
+        )
+    else:
+        guardar_en_almacen(download_path, archivos_descargados, nombre_productor, nombre_residuo, regage)
     logging.info(f"Descarga finalizada para {nombre_residuo} ({nombre_productor}).")
     driver.quit()
     return archivos_descargados
 
-def procesar_multiple_regages():
+def encolar_regages_output():
     """
-    Procesa todos los registros de /output/{nombre_productor}/regage_{nombre_residuo}.json,
-    construye el enlace de MITECO y lo abre con Selenium.
-    Descarga los archivos asociados en una carpeta única por iteración.
+    Añade a la cola persistente todos los registros de /output/{nombre_productor}/regage_{nombre_residuo}.json.
+    Los JSON de regages que ya están hechos (leídos antes desde otro JSON) se mueven a trash sin encolarlos.
+    Devuelve el número de registros nuevos.
     """
     output_base = os.path.join(BASE_DIR, "output")
     if not os.path.exists(output_base):
         logging.error(f"No se encontró la carpeta: {output_base}")
-        return
+        return 0
 
     carpetas = [os.path.join(output_base, d) for d in os.listdir(output_base) if os.path.isdir(os.path.join(output_base, d))]
     if not carpetas:
         logging.error(f"No se encontraron carpetas de productor en: {output_base}")
-        return
+        return 0
 
+    nuevos = 0
     for carpeta in carpetas:
         archivos_json = [f for f in os.listdir(carpeta) if f.lower().endswith('.json')]
         for archivo_json in archivos_json:
@@ -139,17 +196,129 @@ def procesar_multiple_regages():
                 except Exception as e:
                     logging.error(f"Error leyendo {ruta_json}: {e}")
                     continue
-            procesar_registro(registro)
+            if not registro.get("regage"):
+                logging.error(f"El archivo {ruta_json} no tiene regage.")
+                continue
+            if colaRegage.encolar(registro, ruta_json):
+                nuevos += 1
+            elif colaRegage.estado(registro["regage"]) == "hecho":
+                # Ningún trabajador va a completar este JSON: su regage ya se descargó
+                logging.info(f"El regage {registro['regage']} de {ruta_json} ya está descargado.")
+                mover_a_trash(ruta_json)
+    return nuevos
 
-        # Una vez procesado el archivo, moverlo a la carpeta trash
-        trash_dir = os.path.join(BASE_DIR, "trash")
-        os.makedirs(trash_dir, exist_ok=True)
-        destino = os.path.join(trash_dir, os.path.basename(json_file))
-        try:
-            shutil.move(json_file, destino)
-            logging.info(f"Archivo {os.path.basename(json_file)} movido a {destino}.")
-        except Exception as e:
-            logging.error(f"Error al mover {json_file} a trash: {e}")
+def mover_a_trash(ruta_json):
+    """
+    Mueve un JSON ya procesado a trash/{carpeta del productor}/.
+    """
+    trash_dir = os.path.join(BASE_DIR, "trash", os.path.basename(os.path.dirname(ruta_json)))
+    os.makedirs(trash_dir, exist_ok=True)
+    destino = os.path.join(trash_dir, os.path.basename(ruta_json))
+    try:
+        shutil.move(ruta_json, destino)
+        logging.info(f"Archivo {os.path.basename(ruta_json)} movido a {destino}.")
+    except Exception as e:
+        logging.error(f"Error al mover {ruta_json} a trash: {e}")
+
+def _descargar_regage(sesion, registro):
+    """
+    Descarga los documentos de un registro con la sesión (navegador ya abierto) indicada.
+    Se autentica con el certificado solo si la sesión aún no lo está o ha caducado.
+    Devuelve la lista de archivos.
+    """
+    regage = registro["regage"]
+    nombre_productor, nombre_residuo = _nombres_carpeta(registro)
+    download_path = downloadFunctions.ruta_descarga(nombre_productor, nombre_residuo)
+
+    restaurados = almacenDocumentos.restaurar_regage(regage, download_path, DOCUMENTOS_POR_REGAGE)
+    if restaurados:
+        return restaurados
+
+    if sesion["driver"] is None:
+        sesion["driver"] = webConfiguration.configure()
+    driver = sesion["driver"]
+    linkMiteco = get_linkMiteco(regage, registro.get("nif_productor", ""), registro.get("nif_representante", ""))
+
+    webFunctions.abrir_web(driver, linkMiteco)
+    if requiere_autenticacion(driver):
+        with _lock_certificado:
+            inicio = time.monotonic()
+            autenticar_y_seleccionar_certificado(driver)
+            logging.info(f"Sesión {sesion['indice']} autenticada en {time.monotonic() - inicio:.1f}s.")
+        webFunctions.abrir_web(driver, linkMiteco)
+
+    # Cada regage descarga en una carpeta temporal propia: todos generan los mismos nombres de archivo y otra sesión
+    # puede estar descargando a la vez en la misma carpeta de productor/residuo
+    with downloadFunctions.sesion_descarga(driver, "regage_") as descarga:
+        archivos = descargar_documentos(driver, linkMiteco, descarga["carpeta"], DOCUMENTOS_POR_REGAGE, abrir=False)
+        if len(archivos) < DOCUMENTOS_POR_REGAGE:
+            raise RuntimeError(f"Solo se descargaron {len(archivos)} de {DOCUMENTOS_POR_REGAGE} documentos.")
+        archivos = downloadFunctions.mover_descargas(descarga["carpeta"], archivos, download_path)
+    guardar_en_almacen(download_path, archivos, nombre_productor, nombre_residuo, regage)
+    return archivos
+
+def _trabajador_regages(indice):
+    """
+    Toma regages de la cola hasta vaciarla, reutilizando un único navegador autenticado.
+    Si un regage falla, se cierra el navegador (puede haber quedado en mal estado) y se abre otro para el siguiente.
+    """
+    sesion = {"indice": indice, "driver": None}
+    try:
+        while True:
+            elemento = colaRegage.tomar_siguiente()
+            if elemento is None:
+                espera = colaRegage.segundos_hasta_siguiente()
+                if espera is None:
+                    return
+                time.sleep(min(espera, 5) or 0.5)
+                continue
+
+            regage = elemento["regage"]
+            inicio = time.monotonic()
+            try:
+                archivos = _descargar_regage(sesion, elemento["registro"])
+            except Exception as e:
+                colaRegage.marcar_fallo(regage, str(e), time.monotonic() - inicio)
+                if sesion["driver"] is not None:
+                    try:
+                        sesion["driver"].quit()
+                    except Exception:
+                        pass
+                    sesion["driver"] = None
+                continue
+
+            duracion = time.monotonic() - inicio
+            colaRegage.marcar_hecho(regage, duracion, len(archivos))
+            logging.info(f"[sesión {indice}] {regage}: {len(archivos)} documentos en {duracion:.1f}s.")
+            if elemento["origen"] and os.path.exists(elemento["origen"]) and colaRegage.origen_completado(elemento["origen"]):
+                mover_a_trash(elemento["origen"])
+    finally:
+        if sesion["driver"] is not None:
+            sesion["driver"].quit()
+
+def procesar_multiple_regages(sesiones=SESIONES_SIMULTANEAS):
+    """
+    Procesa todos los registros de /output/{nombre_productor}/regage_{nombre_residuo}.json con varias sesiones
+    de navegador a la vez. La cola es persistente: si se interrumpe, al volver a ejecutar se continúa
+    (los regages en curso y los fallidos se vuelven a intentar).
+    """
+    nuevos = encolar_regages_output()
+    reanudados = colaRegage.reanudar()
+    logging.info(f"Cola de regages: {nuevos} nuevos, {reanudados} reanudados.")
+
+    inicio = time.monotonic()
+    hilos = [
+        threading.Thread(target=_trabajador_regages, args=(indice,), name=f"regage-{indice}")
+        for indice in range(1, sesiones + 1)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    resumen = colaRegage.resumen()
+    logging.info(f"Descarga de regages terminada en {time.monotonic() - inicio:.1f}s: {resumen}")
+    return resumen
 
 if __name__ == "__main__":
     procesar_multiple_regages()
\ No newline at end of file
@@ -1,8 +1,13 @@
 import loggerConfig
 import logging
 import nimaFunctions
+import cacheNima
+import driverPool
+import rutasNima
 import concurrent.futures
+import functools
 import re
+import time
 import concurrent.futures
 
 
@@ -10,6 +15,40 @@ import concurrent.futures
 #nifs_autonomos_nubelus = ['52743133Q', '45911699L', '52656960R', '20149971Q', '27368619E', '22583129G', '26763003L', '53051003P', '53098280C', '73545010A', '53754876N', '24390542P', '26041956E', '22630487M', '48444681B', 'X9206104D', '20835666N', 'X8006597K', '73591973T', '22686614N', '53098251Z', '73759565Z', '08999526V', '33407383K', '22551825A', '73763380B', 'X6899780X', '44881090V', '46184178V', '25400463E', 'X5899717X', '24383777M', 'X4128683E', '22571934X', '24383591A', '19848120V', '45633333E', '48582050R', '52637317T', '48583119N', '73572646Q', '53363621X', '73578598B', 'X6459786Y', '72210201E', '11129635G', '24373275Z', '22548141E', '53200127T', '23860429E', 'X2322633R', '29188286K', '04566369H', '22563388C', '29196646D', '52685638K', 'Y0475213R', 'Y7510185D', '73640419P', 'X5285817A', '73596264J', '53053746Z', 'X5409454S', 'X3531815G', '19001693J', 'Z0294214A', '20248281R', 'Y0736694H', '54776517Q', 'X9138692X', '48436746B', '19005486B', '46278839X', '18946291H', '45469765F', '53052216W', '22689961R', '54865598H', '73390901V', '20167219Z', '29182289G', '71550470T', 'X8748111S', '20434471Y', '48312648K', '20412885V', '29215276D', 'X6682229Q', '73400920P', '48758157C', '52731009J', '20992645Q', '23320542Z', '52701237A', '20828131K', '19996780M', 'X4164397V', '73573708C', '73559599X', '11129336G', '18932243T', '73555065F', '20464300G', '16647032T', '20475391D', '20470002W', 'X6113661P', '20020676G', '54600039V', '52940617E', '33463423X', '44531634T', '53362803C', 'X7399953W', '52948334B', '53256469S', '45760407K', '22550868N', '44117651V', '53256955H', 'X4535770D', '26746849B', '73558530E', '24480347K', 'X9823756L', '48412729Y', '45630922A', '25410415S', '53254033V', '53662298D', '44860422A', '25423422G', '53376228J', '19440701C', '52744053Q', '24373079W', '52703083D', '52670983V', 'X7542984L', '19997565P', 'Y1060657A', '19850768C', '03157886D', '10252182R', 'Y1435228L', 'Z0487375X', 'Y8500008G', '53363618F', 'X6402609F', '29193550H', '73941809Y', '52634406X', '53608156D', '53876745G', '20832070G', 'Y6535524L', 'X6248661K', '23315763L', '48313511X', '48441275D', '29217104C', '48436080N', 'X6506549X', '73939839Z', 'Y1730079X', 'Y8959828P', '22675722E', '48707161S', '73574135X', '19082642W', '20462333S', '26746396H', '48442707S', 'X9055748G', '20488361F', 'X5419550Z', '52538338J', '44526530W', '24374870E', 'Y1469120D', '53222648G', '07478874X', '03538080J', '24390507L', '22596915J', '20471541T', '11804990X', 'X8107773C', 'X5059397H', 'X5872910K', 'X6631339W', '09455541B', '03906969M', '06211299B', '50474496F', 'X3058004Q', '03868458L', 'X6179858B', '06209717Q', 'X8623906X', '46842031R', '51912811V', 'Y3354851Q', 'X5357629D', '03803966L', '03873683T', '07215307T', 'X5690857J', '06232197W', '20922483G', 'X6467785R', '19007667F', '52959460M', '49019515Y', '07533828V', '03833298A', '52956738C', '24343328J', '03888055C', '53623312P', '05272232B', '70349580D', '06261543T', '06253709D', '70338095R', 'X8352225M', '48436087L', 'X2989389X', '48715134F', '06277338V', '03919086R', '50474374T', '07507362R', '18950468D', '06263015T', '03821820W', 'Y3352859W', '52120768P', '70416203R', '06228979G', '03813822P', '50599757X', '03885838B', '03963262V', '03879645M', '03796692J', '52537761B', '03889931X', '04247131C', '03833285J', '06572950X', 'X6148906V', '70361036B', '03843364H', '05455480H', '21412968Z', 'X7783396N', '53056941N', '48590095L', '78395480A', '06281748B', 'X1974987T', '53431325W', '03784042J', '44838581N', '05399704V', '18946390W', '50050198J', '11128368W', '04212156M']
 #nifs_nubelus = nifs_autonomos_nubelus + nifs_autonomos_empresas_nubelus
 
+# Orden por defecto de las comunidades en las búsquedas escalonadas
+COMUNIDADES_NIMA = [
+    ("Valencia", nimaFunctions.busqueda_NIMA_Valencia),
+    ("Madrid", nimaFunctions.busqueda_NIMA_Madrid),
+    ("Cataluña", nimaFunctions.busqueda_NIMA_Cataluña),
+    ("Castilla", nimaFunctions.busqueda_NIMA_Castilla),
+]
+# Segundos que se espera a la comunidad en curso antes de lanzar la siguiente en paralelo
+RETARDO_ESCALONADO = 10
+# Comunidades cuya búsqueda admite elegir backend ("http" o "selenium")
+COMUNIDADES_CON_BACKEND = ("Valencia", "Madrid", "Cataluña")
+
+def comunidades_con_backend(backend=None):
+    """
+    Devuelve COMUNIDADES_NIMA con el backend indicado ("http" o "selenium") aplicado a las comunidades que lo admiten.
+    Lanza ValueError si el backend no existe.
+    """
+    backend = nimaFunctions.validar_backend(backend)
+    return [
+        (nombre, functools.partial(funcion_busqueda, backend=backend) if nombre in COMUNIDADES_CON_BACKEND else funcion_busqueda)
+        for nombre, funcion_busqueda in COMUNIDADES_NIMA
+    ]
+
+def drivers_por_busqueda(backend=None):
+    """
+    Devuelve cuántos drivers del pool puede tener prestados a la vez una búsqueda escalonada en el peor caso:
+    uno por comunidad que se consulta con Selenium. Con el backend "http" solo cuentan las comunidades sin backend
+    HTTP (el paso a Selenium cuando falla el HTTP es excepcional). Las fichas de Valencia solo usan drivers libres.
+    """
+    backend = nimaFunctions.validar_backend(backend)
+    if backend == "selenium":
+        return len(COMUNIDADES_NIMA)
+    return max(1, sum(1 for nombre, _ in COMUNIDADES_NIMA if nombre not in COMUNIDADES_CON_BACKEND))
+
 #NIFs multicentro
 nif_multicentro_valencia = "B43693274"
 nif_multicentro_madrid = "B86681426"
@@ -32,7 +71,9 @@ def validar_nif(nif):
 def busqueda_NIMA_secuencial(nif):
     """
     Toma el nif y busca en las diferentes comunidades autónomas en el orden:
-    Valencia, Madrid, Castilla, Cataluña.
+    Valencia, Madrid, Cataluña, Castilla, reordenado según el histórico de rutasNima.
+    Respeta la prioridad de Valencia (ver _elegir_ganador): si otra comunidad encuentra el NIF antes
+    de buscar en Valencia, se busca en Valencia antes de dar el resultado.
     Devuelve un JSON con los datos o lanza una excepción con mensaje descriptivo.
     """
     try:
@@ -41,14 +82,32 @@ def busqueda_NIMA_secuencial(nif):
         logging.error(str(e))
         return None
 
-    for funcion_busqueda in [nimaFunctions.busqueda_NIMA_Valencia, nimaFunctions.busqueda_NIMA_Madrid,
-                                nimaFunctions.busqueda_NIMA_Cataluña, nimaFunctions.busqueda_NIMA_Castilla]:
+    comunidades = rutasNima.ordenar_comunidades(nif, COMUNIDADES_NIMA)
+    orden = [nombre for nombre, _ in comunidades]
+    resultados = {}
+    while comunidades:
+        nombre, funcion_busqueda = comunidades.pop(0)
+        inicio = time.perf_counter()
         try:
             resultado = funcion_busqueda(nif)
-            if resultado:
-                return resultado
         except Exception as e:
-            logging.info(f"No encontrado en {funcion_busqueda.__name__}: {e}")
+            logging.info(f"No encontrado en {nombre}: {e}")
+            continue
+        encontrado = _resultado_valido(resultado)
+        rutasNima.registrar_busqueda(nif, nombre, encontrado, time.perf_counter() - inicio,
+                                     len(resultado["centros"]) if encontrado else 0)
+        if encontrado:
+            resultados[nombre] = resultado
+        ganador = _elegir_ganador(resultados, {pendiente for pendiente, _ in comunidades}, orden)
+        if ganador:
+            return resultados[ganador]
+        if resultados:
+            # Hay datos, pero falta Valencia, que tiene prioridad: las demás ya no pueden ganar
+            comunidades = [comunidad for comunidad in comunidades if comunidad[0] == "Valencia"]
+    # Valencia ha fallado después de que otra comunidad encontrara el NIF
+    ganador = _elegir_ganador(resultados, set(), orden)
+    if ganador:
+        return resultados[ganador]
 
     logging.error("NIF no encontrado en ninguna comunidad")
     return None
@@ -61,55 +120,203 @@ def busqueda_NIMA_secuencial(nif):
 # 1. Usar los 3 a la vez y ver si se puede hacer en paralelo. (CONSUME MUCHO RECURSOS)
 # 2. Usar los más rapidos primero (medir la velocidad de cada uno)
 
-def busqueda_NIMA(nif):
+def _resultado_valido(resultado):
+    """
+    Un resultado es válido si es un JSON con al menos un centro.
+    """
+    return isinstance(resultado, dict) and bool(resultado.get("centros"))
+
+def _elegir_ganador(resultados, comunidades_sin_respuesta, orden):
+    """
+    Aplica la regla de prioridad de Valencia: si Valencia tiene datos gana siempre, y si Valencia
+    todavía no ha respondido (está buscando o aún no se ha lanzado) no se decide nada.
+    En otro caso gana la primera comunidad con datos según 'orden'.
+    Devuelve el nombre de la comunidad ganadora o None si aún no se puede decidir.
+    """
+    if "Valencia" in resultados:
+        return "Valencia"
+    if "Valencia" in comunidades_sin_respuesta:
+        return None
+    for nombre in orden:
+        if nombre in resultados:
+            return nombre
+    return None
+
+def busqueda_NIMA_escalonada(nif, comunidades=None, retardo=RETARDO_ESCALONADO):
     """
-    Lanza las búsquedas de NIMA en Valencia, Madrid, Castilla y Cataluña en paralelo.
-    Espera siempre a que termine la búsqueda de Valencia antes de devolver cualquier resultado.
-    Si Valencia devuelve un resultado válido (JSON con centros), lo devuelve siempre.
-    Si Valencia no devuelve nada, devuelve el primer resultado válido que llegue de las otras comunidades,
-    pero solo después de que Valencia haya terminado.
+    Búsqueda escalonada (hedged) en varias comunidades:
+      - Empieza por la primera comunidad de 'comunidades'.
+      - Lanza la siguiente cuando la actual no encuentra el NIF, o cuando pasan 'retardo' segundos sin respuesta.
+      - Respeta la prioridad de Valencia (ver _elegir_ganador): si otra comunidad encuentra el NIF antes
+        de que se haya lanzado Valencia (rutasNima puede ponerla detrás), Valencia se lanza en ese momento.
+      - En cuanto hay ganador, cancela las búsquedas restantes cerrando sus navegadores.
+    Así se obtiene una latencia casi paralela sin abrir un Chrome por comunidad en cada petición.
+
+    Una comunidad que lanza una excepción (pool agotado, navegador que no arranca, error HTTP...) no ha
+    respondido: si ninguna otra encuentra el NIF, no se puede afirmar que no exista y se lanza RuntimeError.
+
+    Args:
+        nif (str): NIF ya validado.
+        comunidades (list): Lista de tuplas (nombre, funcion_busqueda). Por defecto COMUNIDADES_NIMA.
+        retardo (float): Segundos de espera antes de lanzar la siguiente comunidad en paralelo.
+
+    Returns:
+        tuple: (comunidad, resultado) o (None, None) si todas las comunidades responden sin el NIF.
+
+    Raises:
+        RuntimeError: Si no se encuentra el NIF y alguna comunidad ha fallado.
     """
+    comunidades = list(comunidades or COMUNIDADES_NIMA)
+    orden = [nombre for nombre, _ in comunidades]
+    pendientes = list(comunidades)
+    en_curso = {}
+    resultados = {}
+    fallos = {}
+    cancelacion = driverPool.crear_cancelacion()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(comunidades))
+
+    def lanzar_siguiente(nombre=None):
+        indice = next((i for i, (pendiente, _) in enumerate(pendientes) if pendiente == nombre), 0)
+        nombre, funcion_busqueda = pendientes.pop(indice)
+        logging.info(f"Lanzando búsqueda de {nif} en {nombre}.")
+
+        def tarea():
+            inicio = time.perf_counter()
+            with driverPool.con_cancelacion(cancelacion):
+                resultado = funcion_busqueda(nif)
+            return resultado, time.perf_counter() - inicio
+
+        en_curso[executor.submit(tarea)] = nombre
+
+    ganador = None
+    try:
+        lanzar_siguiente()
+        while en_curso:
+            hechos, _ = concurrent.futures.wait(
+                en_curso,
+                timeout=retardo if pendientes and not resultados else None,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not hechos:
+                # La comunidad en curso tarda: se lanza la siguiente en paralelo
+                lanzar_siguiente()
+                continue
+
+            for future in hechos:
+                nombre = en_curso.pop(future)
+                try:
+                    resultado, latencia = future.result()
+                except Exception as e:
+                    logging.warning(f"Error buscando {nif} en {nombre}: {e}")
+                    fallos[nombre] = str(e)
+                    continue
+                encontrado = _resultado_valido(resultado)
+                rutasNima.registrar_busqueda(nif, nombre, encontrado, latencia, len(resultado["centros"]) if encontrado else 0)
+                if encontrado:
+                    resultados[nombre] = resultado
+                else:
+                    logging.info(f"NIF {nif} no encontrado en {nombre}.")
+
+            sin_respuesta = set(en_curso.values()) | {nombre for nombre, _ in pendientes}
+            ganador = _elegir_ganador(resultados, sin_respuesta, orden)
+            if ganador:
+                break
+            # Ya hay datos, pero Valencia tiene prioridad y aún no se ha lanzado: se lanza sin esperar al retardo
+            if resultados and "Valencia" in sin_respuesta and "Valencia" not in en_curso.values():
+                lanzar_siguiente("Valencia")
+            # Si no hay datos todavía, un fallo lanza la siguiente comunidad sin esperar al retardo
+            if not resultados and pendientes:
+                lanzar_siguiente()
+    finally:
+        if en_curso:
+            logging.info(f"Cancelando búsquedas restantes de {nif}: {sorted(en_curso.values())}")
+        driverPool.cancelar(cancelacion)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if ganador:
+        logging.info(f"NIF {nif} encontrado en {ganador}.")
+        return ganador, resultados[ganador]
+    if fallos:
+        detalle = "; ".join(f"{nombre}: {error}" for nombre, error in fallos.items())
+        raise RuntimeError(f"No se pudo completar la búsqueda de {nif} en todas las comunidades ({detalle}).")
+    return None, None
+
+def busqueda_NIMA_con_comunidad(nif, backend=None):
+    """
+    Busca el NIF en los portales NIMA con la búsqueda escalonada (busqueda_NIMA_escalonada), empezando
+    por Valencia. Si Valencia devuelve un resultado válido (JSON con centros), lo devuelve siempre.
+    'backend' elige cómo se consultan los portales que lo admiten (ver nimaFunctions.BACKENDS).
+
+    Devuelve una tupla (comunidad, resultado). comunidad es None si el NIF no se ha encontrado,
+    y resultado es None si el NIF no es válido.
+    Lanza RuntimeError si el NIF no aparece y alguna comunidad no ha podido responder: así ese fallo
+    no se guarda en cacheNima como "NIF no encontrado".
+    """
+    comunidades = comunidades_con_backend(backend)
     try:
         validar_nif(nif)
     except ValueError as e:
         logging.error(str(e))
-        return None
+        return None, None
 
-    comunidades = [
-        ("Valencia", nimaFunctions.busqueda_NIMA_Valencia),
-        #("Madrid", nimaFunctions.busqueda_NIMA_Madrid),
-        #("Castilla", nimaFunctions.busqueda_NIMA_Castilla),
-        #("Cataluña", nimaFunctions.busqueda_NIMA_Cataluña)
-    ]
+    comunidades = rutasNima.ordenar_comunidades(nif, comunidades)
+    comunidad, resultado = busqueda_NIMA_escalonada(nif, comunidades)
+    if comunidad:
+        return comunidad, resultado
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        future_to_comunidad = {executor.submit(func, nif): nombre for nombre, func in comunidades}
-        resultados = {}
-        valencia_resultado = None
+    logging.error("NIF no encontrado en ninguna comunidad")
+    return None, {"error": "NIF no encontrado en ninguna comunidad"}
 
-        for future in concurrent.futures.as_completed(future_to_comunidad):
-            nombre = future_to_comunidad[future]
-            try:
-                resultado = future.result()
-                if resultado and isinstance(resultado, dict) and resultado.get("centros") and len(resultado["centros"]) > 0:
-                    resultados[nombre] = resultado
-                    if nombre == "Valencia":
-                        valencia_resultado = resultado
-                        break  # Si Valencia tiene datos, paramos aquí
-            except Exception as e:
-                logging.info(f"No encontrado en {nombre}: {e}")
-
-    # Si Valencia ha devuelto datos válidos, devuélvelos
-    if valencia_resultado:
-        return valencia_resultado
-
-    # Si no, devuelve el primer resultado válido de otra comunidad
-    for nombre in ["Madrid",  "Cataluña"]:
-        if nombre in resultados:
-            return resultados[nombre]
+def busqueda_NIMA(nif, backend=None):
+    """
+    Busca el NIF en los portales NIMA (ver busqueda_NIMA_con_comunidad) y devuelve solo el resultado.
+    """
+    _, resultado = busqueda_NIMA_con_comunidad(nif, backend)
+    return resultado
 
-    logging.error("NIF no encontrado en ninguna comunidad")
-    return {"error": "NIF no encontrado en ninguna comunidad"}
+def busqueda_NIMA_cacheada(nif, usar_cache=True, invalidar=False, backend=None):
+    """
+    Igual que busqueda_NIMA, pero consultando antes la caché persistente de cacheNima.
+    Un acierto de caché se devuelve sin abrir ningún navegador.
+
+    Args:
+        nif (str): NIF a buscar.
+        usar_cache (bool): Si es False, ignora la caché y busca en los portales (guardando el resultado nuevo).
+        invalidar (bool): Si es True, borra la entrada de caché del NIF antes de buscar.
+        backend (str, optional): "http" o "selenium" (ver nimaFunctions.BACKENDS).
+
+    Raises:
+        ValueError: Si el backend no existe.
+    """
+    funcion_busqueda = functools.partial(busqueda_NIMA_con_comunidad, backend=nimaFunctions.validar_backend(backend))
+    if invalidar:
+        cacheNima.invalidar(nif)
+    _, resultado, origen = cacheNima.obtener_o_buscar(nif, funcion_busqueda, bypass=not usar_cache)
+    logging.info(f"Resultado de {nif} obtenido desde: {origen}")
+    return resultado
+
+def busqueda_NIMA_detallada(nif, usar_cache=True, backend=None):
+    """
+    Busca un NIF (con caché) y devuelve el resultado junto con la comunidad, el origen y el tiempo empleado.
+    Pensada para las búsquedas por lotes: nunca lanza excepciones, el error se devuelve en el campo 'error'.
+
+    Returns:
+        dict: {"nif", "comunidad", "origen", "tiempo", "resultado", "error"}
+    """
+    inicio = time.perf_counter()
+    detalle = {"nif": nif, "comunidad": None, "origen": None, "tiempo": None, "resultado": None, "error": None}
+    try:
+        funcion_busqueda = functools.partial(busqueda_NIMA_con_comunidad, backend=backend)
+        comunidad, resultado, origen = cacheNima.obtener_o_buscar(nif, funcion_busqueda, bypass=not usar_cache)
+        detalle.update({"comunidad": comunidad, "origen": origen, "resultado": resultado})
+        if resultado is None:
+            detalle["error"] = f"Formato de NIF incorrecto: {nif}"
+    except Exception as e:
+        logging.error(f"Error en la búsqueda detallada de {nif}: {e}")
+        detalle["error"] = str(e)
+    detalle["tiempo"] = round(time.perf_counter() - inicio, 3)
+    return detalle
 
-datos = nimaFunctions.busqueda_NIMA_Castilla("70345107K")
-print(datos)
\ No newline at end of file
+if __name__ == "__main__":
+    datos = nimaFunctions.busqueda_NIMA_Castilla("70345107K")
+    print(datos)
@@ -8,15 +8,45 @@ en el endpoint correspondiente.
 """
 
 import logging
+import queue
+import threading
 import webFunctions
-import webConfiguration
+import driverPool
 import excelFunctions
+import downloadFunctions
+import nimaHttp
 
 URL_NIMA_CASTILLA = "https://ireno.castillalamancha.es/forms/geref000.htm"
 URL_NIMA_VALENCIA = "https://residuos.gva.es/RES_BUSCAWEB/buscador_residuos_avanzado.aspx"
 URL_NIMA_MADRID = "https://gestiona.comunidad.madrid/pcea_nima_web/html/web/InicioAccion.icm"
 URL_NIMA_CATALUÑA = "https://sdr.arc.cat/sdr/ListNimas.do?menu=G"
 
+# Backends de búsqueda disponibles: "http" (sin navegador, con Selenium como respaldo) o "selenium"
+BACKENDS = ("http", "selenium")
+BACKEND_POR_DEFECTO = "http"
+
+def validar_backend(backend):
+    """
+    Devuelve el backend a usar (BACKEND_POR_DEFECTO si no se indica). Lanza ValueError si no existe.
+    """
+    backend = backend or BACKEND_POR_DEFECTO
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de búsqueda no válido: {backend}. Opciones: {', '.join(BACKENDS)}")
+    return backend
+
+def _buscar_con_backend(nif, backend, busqueda_http, busqueda_selenium, comunidad):
+    """
+    Ejecuta la búsqueda con el backend indicado. Si el backend HTTP falla (la web ha cambiado o necesita
+    ejecutar JavaScript), repite la búsqueda con Selenium.
+    """
+    backend = validar_backend(backend)
+    if backend == "http":
+        try:
+            return busqueda_http(nif)
+        except Exception as e:
+            logging.warning(f"Fallo del backend HTTP de NIMA {comunidad} para {nif}, se usa Selenium: {e}")
+    return busqueda_selenium(nif)
+
 # Estructura estándar para empresa y centro
 EMPRESA_KEYS = [
     "nif", "nombre", "direccion", "cp", "provincia", "telefono"
@@ -51,45 +81,53 @@ def _fill_centro(data):
         "codigos_residuos": codigos
     }
 
-# --- VALENCIA ---
-def extraer_datos_valencia(driver):
+def _resultado_centros(empresa, centros):
     """
-    Extrae los datos principales de la ficha de un centro en la web de NIMA Valencia.
-    Devuelve un diccionario con los datos relevantes.
-    Incluye todos los códigos de residuos disponibles para el centro como una lista.
+    Devuelve el JSON estándar con la empresa y sus centros, o la estructura vacía si no se ha encontrado nada.
     """
-    # Datos de la empresa
-    nombre_empresa = webFunctions.obtener_texto_elemento_por_id(driver, "NOMBREEMPRESA1-0") or ""
-    nif = webFunctions.obtener_texto_elemento_por_id(driver, "ENIF1-0") or ""
-    direccion = webFunctions.obtener_texto_elemento_por_id(driver, "EDIRECCION1-0") or ""
-    codigo_postal = webFunctions.obtener_texto_elemento_por_id(driver, "ECODIPOS1-0") or ""
-    provincia = webFunctions.obtener_texto_elemento_por_id(driver, "Text8-0") or ""
-    telefono = webFunctions.obtener_texto_elemento_por_id(driver, "ETELEFONO1-0") or ""
-
-    # Datos del centro
-    nombre_centro = webFunctions.obtener_texto_elemento_por_id(driver, "NOMBRECENTRO1-0-0") or ""
-    nima = webFunctions.obtener_texto_elemento_por_id(driver, "FCENCODCENTRO1-0-0") or ""
-    direccion_centro = webFunctions.obtener_texto_elemento_por_id(driver, "FDIRECCION1-0-0") or ""
-    cp_centro = ""  # No disponible
-    provincia_centro = webFunctions.obtener_texto_elemento_por_id(driver, "Text7-0-0") or ""
-    codigo_ine_municipio = webFunctions.obtener_texto_elemento_por_id(driver, "FCODINE1-0-0") or ""
-    codigo_ine_provincia = codigo_ine_municipio[:2] if codigo_ine_municipio else ""
-    telefono_centro = webFunctions.obtener_texto_elemento_por_id(driver, "FTELEFONO1-0-0") or ""
+    if empresa and centros:
+        return {
+            "empresa": empresa,
+            "centros": centros
+        }
+    else:
+        return {
+            "empresa": _fill_empresa({}),
+            "centros": []
+        }
 
-    # Códigos de residuos (como lista)
-    autorizaciones = []
-    idx = 0
-    while True:
-        try:
-            autorizacion = webFunctions.obtener_texto_elemento_por_id(driver, f"Text10-0-0-{idx}")
-            if autorizacion:
-                autorizacion_split = autorizacion.split()
-                if autorizacion_split:
-                    autorizaciones.append(autorizacion_split[0])
-            idx += 1
-        except Exception:
-            break  # Sale del bucle cuando no encuentra más autorizaciones
-    
+# --- VALENCIA ---
+# Id del elemento (dentro del iframe de la ficha) que contiene cada dato en la web de NIMA Valencia
+CAMPOS_VALENCIA = {
+    "nombre_empresa": "NOMBREEMPRESA1-0",
+    "nif": "ENIF1-0",
+    "direccion": "EDIRECCION1-0",
+    "codigo_postal": "ECODIPOS1-0",
+    "provincia": "Text8-0",
+    "telefono": "ETELEFONO1-0",
+    "nombre_centro": "NOMBRECENTRO1-0-0",
+    "nima": "FCENCODCENTRO1-0-0",
+    "direccion_centro": "FDIRECCION1-0-0",
+    "provincia_centro": "Text7-0-0",
+    "codigo_ine_municipio": "FCODINE1-0-0",
+    "telefono_centro": "FTELEFONO1-0-0",
+}
+# Prefijo de los ids de las autorizaciones del centro (Text10-0-0-0, Text10-0-0-1, ...)
+PREFIJO_AUTORIZACIONES_VALENCIA = "Text10-0-0-"
+# Especificación para leer la ficha completa en una sola llamada (ver webFunctions.extraer_campos_por_script)
+ESPECIFICACION_VALENCIA = {
+    **{clave: {"id": elemento_id, "sub": "span"} for clave, elemento_id in CAMPOS_VALENCIA.items()},
+    "autorizaciones": {"prefijo": PREFIJO_AUTORIZACIONES_VALENCIA, "sub": "span"},
+}
+# Navegadores del pool que puede usar a la vez una búsqueda para abrir las fichas de los centros (1 = secuencial)
+FICHAS_SIMULTANEAS_VALENCIA = 3
+
+def _construir_datos_valencia(campos, autorizaciones):
+    """
+    Construye el JSON estándar {"empresa", "centros"} de un centro de NIMA Valencia a partir de los textos
+    leídos de la ficha (claves de CAMPOS_VALENCIA) y la lista de autorizaciones.
+    Es común a los backends Selenium y HTTP.
+    """
     # Extraer codigos_residuos de las autorizaciones encontradas
     claves_autorizacion = list(excelFunctions.dic_codigos_residuos_valencia.keys())
     codigos_residuos = []
@@ -99,21 +137,21 @@ def extraer_datos_valencia(driver):
                 codigos_residuos.append(clave)
 
     empresa = _fill_empresa({
-        "nif": nif,
-        "nombre": nombre_empresa,
-        "direccion": direccion,
-        "cp": codigo_postal,
-        "provincia": provincia,
-        "telefono": telefono
+        "nif": campos.get("nif") or "",
+        "nombre": campos.get("nombre_empresa") or "",
+        "direccion": campos.get("direccion") or "",
+        "cp": campos.get("codigo_postal") or "",
+        "provincia": campos.get("provincia") or "",
+        "telefono": campos.get("telefono") or ""
     })
     centro = _fill_centro({
-        "nima": nima,
-        "nombre": nombre_centro,
-        "direccion": direccion_centro,
-        "cp": cp_centro,
-        "provincia": provincia_centro,
-        "codigo_ine": codigo_ine_municipio,
-        "telefono": telefono_centro,
+        "nima": campos.get("nima") or "",
+        "nombre": campos.get("nombre_centro") or "",
+        "direccion": campos.get("direccion_centro") or "",
+        "cp": "",  # No disponible
+        "provincia": campos.get("provincia_centro") or "",
+        "codigo_ine": campos.get("codigo_ine_municipio") or "",
+        "telefono": campos.get("telefono_centro") or "",
         "autorizaciones": autorizaciones,
         "codigos_residuos": codigos_residuos
     })
@@ -122,33 +160,99 @@ def extraer_datos_valencia(driver):
         "centros": [centro]
     }
 
-def busqueda_NIMA_Valencia(nif):
+def extraer_datos_valencia(driver):
     """
-    Busca todos los centros asociados a un NIF en la web de NIMA Valencia y devuelve un JSON con los datos de la empresa
-    y una lista de sus centros asociados.
+    Extrae los datos principales de la ficha de un centro en la web de NIMA Valencia.
+    Devuelve un diccionario con los datos relevantes.
+    Incluye todos los códigos de residuos disponibles para el centro como una lista.
     """
-    driver = webConfiguration.configure()
-    webFunctions.abrir_web(driver, URL_NIMA_VALENCIA)
-    webFunctions.escribir_en_elemento_por_id(driver, "ctl00_ContentPlaceHolder1_txtNIF", nif)
-    webFunctions.clickar_boton_por_id(driver, "ctl00_ContentPlaceHolder1_btBuscar")
+    campos = webFunctions.extraer_campos_por_script(
+        driver,
+        ESPECIFICACION_VALENCIA,
+        esperar_xpath=f"//*[@id='{CAMPOS_VALENCIA['nif']}']//span",
+        en_iframe=True
+    )
+
+    # Códigos de residuos (como lista)
+    autorizaciones = []
+    for autorizacion in campos.pop("autorizaciones", None) or []:
+        autorizacion_split = autorizacion.split()
+        if autorizacion_split:
+            autorizaciones.append(autorizacion_split[0])
+
+    return _construir_datos_valencia({clave: valor or "" for clave, valor in campos.items()}, autorizaciones)
 
+def _extraer_fichas_valencia(driver, urls_centros):
+    """
+    Abre las fichas de los centros y devuelve sus datos (o None si una ficha falla) en el mismo orden que 'urls_centros'.
+
+    Si el pool de drivers está activo, además del driver de la búsqueda se piden hasta FICHAS_SIMULTANEAS_VALENCIA - 1
+    drivers libres para repartir las fichas entre ellos; si no queda ninguno libre se sigue solo con el driver
+    de la búsqueda. Las fichas abiertas a la vez en el portal se limitan con nimaHttp.limite_portal.
+    """
+    resultados = [None] * len(urls_centros)
+    pendientes = queue.Queue()
+    for indice, url in enumerate(urls_centros):
+        pendientes.put((indice, url))
+    cancelacion = driverPool.cancelacion_actual()
+
+    def procesar(driver_ficha):
+        while True:
+            try:
+                indice, url = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            if cancelacion is not None and cancelacion["evento"].is_set():
+                return
+            with nimaHttp.limite_portal("Valencia"):
+                try:
+                    driver_ficha.get(url)
+                    logging.info(f"Procesando URL: {url}")
+                    resultados[indice] = extraer_datos_valencia(driver_ficha)
+                except Exception as e:
+                    logging.error(f"ERROR procesando la URL {url}: {e}")
+
+    def trabajador():
+        try:
+            with driverPool.con_cancelacion(cancelacion), driverPool.driver_prestado(timeout=0) as driver_extra:
+                procesar(driver_extra)
+        except TimeoutError:
+            logging.info("No hay más drivers libres en el pool, las fichas se reparten entre los disponibles.")
+        except Exception as e:
+            logging.error(f"ERROR en un driver auxiliar de fichas de Valencia: {e}")
+
+    extra = min(FICHAS_SIMULTANEAS_VALENCIA, len(urls_centros)) - 1 if driverPool.estado_pool()["activo"] else 0
+    hilos = [threading.Thread(target=trabajador) for _ in range(extra)]
+    for hilo in hilos:
+        hilo.start()
+    # No es necesario hacer driver.back() porque vamos directo a la siguiente URL
+    procesar(driver)
+    for hilo in hilos:
+        hilo.join()
+    return resultados
+
+def _busqueda_NIMA_Valencia_selenium(nif):
+    """
+    Backend Selenium de busqueda_NIMA_Valencia: busca el NIF en el formulario y recorre la ficha de cada centro.
+    """
     empresa = None
     centros = []
-    try:
-        # Buscar todos los enlaces de gestor en la tabla de resultados y guardar sus URLs
-        enlaces = webFunctions.encontrar_elementos(
-            driver,
-            webFunctions.By.XPATH,
-            "//a[starts-with(@id, 'ctl00_ContentPlaceHolder1_gvResultados_ctl') and contains(@id, '_hypGestor')]"
-        )
-        logging.info(f"Encontrados {len(enlaces)} centros asociados al NIF {nif}.")
-        urls_centros = [enlace.get_attribute("href") for enlace in enlaces]
-
-        for url in urls_centros:
-            try:
-                driver.get(url)
-                logging.info(f"Procesando URL: {url}")
-                datos_centro = extraer_datos_valencia(driver)
+    with driverPool.driver_prestado() as driver:
+        webFunctions.abrir_web(driver, URL_NIMA_VALENCIA)
+        webFunctions.escribir_en_elemento_por_id(driver, "ctl00_ContentPlaceHolder1_txtNIF", nif)
+        webFunctions.clickar_boton_por_id(driver, "ctl00_ContentPlaceHolder1_btBuscar")
+
+        try:
+            # Buscar todos los enlaces de gestor en la tabla de resultados y guardar sus URLs
+            enlaces = webFunctions.encontrar_elementos(
+                driver,
+                webFunctions.By.XPATH,
+                "//a[starts-with(@id, 'ctl00_ContentPlaceHolder1_gvResultados_ctl') and contains(@id, '_hypGestor')]"
+            )
+            logging.info(f"Encontrados {len(enlaces)} centros asociados al NIF {nif}.")
+            urls_centros = [enlace.get_attribute("href") for enlace in enlaces]
+
+            for datos_centro in _extraer_fichas_valencia(driver, urls_centros):
                 if datos_centro:
                     # Solo guardar los datos de empresa del primer centro
                     if empresa is None and "empresa" in datos_centro:
@@ -156,154 +260,192 @@ def busqueda_NIMA_Valencia(nif):
                     # Guardar solo los datos del centro
                     if "centros" in datos_centro:
                         centros.extend(datos_centro["centros"])
-            except Exception as e:
-                logging.error(f"ERROR procesando la URL {url}: {e}")
-                continue
-        # No es necesario hacer driver.back() porque vamos directo a la siguiente URL
-    except Exception as e:
-        logging.error(f"ERROR: No se han podido procesar los centros asociados: {e}")
-    driver.quit()
-    
-    if empresa and centros:
-        return {
-            "empresa": empresa,
-            "centros": centros
-        }
-    else:
-        return {
-            "empresa": _fill_empresa({}),
-            "centros": []
-        }
+        except Exception as e:
+            logging.error(f"ERROR: No se han podido procesar los centros asociados: {e}")
+
+    return _resultado_centros(empresa, centros)
+
+def _busqueda_NIMA_Valencia_http(nif):
+    """
+    Backend HTTP de busqueda_NIMA_Valencia: mismo resultado que el backend Selenium, sin abrir navegador.
+    """
+    empresa = None
+    centros = []
+    for ficha in nimaHttp.buscar_fichas_valencia(nif, URL_NIMA_VALENCIA, CAMPOS_VALENCIA, PREFIJO_AUTORIZACIONES_VALENCIA):
+        datos_centro = _construir_datos_valencia(ficha["campos"], ficha["autorizaciones"])
+        if empresa is None:
+            empresa = datos_centro["empresa"]
+        centros.extend(datos_centro["centros"])
+    return _resultado_centros(empresa, centros)
+
+def busqueda_NIMA_Valencia(nif, backend=None):
+    """
+    Busca todos los centros asociados a un NIF en la web de NIMA Valencia y devuelve un JSON con los datos de la empresa
+    y una lista de sus centros asociados.
+
+    Args:
+        nif (str): NIF a buscar.
+        backend (str, optional): "http" (sin navegador) o "selenium". Por defecto BACKEND_POR_DEFECTO.
+            Si el backend HTTP falla, se repite la búsqueda con Selenium.
+    """
+    return _buscar_con_backend(nif, backend, _busqueda_NIMA_Valencia_http, _busqueda_NIMA_Valencia_selenium, "Valencia")
 
 # --- MADRID ---
-def extraer_datos_madrid(driver):
+# Etiqueta del <td> que contiene cada dato en la ficha de NIMA Madrid, y qué aparición usar
+# (la sede y el centro repiten "CP:", "Provincia:"...; los del centro son la segunda aparición)
+CAMPOS_EMPRESA_MADRID = {
+    "nif": ("NIF:", 0),
+    "nombre": ("Razón Social:", 0),
+    "direccion": ("Dirección Sede:", 0),
+    "cp": ("CP:", 0),
+    "provincia": ("Provincia:", 0),
+}
+CAMPOS_CENTRO_MADRID = {
+    "nima": ("NIMA:", 0),
+    "nombre": ("Denominación del Centro:", 0),
+    "direccion": ("Dirección Centro:", 0),
+    "cp": ("CP:", 1),
+    "provincia": ("Provincia:", 1),
+    "codigo_ine": ("Código INE Municipio:", 1),
+}
+
+# Especificación para leer la ficha completa en una sola llamada (ver webFunctions.extraer_campos_por_script)
+ESPECIFICACION_MADRID = {
+    **{f"empresa.{clave}": {"etiqueta": campo, "indice": indice} for clave, (campo, indice) in CAMPOS_EMPRESA_MADRID.items()},
+    **{f"centro.{clave}": {"etiqueta": campo, "indice": indice} for clave, (campo, indice) in CAMPOS_CENTRO_MADRID.items()},
+    "parrafos": {"xpath": "//p", "todos": True},
+}
+
+def _construir_datos_madrid(datos_empresa, datos_centro, autorizaciones):
     """
-    Extrae los datos principales de la ficha de un centro en la web de NIMA Madrid.
-    Devuelve un diccionario con los datos de la sede y del centro.
-    Además, extrae todas las autorizaciones válidas y las guarda en una lista bajo la clave 'autorizaciones' en el centro.
+    Construye el JSON estándar {"empresa", "centros"} de un centro de NIMA Madrid a partir de los textos
+    leídos de la ficha (claves de CAMPOS_EMPRESA_MADRID / CAMPOS_CENTRO_MADRID) y la lista de autorizaciones.
+    Es común a los backends Selenium y HTTP.
     """
     # Usa las claves del diccionario de excelFunctions
     claves_autorizacion = list(excelFunctions.dic_codigos_residuos_valencia.keys())
 
-    # Datos del EMA (empresa)
-    datos_empresa = {
-        "nif": webFunctions.leer_texto_por_campo(driver, "NIF:") or "",
-        "nombre": webFunctions.leer_texto_por_campo(driver, "Razón Social:") or "",
-        "direccion": webFunctions.leer_texto_por_campo(driver, "Dirección Sede:") or "",
-        "cp": webFunctions.leer_texto_por_campo(driver, "CP:") or "",
-        "provincia": webFunctions.leer_texto_por_campo(driver, "Provincia:") or "",
-        "telefono": ""  # No disponible
-    }
-
-    # Datos del centro (usando el segundo elemento para cada campo)
-    datos_centro = {
-        "nima": webFunctions.leer_texto_por_campo(driver, "NIMA:") or "",
-        "nombre": webFunctions.leer_texto_por_campo(driver, "Denominación del Centro:") or "",
-        "direccion": webFunctions.leer_texto_por_campo(driver, "Dirección Centro:") or "",
-        "cp": webFunctions.leer_texto_por_campo_indice(driver, "CP:", indice=1) or "",
-        "provincia": webFunctions.leer_texto_por_campo_indice(driver, "Provincia:", indice=1) or "",
-        "codigo_ine": webFunctions.leer_texto_por_campo_indice(driver, "Código INE Municipio:", indice=1) or "",
-        "telefono": "",  # No disponible
-        "autorizaciones": [],
-        "codigos_residuos": []
-    }
-
-    # Extraer autorizaciones válidas
-    autorizaciones = []
-    try:
-        elementos_p = driver.find_elements(webFunctions.By.TAG_NAME, "p")
-        for elem in elementos_p:
-            texto = elem.text
-            if len(texto) == 17: # Solo se queda con las autorizaciones con formato valido
-                autorizaciones.append(texto)
-
-    except Exception as e:
-        logging.error(f"Error extrayendo autorizaciones en Madrid: {e}")
-
-    datos_centro["autorizaciones"] = autorizaciones
-
     # Extraer codigos_residuos de las autorizaciones encontradas
     codigos_residuos = []
     for autorizacion in autorizaciones:
         for clave in claves_autorizacion:
             if clave in autorizacion and clave not in codigos_residuos:
                 codigos_residuos.append(clave)
-    datos_centro["codigos_residuos"] = codigos_residuos
+    # Añadir P02 si no está
+    if "P02" not in codigos_residuos:
+        codigos_residuos.append("P02")
 
-    empresa = _fill_empresa(datos_empresa)
-    centro = _fill_centro(datos_centro)
+    empresa = _fill_empresa({
+        **{clave: datos_empresa.get(clave) or "" for clave in CAMPOS_EMPRESA_MADRID},
+        "telefono": ""  # No disponible
+    })
+    centro = _fill_centro({
+        **{clave: datos_centro.get(clave) or "" for clave in CAMPOS_CENTRO_MADRID},
+        "telefono": "",  # No disponible
+        "autorizaciones": autorizaciones,
+        "codigos_residuos": codigos_residuos
+    })
     return {
         "empresa": empresa,
         "centros": [centro]
     }
 
-def busqueda_NIMA_Madrid(nif):
+def extraer_datos_madrid(driver):
     """
-    Busca todos los centros asociados a un NIF en la web de NIMA Madrid y devuelve un JSON con los datos de la sede
-    y una lista de sus centros asociados.
+    Extrae los datos principales de la ficha de un centro en la web de NIMA Madrid.
+    Devuelve un diccionario con los datos de la sede y del centro.
+    Además, extrae todas las autorizaciones válidas y las guarda en una lista bajo la clave 'autorizaciones' en el centro.
     """
-    driver = webConfiguration.configure()
-    webFunctions.abrir_web(driver, URL_NIMA_MADRID)
-    webFunctions.escribir_en_elemento_por_id(driver, "nif", nif)
+    campos = webFunctions.extraer_campos_por_script(
+        driver,
+        ESPECIFICACION_MADRID,
+        esperar_xpath=f"//td[b[normalize-space(text())='{CAMPOS_EMPRESA_MADRID['nif'][0]}']]"
+    )
+    datos_empresa = {clave: campos.get(f"empresa.{clave}") or "" for clave in CAMPOS_EMPRESA_MADRID}
+    datos_centro = {clave: campos.get(f"centro.{clave}") or "" for clave in CAMPOS_CENTRO_MADRID}
+
+    # Extraer autorizaciones válidas
+    autorizaciones = []
+    for texto in campos.get("parrafos") or []:
+        if texto and len(texto) == 17: # Solo se queda con las autorizaciones con formato valido
+            autorizaciones.append(texto)
 
-    # Buscar y hacer click en el enlace <a> con onclick="buscar('form');"
-    webFunctions.clickar_enlace_por_onclick(driver, "buscar('form');")
+    return _construir_datos_madrid(datos_empresa, datos_centro, autorizaciones)
 
+def _busqueda_NIMA_Madrid_selenium(nif):
+    """
+    Backend Selenium de busqueda_NIMA_Madrid: abre la ficha de cada centro y vuelve atrás a la lista.
+    """
     empresa = None
     centros = []
-    try:
-        # Guarda todos los onclicks de los botones de consultar
-        botones = webFunctions.encontrar_elementos(
-            driver,
-            webFunctions.By.XPATH,
-            "//input[@type='button' and @value='Consultar' and contains(@onclick, 'consultar(')]"
-        )
-        logging.info(f"Encontrados {len(botones)} centros asociados al NIF {nif}.")
-        onclicks = [boton.get_attribute("onclick") for boton in botones]
-
-        for onclick in onclicks:
-            try:
-                boton = webFunctions.encontrar_elemento(
-                    driver,
-                    webFunctions.By.XPATH,
-                    f"//input[@type='button' and @value='Consultar' and @onclick=\"{onclick}\"]"
-                )
-                if boton:
-                    boton.click()
-                    try:
-                        datos_centro = extraer_datos_madrid(driver)
-                        if datos_centro:
-                            if empresa is None and "empresa" in datos_centro:
-                                empresa = datos_centro["empresa"]
-                            if "centros" in datos_centro:
-                                for centro in datos_centro["centros"]:
-                                    # Añadir P02 si no está
-                                    if "codigos_residuos" in centro:
-                                        if "P02" not in centro["codigos_residuos"]:
-                                            centro["codigos_residuos"].append("P02")
-                                    else:
-                                        centro["codigos_residuos"] = ["P02"]
-                                    centros.append(centro)
-                    except Exception as e:
-                        logging.error(f"ERROR: No se han podido extraer los datos del centro en Madrid: {e}")
-                    driver.back()
-                else:
-                    logging.warning("No se encontró el botón 'Consultar' para el onclick esperado.")
-            except Exception as e:
-                logging.error(f"ERROR: No se pudo encontrar o hacer click en el botón 'Consultar': {e}")
-    except Exception as e:
-        logging.error(f"ERROR: No se han podido procesar los centros asociados en Madrid para el NIF {nif}. Excepción: {e}")
-    driver.quit()
-    if empresa and centros:
-        return {
-            "empresa": empresa,
-            "centros": centros
-        }
-    else:
-        return {
-            "empresa": _fill_empresa({}),
-            "centros": []
-        }
+    with driverPool.driver_prestado() as driver:
+        webFunctions.abrir_web(driver, URL_NIMA_MADRID)
+        webFunctions.escribir_en_elemento_por_id(driver, "nif", nif)
+
+        # Buscar y hacer click en el enlace <a> con onclick="buscar('form');"
+        webFunctions.clickar_enlace_por_onclick(driver, "buscar('form');")
+
+        try:
+            # Guarda todos los onclicks de los botones de consultar
+            botones = webFunctions.encontrar_elementos(
+                driver,
+                webFunctions.By.XPATH,
+                "//input[@type='button' and @value='Consultar' and contains(@onclick, 'consultar(')]"
+            )
+            logging.info(f"Encontrados {len(botones)} centros asociados al NIF {nif}.")
+            onclicks = [boton.get_attribute("onclick") for boton in botones]
+
+            for onclick in onclicks:
+                try:
+                    boton = webFunctions.encontrar_elemento(
+                        driver,
+                        webFunctions.By.XPATH,
+                        f"//input[@type='button' and @value='Consultar' and @onclick=\"{onclick}\"]"
+                    )
+                    if boton:
+                        boton.click()
+                        try:
+                            datos_centro = extraer_datos_madrid(driver)
+                            if datos_centro:
+                                if empresa is None and "empresa" in datos_centro:
+                                    empresa = datos_centro["empresa"]
+                                centros.extend(datos_centro.get("centros", []))
+                        except Exception as e:
+                            logging.error(f"ERROR: No se han podido extraer los datos del centro en Madrid: {e}")
+                        driver.back()
+                    else:
+                        logging.warning("No se encontró el botón 'Consultar' para el onclick esperado.")
+                except Exception as e:
+                    logging.error(f"ERROR: No se pudo encontrar o hacer click en el botón 'Consultar': {e}")
+        except Exception as e:
+            logging.error(f"ERROR: No se han podido procesar los centros asociados en Madrid para el NIF {nif}. Excepción: {e}")
+    return _resultado_centros(empresa, centros)
+
+def _busqueda_NIMA_Madrid_http(nif):
+    """
+    Backend HTTP de busqueda_NIMA_Madrid: mismo resultado que el backend Selenium, sin abrir navegador
+    y descargando las fichas de los centros en paralelo.
+    """
+    empresa = None
+    centros = []
+    for ficha in nimaHttp.buscar_fichas_madrid(nif, URL_NIMA_MADRID, CAMPOS_EMPRESA_MADRID, CAMPOS_CENTRO_MADRID):
+        datos_centro = _construir_datos_madrid(ficha["empresa"], ficha["centro"], ficha["autorizaciones"])
+        if empresa is None:
+            empresa = datos_centro["empresa"]
+        centros.extend(datos_centro["centros"])
+    return _resultado_centros(empresa, centros)
+
+def busqueda_NIMA_Madrid(nif, backend=None):
+    """
+    Busca todos los centros asociados a un NIF en la web de NIMA Madrid y devuelve un JSON con los datos de la sede
+    y una lista de sus centros asociados.
+
+    Args:
+        nif (str): NIF a buscar.
+        backend (str, optional): "http" (sin navegador) o "selenium". Por defecto BACKEND_POR_DEFECTO.
+            Si el backend HTTP falla, se repite la búsqueda con Selenium.
+    """
+    return _buscar_con_backend(nif, backend, _busqueda_NIMA_Madrid_http, _busqueda_NIMA_Madrid_selenium, "Madrid")
 
 # --- CASTILLA-LA MANCHA ---
 def busqueda_NIMA_Castilla(nif):
@@ -311,23 +453,22 @@ def busqueda_NIMA_Castilla(nif):
     Busca todos los centros asociados a un NIF en la web de NIMA Castilla-La Mancha y devuelve un JSON con los datos de la empresa
     y una lista de sus centros asociados. Devuelve None si no encuentra resultados.
     """
-    driver = webConfiguration.configure()
     datos_json = None
-    try:
-        webFunctions.abrir_web(driver, URL_NIMA_CASTILLA)
-        webFunctions.clickar_boton_por_id(driver, "enlace_productores")
-        webFunctions.escribir_en_elemento_por_id(driver, "input_NIF_CIF", nif)
-        webFunctions.clickar_boton_por_id(driver, "boton_buscar")
-        if webFunctions.clickar_imagen_generar_excel(driver, timeout=60):
-            datos_json = excelFunctions.esperar_y_guardar_datos_centro_json_Castilla(extension=".xls", timeout=60)
-            if not datos_json:
-                logging.error("No se pudieron extraer los datos desde el Excel en Castilla")
-        else:
-            logging.error("No se ha encontrado la imagen para generar el Excel en Castilla.")
-    except Exception:
-        logging.error("No se ha podido generar o procesar el Excel en Castilla.")
-    finally:
-        driver.quit()
+    # Carpeta de descargas propia de esta búsqueda, para que varias búsquedas a la vez no se mezclen los Excel
+    with driverPool.driver_prestado() as driver, downloadFunctions.sesion_descarga(driver, "nima_castilla_") as sesion:
+        try:
+            webFunctions.abrir_web(driver, URL_NIMA_CASTILLA)
+            webFunctions.clickar_boton_por_id(driver, "enlace_productores")
+            webFunctions.escribir_en_elemento_por_id(driver, "input_NIF_CIF", nif)
+            webFunctions.clickar_boton_por_id(driver, "boton_buscar")
+            if webFunctions.clickar_imagen_generar_excel(driver, timeout=60):
+                datos_json = excelFunctions.esperar_y_guardar_datos_centro_json_Castilla(extension=".xls", timeout=60, sesion=sesion)
+                if not datos_json:
+                    logging.error("No se pudieron extraer los datos desde el Excel en Castilla")
+            else:
+                logging.error("No se ha encontrado la imagen para generar el Excel en Castilla.")
+        except Exception:
+            logging.error("No se ha podido generar o procesar el Excel en Castilla.")
     # Estandarizar estructura
     empresa_dict = datos_json["empresa"] if datos_json and "empresa" in datos_json else {}
     empresa = _fill_empresa(empresa_dict)
@@ -349,6 +490,39 @@ def busqueda_NIMA_Castilla(nif):
     }
 
 # --- CATALUÑA ---
+def _construir_datos_cataluña(valor_nif, nombre_empresa, codigos_residuo, filas):
+    """
+    Construye el JSON estándar {"empresa", "centros"} de NIMA Cataluña a partir de los datos de la empresa
+    y de los textos de las celdas de cada fila de la tabla de centros.
+    Es común a los backends Selenium y HTTP.
+    """
+    centros = []
+    for celdas in filas:
+        centro = {
+            "nima": celdas[0].strip() if len(celdas) > 0 else "",
+            "nombre": "",  # No disponible
+            "direccion": celdas[2].strip() if len(celdas) > 2 else "",
+            "cp": celdas[3].strip() if len(celdas) > 3 else "",
+            "provincia": "",  # No disponible
+            "codigo_ine": celdas[3].strip()[:2] if len(celdas) > 3 else "",
+            "telefono": "",  # No disponible
+            "autorizaciones": [celdas[1].strip()] if len(celdas) > 1 else [],
+            "codigos_residuos": [codigos_residuo] if codigos_residuo else []
+        }
+        centros.append(_fill_centro(centro))
+    empresa = _fill_empresa({
+        "nif": valor_nif,
+        "nombre": nombre_empresa,
+        "direccion": "",
+        "cp": "",
+        "provincia": "",
+        "telefono": ""
+    })
+    return {
+        "empresa": empresa,
+        "centros": centros
+    }
+
 def extraer_datos_cataluña(driver, nif):
     """
     Extrae los datos principales de la ficha de un centro en la web de NIMA Cataluña.
@@ -402,60 +576,62 @@ def extraer_datos_cataluña(driver, nif):
 
     # Extraer todos los centros de la tabla
     selector_trs = "//tr[contains(@class, 'llistaopen1') or contains(@class, 'llistaopen2')]"
-    centros = []
+    filas = []
     try:
-        filas = webFunctions.encontrar_elementos(driver, webFunctions.By.XPATH, selector_trs)
-        for fila in filas:
-            celdas = fila.find_elements("tag name", "td")
-            centro = {
-                "nima": celdas[0].text.strip() if len(celdas) > 0 else "",
-                "nombre": "",  # No disponible
-                "direccion": celdas[2].text.strip() if len(celdas) > 2 else "",
-                "cp": celdas[3].text.strip() if len(celdas) > 3 else "",
-                "provincia": "",  # No disponible
-                "codigo_ine": celdas[3].text.strip()[:2] if len(celdas) > 3 else "",
-                "telefono": "",  # No disponible
-                "autorizaciones": [celdas[1].text.strip()] if len(celdas) > 1 else [],
-                "codigos_residuos": [codigos_residuo] if codigos_residuo else []
-            }
-            centros.append(_fill_centro(centro))
+        for fila in webFunctions.encontrar_elementos(driver, webFunctions.By.XPATH, selector_trs):
+            filas.append([celda.text for celda in fila.find_elements("tag name", "td")])
     except Exception as e:
         logging.error(f"Error extrayendo filas de centros: {e}")
-    empresa = _fill_empresa({
-        "nif": valor_nif,
-        "nombre": nombre_empresa,
-        "direccion": "",
-        "cp": "",
-        "provincia": "",
-        "telefono": ""
-    })
-    return {
-        "empresa": empresa,
-        "centros": centros
-    }
+    return _construir_datos_cataluña(valor_nif, nombre_empresa, codigos_residuo, filas)
 
-def busqueda_NIMA_Cataluña(nif):
-    driver = webConfiguration.configure()
-    try:
-        webFunctions.abrir_web(driver, URL_NIMA_CATALUÑA)
-        webFunctions.escribir_en_elemento_por_name(driver, "cercaNif", nif)
-        webFunctions.clickar_boton_por_texto(driver, "CERCAR")
-        datos_json = extraer_datos_cataluña(driver, nif)
-        if (
-            not datos_json or
-            not isinstance(datos_json, dict) or
-            "empresa" not in datos_json or
-            "centros" not in datos_json
-        ):
-            return {
-                "empresa": _fill_empresa({}),
-                "centros": []
-            }
-    except Exception as e:
-        driver.quit()
+def _busqueda_NIMA_Cataluña_selenium(nif):
+    """
+    Backend Selenium de busqueda_NIMA_Cataluña.
+    """
+    with driverPool.driver_prestado() as driver:
+        try:
+            webFunctions.abrir_web(driver, URL_NIMA_CATALUÑA)
+            webFunctions.escribir_en_elemento_por_name(driver, "cercaNif", nif)
+            webFunctions.clickar_boton_por_texto(driver, "CERCAR")
+            datos_json = extraer_datos_cataluña(driver, nif)
+        except Exception:
+            datos_json = None
+    return _validar_datos_cataluña(datos_json)
+
+def _busqueda_NIMA_Cataluña_http(nif):
+    """
+    Backend HTTP de busqueda_NIMA_Cataluña: mismo resultado que el backend Selenium, sin abrir navegador.
+    """
+    ficha = nimaHttp.buscar_ficha_cataluña(nif, URL_NIMA_CATALUÑA)
+    datos_json = None
+    if ficha:
+        datos_json = _construir_datos_cataluña(ficha["nif"], ficha["nombre"], ficha["codigos"], ficha["filas"])
+    return _validar_datos_cataluña(datos_json)
+
+def _validar_datos_cataluña(datos_json):
+    """
+    Devuelve datos_json si tiene la estructura estándar, o la estructura vacía si no.
+    """
+    if (
+        not datos_json or
+        not isinstance(datos_json, dict) or
+        "empresa" not in datos_json or
+        "centros" not in datos_json
+    ):
         return {
             "empresa": _fill_empresa({}),
             "centros": []
         }
-    driver.quit()
-    return datos_json
\ No newline at end of file
+    return datos_json
+
+def busqueda_NIMA_Cataluña(nif, backend=None):
+    """
+    Busca todos los centros asociados a un NIF en la web de NIMA Cataluña y devuelve un JSON con los datos de la empresa
+    y una lista de sus centros asociados.
+
+    Args:
+        nif (str): NIF a buscar.
+        backend (str, optional): "http" (sin navegador) o "selenium". Por defecto BACKEND_POR_DEFECTO.
+            Si el backend HTTP falla, se repite la búsqueda con Selenium.
+    """
+    return _buscar_con_backend(nif, backend, _busqueda_NIMA_Cataluña_http, _busqueda_NIMA_Cataluña_selenium, "Cataluña")
@@ -0,0 +1,452 @@
+"""
+Módulo: nimaHttp.py
+
+Este módulo implementa el backend HTTP (sin navegador) de las búsquedas NIMA: envía los mismos formularios
+que se rellenan con Selenium mediante un cliente HTTP con conexiones reutilizables (httpx) y extrae los datos
+del HTML con lxml.
+
+Devuelve los textos "en bruto" de cada ficha; la construcción del JSON estándar (_fill_empresa / _fill_centro)
+la sigue haciendo nimaFunctions, de modo que ambos backends devuelven exactamente la misma estructura.
+
+Portales soportados:
+  - Valencia: formulario ASP.NET (__VIEWSTATE / __EVENTVALIDATION) y fichas de centro dentro de un iframe.
+  - Madrid: formulario enviado por buscar('form') y fichas abiertas con consultar(...). Las funciones JavaScript
+    se interpretan de forma básica (campos que rellenan, action y submit) para reproducir el envío.
+  - Cataluña: formulario cercaNif con una tabla estática de centros en la página de resultados.
+
+Las fichas de los centros se descargan en paralelo reutilizando las conexiones de la misma sesión.
+Para no saturar los portales, las fichas abiertas a la vez en cada portal (sumando todas las búsquedas en curso,
+con HTTP o con Selenium) están limitadas por limite_portal() según FICHAS_SIMULTANEAS_POR_PORTAL.
+
+Si la respuesta de un portal no tiene la forma esperada (cambio de la web, formulario que requiere JavaScript...)
+las funciones lanzan RuntimeError, y nimaFunctions repite la búsqueda con Selenium.
+"""
+
+import loggerConfig
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import httpx
+from lxml import html
+
+TIMEOUT_HTTP = 30
+CABECERAS_HTTP = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept-Language": "es-ES,es;q=0.9",
+}
+# Fichas de centro abiertas a la vez en cada portal, entre todas las búsquedas en curso
+FICHAS_SIMULTANEAS_POR_PORTAL = {
+    "Valencia": 4,
+    "Madrid": 4,
+}
+FICHAS_SIMULTANEAS_POR_DEFECTO = 2
+
+_semaforos_portal = {}
+_lock_semaforos = threading.Lock()
+
+
+def limite_portal(portal: str) -> threading.BoundedSemaphore:
+    """
+    Devuelve el semáforo que limita las fichas abiertas a la vez en el portal indicado.
+    Se usa como context manager: with nimaHttp.limite_portal("Valencia"): ...
+    """
+    with _lock_semaforos:
+        if portal not in _semaforos_portal:
+            _semaforos_portal[portal] = threading.BoundedSemaphore(
+                FICHAS_SIMULTANEAS_POR_PORTAL.get(portal, FICHAS_SIMULTANEAS_POR_DEFECTO)
+            )
+        return _semaforos_portal[portal]
+
+
+def _sesion_http() -> httpx.Client:
+    """
+    Crea un cliente HTTP con cookies propias y conexiones keep-alive, para reutilizar la misma conexión
+    en todas las peticiones de una búsqueda (formulario, resultados y fichas de los centros).
+    """
+    return httpx.Client(
+        headers=CABECERAS_HTTP,
+        timeout=TIMEOUT_HTTP,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+    )
+
+
+def _obtener_html(cliente, url, **kwargs):
+    """
+    Hace la petición (GET, o POST si se pasa 'data') y devuelve el documento lxml con los enlaces absolutos.
+    """
+    if "data" in kwargs:
+        respuesta = cliente.post(url, **kwargs)
+    else:
+        respuesta = cliente.get(url, **kwargs)
+    respuesta.raise_for_status()
+    documento = html.fromstring(respuesta.content)
+    documento.make_links_absolute(str(respuesta.url))
+    return documento
+
+
+def _texto(elemento) -> str:
+    """
+    Texto de un elemento con los espacios normalizados (equivalente a WebElement.text).
+    """
+    return " ".join(elemento.text_content().split()) if elemento is not None else ""
+
+
+def _campos_formulario(formulario, boton=None) -> dict:
+    """
+    Devuelve los campos que enviaría el navegador al pulsar 'boton' en el formulario:
+    inputs (incluidos los ocultos como __VIEWSTATE / __EVENTVALIDATION), selects y textareas.
+    """
+    campos = {}
+    for entrada in formulario.xpath(".//input[@name]"):
+        tipo = (entrada.get("type") or "text").lower()
+        if tipo in ("submit", "button", "image", "reset", "file"):
+            continue
+        if tipo in ("checkbox", "radio") and entrada.get("checked") is None:
+            continue
+        campos[entrada.get("name")] = entrada.get("value", "")
+    for select in formulario.xpath(".//select[@name]"):
+        opciones = select.xpath(".//option[@selected]") or select.xpath(".//option")
+        if opciones:
+            campos[select.get("name")] = opciones[0].get("value", _texto(opciones[0]))
+    for area in formulario.xpath(".//textarea[@name]"):
+        campos[area.get("name")] = area.text or ""
+    if boton is not None and boton.get("name"):
+        campos[boton.get("name")] = boton.get("value", "")
+    return campos
+
+
+def _elemento_por_id(documento, elemento_id):
+    elementos = documento.xpath(f"//*[@id='{elemento_id}']")
+    if not elementos:
+        raise RuntimeError(f"No se encontró el elemento con id '{elemento_id}' en la respuesta.")
+    return elementos[0]
+
+
+def _formulario_de(elemento, descripcion):
+    formularios = elemento.xpath("ancestor::form")
+    if not formularios:
+        raise RuntimeError(f"No se encontró el formulario de {descripcion}.")
+    return formularios[0]
+
+
+def _enviar_formulario(cliente, url_base, formulario, campos, accion=None):
+    """
+    Envía el formulario con los campos indicados respetando su method (GET o POST) y su action,
+    salvo que se indique otra 'accion' (la que asigna un script antes del submit).
+    """
+    accion = urljoin(url_base, accion or formulario.get("action") or url_base)
+    if (formulario.get("method") or "get").lower() == "post":
+        return _obtener_html(cliente, accion, data=campos)
+    return _obtener_html(cliente, accion, params=campos)
+
+
+def _descargar_en_paralelo(funcion, elementos, portal):
+    """
+    Aplica 'funcion' a cada elemento en paralelo, conservando el orden original
+    y respetando el límite de fichas simultáneas del portal.
+    """
+    if not elementos:
+        return []
+
+    def con_limite(elemento):
+        with limite_portal(portal):
+            return funcion(elemento)
+
+    hilos = min(FICHAS_SIMULTANEAS_POR_PORTAL.get(portal, FICHAS_SIMULTANEAS_POR_DEFECTO), len(elementos))
+    with ThreadPoolExecutor(max_workers=hilos) as executor:
+        return list(executor.map(con_limite, elementos))
+
+
+def _argumentos_js(llamada):
+    """
+    Devuelve los argumentos literales de una llamada JavaScript como "consultar('123', 4);".
+    """
+    coincidencia = re.search(r"\((.*)\)", llamada or "", re.S)
+    if not coincidencia:
+        raise RuntimeError(f"No se pudieron leer los argumentos de la llamada: {llamada}")
+    return [
+        argumento.group(argumento.lastindex)
+        for argumento in re.finditer(r"'([^']*)'|\"([^\"]*)\"|([\w.\-]+)", coincidencia.group(1))
+    ]
+
+
+def _funcion_js(documento, nombre):
+    """
+    Busca en los <script> de la página la función 'nombre' y devuelve (parametros, cuerpo).
+    Lanza RuntimeError si no está definida en la propia página.
+    """
+    codigo = "\n".join(documento.xpath("//script/text()"))
+    coincidencia = re.search(rf"function\s+{re.escape(nombre)}\s*\(([^)]*)\)\s*\{{", codigo)
+    if not coincidencia:
+        raise RuntimeError(f"La función JavaScript '{nombre}' no está definida en la página.")
+    profundidad = 1
+    posicion = coincidencia.end()
+    while profundidad and posicion < len(codigo):
+        profundidad += {"{": 1, "}": -1}.get(codigo[posicion], 0)
+        posicion += 1
+    parametros = [parametro.strip() for parametro in coincidencia.group(1).split(",") if parametro.strip()]
+    return parametros, codigo[coincidencia.end():posicion - 1]
+
+
+def _simular_funcion_envio(documento, llamada, formulario_por_defecto):
+    """
+    Reproduce una función JavaScript que rellena campos de un formulario y lo envía
+    (p. ej. buscar('form') o consultar('123')).
+
+    Returns:
+        tuple: (formulario, campos_asignados, action o None)
+
+    Raises:
+        RuntimeError: Si la función hace algo más que rellenar campos y hacer submit (AJAX, ventanas nuevas...).
+    """
+    nombre = re.match(r"\s*([\w$]+)\s*\(", llamada or "")
+    if not nombre:
+        raise RuntimeError(f"Llamada JavaScript no reconocida: {llamada}")
+    parametros, cuerpo = _funcion_js(documento, nombre.group(1))
+    valores = dict(zip(parametros, _argumentos_js(llamada)))
+    if ".submit(" not in cuerpo or re.search(r"XMLHttpRequest|\$\.ajax|fetch\(|window\.open", cuerpo):
+        raise RuntimeError(f"La función '{nombre.group(1)}' no es un envío simple de formulario.")
+
+    formulario = formulario_por_defecto
+    referencia = re.search(r"forms\[\s*['\"]?([\w\-]+)['\"]?\s*\]|getElementById\(\s*['\"]?([\w\-]+)['\"]?\s*\)", cuerpo)
+    if referencia:
+        clave = referencia.group(1) or referencia.group(2)
+        clave = valores.get(clave, clave)
+        if clave.isdigit():
+            formularios = documento.xpath("//form")
+            formulario = formularios[int(clave)] if int(clave) < len(formularios) else None
+        else:
+            formularios = documento.xpath(f"//form[@name='{clave}' or @id='{clave}']")
+            formulario = formularios[0] if formularios else formulario_por_defecto
+    if formulario is None:
+        raise RuntimeError(f"No se encontró el formulario que envía '{nombre.group(1)}'.")
+
+    def valor(expresion):
+        expresion = expresion.strip()
+        if expresion[:1] in ("'", '"'):
+            return expresion[1:-1]
+        if expresion in valores:
+            return valores[expresion]
+        raise RuntimeError(f"Valor JavaScript no soportado en '{nombre.group(1)}': {expresion}")
+
+    asignados = {
+        campo: valor(expresion)
+        for campo, expresion in re.findall(r"\.([\w\-]+)\.value\s*=\s*('[^']*'|\"[^\"]*\"|[\w$]+)", cuerpo)
+    }
+    accion = re.search(r"\.action\s*=\s*('[^']*'|\"[^\"]*\"|[\w$]+)", cuerpo)
+    return formulario, asignados, valor(accion.group(1)) if accion else None
+
+
+def _enviar_funcion_js(cliente, url_base, documento, llamada, formulario_por_defecto, campos_extra=None):
+    """
+    Envía el formulario como lo haría la función JavaScript de 'llamada'.
+    """
+    formulario, asignados, accion = _simular_funcion_envio(documento, llamada, formulario_por_defecto)
+    campos = _campos_formulario(formulario)
+    campos.update(campos_extra or {})
+    campos.update(asignados)
+    return _enviar_formulario(cliente, url_base, formulario, campos, accion)
+
+
+def _texto_por_campo(documento, campo, indice=0):
+    """
+    Equivalente sin navegador de webFunctions.leer_texto_por_campo_indice: texto del <td> que contiene
+    un <b> con 'campo', sin la etiqueta. Devuelve "" si no existe.
+    """
+    celdas = documento.xpath(f"//td[b[normalize-space(text())='{campo}']]")
+    if len(celdas) <= indice:
+        return ""
+    texto = _texto(celdas[indice])
+    return texto[len(campo):].strip() if texto.startswith(campo) else texto.split(campo, 1)[-1].strip()
+
+
+# --- VALENCIA ---
+def _leer_ficha_valencia(cliente, url, ids_campos, prefijo_autorizaciones):
+    """
+    Lee la ficha de un centro de NIMA Valencia. Los datos están dentro de un iframe, igual que en Selenium
+    (ver webFunctions.obtener_texto_elemento_por_id): se descarga el iframe y se lee el <span> de cada id.
+    """
+    documento = _obtener_html(cliente, url)
+    iframes = documento.xpath("//iframe[@src]")
+    if iframes:
+        documento = _obtener_html(cliente, iframes[0].get("src"))
+
+    def texto_span(elemento_id):
+        spans = documento.xpath(f"//*[@id='{elemento_id}']//span")
+        return _texto(spans[0]) if spans else None
+
+    campos = {clave: texto_span(elemento_id) or "" for clave, elemento_id in ids_campos.items()}
+    if not any(campos.values()):
+        raise RuntimeError(f"La ficha {url} no contiene los campos esperados.")
+
+    autorizaciones = []
+    idx = 0
+    while True:
+        autorizacion = texto_span(f"{prefijo_autorizaciones}{idx}")
+        if autorizacion is None:
+            break
+        if autorizacion.split():
+            autorizaciones.append(autorizacion.split()[0])
+        idx += 1
+    return {"campos": campos, "autorizaciones": autorizaciones}
+
+
+def buscar_fichas_valencia(nif, url_busqueda, ids_campos, prefijo_autorizaciones) -> list:
+    """
+    Envía el formulario ASP.NET de búsqueda de NIMA Valencia y lee la ficha de cada centro encontrado.
+
+    Args:
+        nif (str): NIF a buscar.
+        url_busqueda (str): URL del buscador (nimaFunctions.URL_NIMA_VALENCIA).
+        ids_campos (dict): Clave -> id del elemento de la ficha (nimaFunctions.CAMPOS_VALENCIA).
+        prefijo_autorizaciones (str): Prefijo de los ids de las autorizaciones.
+
+    Returns:
+        list: Una entrada {"campos": {...}, "autorizaciones": [...]} por centro. Lista vacía si el NIF no existe.
+
+    Raises:
+        RuntimeError: Si la respuesta no tiene la estructura esperada.
+    """
+    with _sesion_http() as cliente:
+        documento = _obtener_html(cliente, url_busqueda)
+        entrada_nif = _elemento_por_id(documento, "ctl00_ContentPlaceHolder1_txtNIF")
+        boton = _elemento_por_id(documento, "ctl00_ContentPlaceHolder1_btBuscar")
+        formulario = _formulario_de(entrada_nif, "búsqueda de NIMA Valencia")
+
+        campos = _campos_formulario(formulario, boton)
+        campos[entrada_nif.get("name")] = nif
+        resultados = _enviar_formulario(cliente, url_busqueda, formulario, campos)
+
+        if not resultados.xpath("//*[@id='ctl00_ContentPlaceHolder1_txtNIF']"):
+            raise RuntimeError("La respuesta de la búsqueda de NIMA Valencia no es la página esperada.")
+        urls_centros = resultados.xpath(
+            "//a[starts-with(@id, 'ctl00_ContentPlaceHolder1_gvResultados_ctl') and contains(@id, '_hypGestor')]/@href"
+        )
+        logging.info(f"[HTTP] Encontrados {len(urls_centros)} centros asociados al NIF {nif}.")
+
+        def leer_ficha(url):
+            logging.info(f"[HTTP] Procesando URL: {url}")
+            return _leer_ficha_valencia(cliente, url, ids_campos, prefijo_autorizaciones)
+
+        return _descargar_en_paralelo(leer_ficha, urls_centros, "Valencia")
+
+
+# --- MADRID ---
+def _leer_ficha_madrid(documento, campos_empresa, campos_centro):
+    """
+    Lee la ficha de un centro de NIMA Madrid: campos "Etiqueta:" de la sede y del centro
+    y las autorizaciones (párrafos de 17 caracteres, igual que extraer_datos_madrid).
+    """
+    empresa = {clave: _texto_por_campo(documento, campo, indice) for clave, (campo, indice) in campos_empresa.items()}
+    centro = {clave: _texto_por_campo(documento, campo, indice) for clave, (campo, indice) in campos_centro.items()}
+    if not any(empresa.values()) and not any(centro.values()):
+        raise RuntimeError("La ficha de NIMA Madrid no contiene los campos esperados.")
+    autorizaciones = [texto for texto in (_texto(p) for p in documento.xpath("//p")) if len(texto) == 17]
+    return {"empresa": empresa, "centro": centro, "autorizaciones": autorizaciones}
+
+
+def buscar_fichas_madrid(nif, url_busqueda, campos_empresa, campos_centro) -> list:
+    """
+    Envía el formulario de búsqueda de NIMA Madrid (buscar('form')) y abre la ficha de cada centro
+    (botones "Consultar" con consultar(...)) en paralelo.
+
+    Args:
+        nif (str): NIF a buscar.
+        url_busqueda (str): URL del buscador (nimaFunctions.URL_NIMA_MADRID).
+        campos_empresa (dict): Clave -> (etiqueta, índice) de los datos de la sede.
+        campos_centro (dict): Clave -> (etiqueta, índice) de los datos del centro.
+
+    Returns:
+        list: Una entrada {"empresa": {...}, "centro": {...}, "autorizaciones": [...]} por centro.
+        Lista vacía si el NIF no existe.
+
+    Raises:
+        RuntimeError: Si la respuesta no tiene la estructura esperada o las funciones JavaScript no se pueden reproducir.
+    """
+    with _sesion_http() as cliente:
+        documento = _obtener_html(cliente, url_busqueda)
+        entrada_nif = _elemento_por_id(documento, "nif")
+        formulario = _formulario_de(entrada_nif, "búsqueda de NIMA Madrid")
+        enlaces = documento.xpath("//a[@onclick=\"buscar('form');\"]")
+        if not enlaces:
+            raise RuntimeError("No se encontró el enlace de búsqueda de NIMA Madrid.")
+        resultados = _enviar_funcion_js(
+            cliente, url_busqueda, documento, enlaces[0].get("onclick"), formulario,
+            campos_extra={entrada_nif.get("name") or "nif": nif}
+        )
+
+        botones = resultados.xpath("//input[@type='button' and @value='Consultar' and contains(@onclick, 'consultar(')]")
+        if not botones and not resultados.xpath("//form"):
+            raise RuntimeError("La respuesta de la búsqueda de NIMA Madrid no es la página esperada.")
+        logging.info(f"[HTTP] Encontrados {len(botones)} centros asociados al NIF {nif}.")
+
+        def leer_ficha(boton):
+            ficha = _enviar_funcion_js(
+                cliente, url_busqueda, resultados, boton.get("onclick"), _formulario_de(boton, "consulta de NIMA Madrid")
+            )
+            return _leer_ficha_madrid(ficha, campos_empresa, campos_centro)
+
+        return _descargar_en_paralelo(leer_ficha, botones, "Madrid")
+
+
+# --- CATALUÑA ---
+def _texto_tras_etiqueta(documento, clase, etiqueta):
+    """
+    Texto de un <div class='col-xs-N'> con un <b>etiqueta</b>, sin la etiqueta y con los espacios normalizados.
+    """
+    divs = documento.xpath(f"//div[contains(@class, '{clase}') and b[normalize-space(text())='{etiqueta}']]")
+    if not divs:
+        return ""
+    texto = _texto(divs[0])
+    return texto.split(etiqueta)[-1].strip() if etiqueta in texto else ""
+
+
+def buscar_ficha_cataluña(nif, url_busqueda):
+    """
+    Envía el formulario cercaNif de NIMA Cataluña y lee la página de resultados (todos los centros
+    aparecen en una tabla estática, no hay fichas de detalle).
+
+    Returns:
+        dict or None: {"nif", "nombre", "codigos", "filas"} donde 'filas' es la lista de textos de las celdas
+        de cada centro. None si el NIF no existe.
+
+    Raises:
+        RuntimeError: Si la respuesta no tiene la estructura esperada.
+    """
+    with _sesion_http() as cliente:
+        documento = _obtener_html(cliente, url_busqueda)
+        entradas = documento.xpath("//input[@name='cercaNif']")
+        if not entradas:
+            raise RuntimeError("No se encontró el campo cercaNif en NIMA Cataluña.")
+        formulario = _formulario_de(entradas[0], "búsqueda de NIMA Cataluña")
+        botones = formulario.xpath(".//button[contains(., 'CERCAR')]")
+        if not botones:
+            raise RuntimeError("No se encontró el botón CERCAR en NIMA Cataluña.")
+        campos = _campos_formulario(formulario, botones[0])
+        campos["cercaNif"] = nif
+        resultados = _enviar_formulario(cliente, url_busqueda, formulario, campos)
+
+        if not resultados.xpath(f"//div[contains(@class, 'col-xs-4') and b[normalize-space(text())='Nif:'] and contains(., '{nif}')]"):
+            if resultados.xpath("//input[@name='cercaNif']"):
+                logging.info(f"[HTTP] NIF {nif} no encontrado en NIMA Cataluña.")
+                return None
+            raise RuntimeError("La respuesta de la búsqueda de NIMA Cataluña no es la página esperada.")
+
+        filas = [
+            [_texto(celda) for celda in fila.xpath("./td")]
+            for fila in resultados.xpath("//tr[contains(@class, 'llistaopen1') or contains(@class, 'llistaopen2')]")
+        ]
+        logging.info(f"[HTTP] Encontrados {len(filas)} centros asociados al NIF {nif}.")
+        return {
+            "nif": _texto_tras_etiqueta(resultados, "col-xs-4", "Nif:"),
+            "nombre": _texto_tras_etiqueta(resultados, "col-xs-8", "Raó social:"),
+            "codigos": _texto_tras_etiqueta(resultados, "col-xs-8", "Codis:"),
+            "filas": filas,
+        }
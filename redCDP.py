@@ -0,0 +1,231 @@
+"""
+Módulo: redCDP.py
+
+Este módulo sigue las peticiones de red de la página a partir de los eventos de Chrome DevTools (CDP) que reparte
+eventosCDP: Network.requestWillBeSent suma una petición en curso y Network.loadingFinished / loadingFailed la resta.
+Así se sabe cuándo la web ha terminado de responder (autocompletados y pop-ups de Nubelus cargados por AJAX) sin
+esperar un tiempo fijo.
+
+Cada driver tiene un seguimiento propio que se crea al primer uso. Al navegar a otra página (Page.frameNavigated
+del marco principal) se descartan las peticiones de la página anterior, que ya no van a terminar. Las peticiones
+a URL de PATRONES_IGNORADOS (analítica) o que llevan más de EDAD_MAXIMA segundos en curso (conexiones
+persistentes) no cuentan para dar la red por inactiva.
+
+Funciones principales:
+  - disponible(driver): indica si se pueden seguir las peticiones (log de eventos CDP activado).
+  - peticiones_en_curso(driver): número de peticiones que cuentan como en curso.
+  - red_inactiva(driver, silencio_ms): comprobación inmediata (sin espera) de red inactiva.
+  - esperar_red_inactiva(driver, silencio_ms, timeout): espera a que no haya peticiones durante 'silencio_ms'.
+  - esperar_respuesta(driver, patron, timeout, desde): espera la respuesta de una URL que cumpla la expresión regular.
+  - olvidar_driver(driver): elimina el seguimiento de un driver que se va a cerrar.
+
+Todas las funciones aceptan el driver o un WebElement (p. ej. el div de un pop-up).
+
+Ejemplo de uso:
+    desde = time.time()
+    webFunctions.escribir_en_elemento_por_name(driver, "pDenominacion_residuo", "FILTROS")
+    respuesta = redCDP.esperar_respuesta(driver, r"BUSCAR_RESIDUO", timeout=5, desde=desde)
+    redCDP.esperar_red_inactiva(driver, silencio_ms=200, timeout=10)
+"""
+
+import loggerConfig
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+import eventosCDP
+
+# Segundos entre comprobaciones mientras se espera
+INTERVALO_SONDEO = 0.05
+
+# Peticiones que no cuentan para la inactividad de la red
+PATRONES_IGNORADOS = ("google-analytics.com", "googletagmanager.com", "doubleclick.net", "data:", "blob:")
+
+# Segundos a partir de los que una petición sin terminar se considera persistente y deja de contar
+EDAD_MAXIMA = 30
+
+# Respuestas recientes que se guardan para esperar_respuesta
+MAX_RESPUESTAS = 200
+
+_seguimientos = {}
+_lock = threading.Lock()
+
+
+def _driver(driver):
+    """
+    Devuelve el WebDriver a partir del driver o de un WebElement (que lo tiene en 'parent').
+    """
+    return driver if hasattr(driver, "session_id") else driver.parent
+
+
+def _seguimiento(driver):
+    """
+    Devuelve (creándolo si hace falta) el seguimiento de red del driver, o None si no hay eventos CDP.
+    """
+    driver = _driver(driver)
+    with _lock:
+        seguimiento = _seguimientos.get(driver.session_id)
+    if seguimiento is not None:
+        return seguimiento
+    if not eventosCDP.disponible(driver):
+        return None
+    suscripcion = eventosCDP.suscribir(
+        driver, "Network.requestWillBeSent", "Network.loadingFinished", "Network.loadingFailed",
+        "Network.responseReceived", "Page.frameNavigated",
+    )
+    seguimiento = {
+        "suscripcion": suscripcion,
+        "lock": threading.Lock(),
+        "en_curso": {},
+        "ultima_actividad": time.monotonic(),
+        "respuestas": deque(maxlen=MAX_RESPUESTAS),
+    }
+    with _lock:
+        existente = _seguimientos.setdefault(driver.session_id, seguimiento)
+    if existente is not seguimiento:
+        eventosCDP.cancelar_suscripcion(suscripcion)
+    return existente
+
+
+def _ignorada(url: str) -> bool:
+    return any(patron in url for patron in PATRONES_IGNORADOS)
+
+
+def _procesar(seguimiento: dict) -> None:
+    """
+    Lee los eventos pendientes y actualiza las peticiones en curso y las respuestas recientes.
+    """
+    eventosCDP.drenar(seguimiento["suscripcion"]["driver"])
+    cola = seguimiento["suscripcion"]["cola"]
+    with seguimiento["lock"]:
+        while not cola.empty():
+            evento = cola.get_nowait()
+            metodo, params = evento["metodo"], evento["params"]
+            en_curso = seguimiento["en_curso"]
+            if metodo == "Network.requestWillBeSent":
+                url = params.get("request", {}).get("url", "")
+                if not _ignorada(url):
+                    en_curso[params.get("requestId")] = {
+                        "url": url, "inicio": time.monotonic(), "cargador": params.get("loaderId"),
+                    }
+            elif metodo in ("Network.loadingFinished", "Network.loadingFailed"):
+                en_curso.pop(params.get("requestId"), None)
+            elif metodo == "Network.responseReceived":
+                respuesta = params.get("response", {})
+                seguimiento["respuestas"].append({
+                    "url": respuesta.get("url", ""),
+                    "estado": respuesta.get("status"),
+                    "tipo": params.get("type"),
+                    "id": params.get("requestId"),
+                    "hora": (evento["marca"] or time.time() * 1000) / 1000,
+                })
+            elif metodo == "Page.frameNavigated":
+                marco = params.get("frame", {})
+                if not marco.get("parentId"):
+                    # Página nueva: las peticiones de la anterior ya no terminarán
+                    cargador = marco.get("loaderId")
+                    for id_peticion in [i for i, p in en_curso.items() if p["cargador"] != cargador]:
+                        del en_curso[id_peticion]
+            seguimiento["ultima_actividad"] = time.monotonic()
+
+
+def disponible(driver) -> bool:
+    """
+    Indica si se pueden seguir las peticiones de red del driver.
+    """
+    return _seguimiento(driver) is not None
+
+
+def peticiones_en_curso(driver) -> int:
+    """
+    Devuelve cuántas peticiones cuentan como en curso (0 si no hay eventos CDP).
+    """
+    seguimiento = _seguimiento(driver)
+    if seguimiento is None:
+        return 0
+    _procesar(seguimiento)
+    limite = time.monotonic() - EDAD_MAXIMA
+    with seguimiento["lock"]:
+        return sum(1 for peticion in seguimiento["en_curso"].values() if peticion["inicio"] >= limite)
+
+
+def red_inactiva(driver, silencio_ms: int = 300) -> bool:
+    """
+    Indica, sin esperar, si no hay peticiones en curso y no ha habido actividad de red en los últimos 'silencio_ms'.
+    Devuelve True si no hay eventos CDP (no se puede saber).
+    """
+    seguimiento = _seguimiento(driver)
+    if seguimiento is None:
+        return True
+    if peticiones_en_curso(driver) > 0:
+        return False
+    return time.monotonic() - seguimiento["ultima_actividad"] >= silencio_ms / 1000
+
+
+def esperar_red_inactiva(driver, silencio_ms: int = 300, timeout: float = 10) -> bool:
+    """
+    Espera a que no haya peticiones en curso durante 'silencio_ms' milisegundos seguidos.
+
+    Returns:
+        bool: True si la red queda inactiva (o no hay eventos CDP), False si se agota el tiempo.
+    """
+    if _seguimiento(driver) is None:
+        return True
+    limite = time.monotonic() + timeout
+    while not red_inactiva(driver, silencio_ms):
+        if time.monotonic() >= limite:
+            seguimiento = _seguimiento(driver)
+            with seguimiento["lock"]:
+                pendientes = [peticion["url"] for peticion in seguimiento["en_curso"].values()]
+            logging.warning(f"La red no quedó inactiva en {timeout}s. Peticiones en curso: {pendientes[:5]}")
+            return False
+        time.sleep(INTERVALO_SONDEO)
+    return True
+
+
+def esperar_respuesta(driver, patron: str, timeout: float = 10, desde: float = None):
+    """
+    Espera la respuesta de una petición cuya URL cumpla la expresión regular 'patron'.
+
+    Args:
+        driver (webdriver.Chrome | WebElement): Navegador o elemento de la página.
+        patron (str): Expresión regular que se busca en la URL.
+        timeout (float, optional): Tiempo máximo de espera en segundos.
+        desde (float, optional): Hora (time.time()) a partir de la que cuentan las respuestas. Conviene tomarla
+            antes de la acción que lanza la petición; por defecto, el momento de la llamada.
+
+    Returns:
+        dict or None: {"url", "estado", "tipo", "id", "hora"} de la primera respuesta que coincide,
+        o None si no llega en el tiempo indicado (o no hay eventos CDP).
+    """
+    seguimiento = _seguimiento(driver)
+    if seguimiento is None:
+        return None
+    desde = time.time() if desde is None else desde
+    expresion = re.compile(patron)
+    limite = time.monotonic() + timeout
+    while True:
+        _procesar(seguimiento)
+        with seguimiento["lock"]:
+            respuesta = next(
+                (r for r in seguimiento["respuestas"] if r["hora"] >= desde and expresion.search(r["url"])), None
+            )
+        if respuesta is not None:
+            logging.info(f"Respuesta recibida de {respuesta['url']} ({respuesta['estado']}).")
+            return respuesta
+        if time.monotonic() >= limite:
+            logging.warning(f"No llegó ninguna respuesta de '{patron}' en {timeout}s.")
+            return None
+        time.sleep(INTERVALO_SONDEO)
+
+
+def olvidar_driver(driver) -> None:
+    """
+    Elimina el seguimiento de red de un driver que se va a cerrar.
+    """
+    with _lock:
+        seguimiento = _seguimientos.pop(getattr(driver, "session_id", None), None)
+    if seguimiento is not None:
+        eventosCDP.cancelar_suscripcion(seguimiento["suscripcion"])
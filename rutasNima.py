@@ -0,0 +1,156 @@
+"""
+Módulo: rutasNima.py
+
+Este módulo recuerda en qué portal autonómico se ha encontrado cada NIF y con qué resultado
+(comunidad, latencia, número de centros) para decidir en qué orden buscar la próxima vez.
+
+Criterios de ordenación (de más a menos peso):
+  1. La comunidad donde ya se encontró ese mismo NIF.
+  2. La comunidad que indica el prefijo provincial del CIF (dígitos 2-3 de los CIF de sociedades).
+  3. La tasa histórica de aciertos de cada comunidad (suavizada para las comunidades con pocos datos).
+  4. El orden original recibido.
+
+Los datos se guardan en una base SQLite local (data/rutas_nima.sqlite3).
+
+Ejemplo de uso:
+    comunidades = rutasNima.ordenar_comunidades("B46090478", mainNima.COMUNIDADES_NIMA)
+    rutasNima.registrar_busqueda("B46090478", "Valencia", True, 4.2, 1)
+"""
+
+import loggerConfig
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from config import BASE_DIR
+
+RUTA_RUTAS = os.path.join(BASE_DIR, "data", "rutas_nima.sqlite3")
+
+# Códigos provinciales de los CIF (incluye los códigos ampliados de las provincias con más sociedades)
+PREFIJOS_CIF_COMUNIDAD = {
+    "Valencia": ["03", "53", "54", "12", "46", "96", "97", "98"],
+    "Madrid": ["28", "78", "79", "80", "81", "82", "83", "84", "85", "86", "87", "88"],
+    "Cataluña": ["08", "58", "59", "60", "61", "62", "63", "64", "65", "66", "68", "17", "55", "25", "43", "77"],
+    "Castilla": ["02", "13", "16", "19", "45"],
+}
+_COMUNIDAD_POR_PREFIJO = {
+    prefijo: comunidad for comunidad, prefijos in PREFIJOS_CIF_COMUNIDAD.items() for prefijo in prefijos
+}
+
+
+@contextmanager
+def _conexion():
+    """
+    Abre una conexión a la base de rutas, hace commit al salir del bloque y la cierra.
+    """
+    os.makedirs(os.path.dirname(RUTA_RUTAS), exist_ok=True)
+    conexion = sqlite3.connect(RUTA_RUTAS, timeout=10)
+    conexion.execute("PRAGMA journal_mode=WAL")
+    conexion.execute(
+        """
+        CREATE TABLE IF NOT EXISTS busquedas (
+            nif TEXT NOT NULL,
+            comunidad TEXT NOT NULL,
+            encontrado INTEGER NOT NULL,
+            latencia REAL,
+            centros INTEGER,
+            fecha REAL NOT NULL
+        )
+        """
+    )
+    conexion.execute("CREATE INDEX IF NOT EXISTS idx_busquedas_nif ON busquedas (nif)")
+    try:
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def _normalizar(nif: str) -> str:
+    return re.sub(r"[\s\-.]", "", str(nif)).upper()
+
+
+def registrar_busqueda(nif: str, comunidad: str, encontrado: bool, latencia: float = None, centros: int = 0) -> None:
+    """
+    Registra el resultado de buscar un NIF en una comunidad (acierto o fallo).
+    Los errores al guardar solo se registran en el log: nunca deben romper una búsqueda.
+    """
+    try:
+        with _conexion() as conexion:
+            conexion.execute(
+                "INSERT INTO busquedas (nif, comunidad, encontrado, latencia, centros, fecha) VALUES (?, ?, ?, ?, ?, ?)",
+                (_normalizar(nif), comunidad, int(encontrado), latencia, centros, time.time()),
+            )
+    except Exception as e:
+        logging.error(f"No se pudo registrar la búsqueda de {nif} en {comunidad}: {e}")
+
+
+def comunidad_conocida(nif: str):
+    """
+    Devuelve la última comunidad en la que se encontró el NIF, o None.
+    """
+    with _conexion() as conexion:
+        fila = conexion.execute(
+            "SELECT comunidad FROM busquedas WHERE nif = ? AND encontrado = 1 ORDER BY fecha DESC LIMIT 1",
+            (_normalizar(nif),),
+        ).fetchone()
+    return fila[0] if fila else None
+
+
+def comunidad_por_prefijo(nif: str):
+    """
+    Devuelve la comunidad que indica el código provincial de un CIF de sociedad (letra + 8 dígitos), o None.
+    Es solo una pista: los CIF no cambian cuando la empresa se traslada.
+    """
+    nif = _normalizar(nif)
+    if not re.fullmatch(r"[A-HJ-NP-SUVW]\d{8}", nif):
+        return None
+    return _COMUNIDAD_POR_PREFIJO.get(nif[1:3])
+
+
+def tasas_acierto() -> dict:
+    """
+    Devuelve, por comunidad, la tasa de aciertos suavizada (aciertos + 1) / (intentos + 2)
+    y la latencia media de las búsquedas registradas.
+    """
+    with _conexion() as conexion:
+        filas = conexion.execute(
+            "SELECT comunidad, SUM(encontrado), COUNT(*), AVG(latencia) FROM busquedas GROUP BY comunidad"
+        ).fetchall()
+    return {
+        comunidad: {"tasa": (aciertos + 1) / (intentos + 2), "intentos": intentos, "latencia_media": latencia}
+        for comunidad, aciertos, intentos, latencia in filas
+    }
+
+
+def ordenar_comunidades(nif: str, comunidades: list) -> list:
+    """
+    Reordena la lista de tuplas (nombre, funcion_busqueda) para buscar primero donde es más probable encontrar el NIF.
+    Si falla la lectura del histórico, devuelve las comunidades en el orden original.
+    """
+    try:
+        conocida = comunidad_conocida(nif)
+        pista = comunidad_por_prefijo(nif)
+        tasas = tasas_acierto()
+    except Exception as e:
+        logging.error(f"No se pudo leer el histórico de rutas NIMA: {e}")
+        return list(comunidades)
+
+    def puntuacion(indexado):
+        posicion, (nombre, _) = indexado
+        return (
+            nombre != conocida,
+            nombre != pista,
+            -tasas.get(nombre, {"tasa": 0.5})["tasa"],
+            posicion,
+        )
+
+    ordenadas = [comunidad for _, comunidad in sorted(enumerate(comunidades), key=puntuacion)]
+    logging.info(
+        f"Orden de búsqueda para {nif}: {[nombre for nombre, _ in ordenadas]} "
+        f"(conocida: {conocida}, prefijo: {pista})"
+    )
+    return ordenadas
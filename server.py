@@ -5,12 +5,38 @@ Para iniciar el servidor FastAPI, ejecuta el siguiente comando en la terminal:
 
 Ejemplo de uso del endpoint "busqueda-nima" mediante curl.exe:
     curl.exe -X POST "http://<IP_DEL_SERVIDOR>:8000/busqueda-nima" -H "Content-Type: text/plain" -d "B98969264"
+    curl.exe -X POST "http://<IP_DEL_SERVIDOR>:8000/busqueda-nima?usar_cache=false" -H "Content-Type: text/plain" -d "B98969264"
+    curl.exe -X POST "http://<IP_DEL_SERVIDOR>:8000/busqueda-nima?backend=selenium" -H "Content-Type: text/plain" -d "B98969264"
+
+Ejemplo de búsqueda por lotes (la respuesta llega en streaming, una línea JSON por NIF):
+    curl.exe -N -X POST "http://<IP_DEL_SERVIDOR>:8000/busqueda-nima/batch?concurrencia=2" -H "Content-Type: application/json" -d "[\"B98969264\", \"B43693274\"]"
+
+Ejemplo de búsqueda como trabajo asíncrono (devuelve un id al instante y se consulta después):
+    curl.exe -X POST "http://<IP_DEL_SERVIDOR>:8000/busqueda-nima/jobs" -H "Content-Type: text/plain" -d "B98969264"
+    curl.exe "http://<IP_DEL_SERVIDOR>:8000/jobs/<ID_TRABAJO>?espera=30"
 """
 
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from typing import List
+import asyncio
+import json
 import logging
+import time
+import cacheNima
+import driverPool
 import mainNima
+import nimaFunctions
+import trabajosNima
+
+# Pool de navegadores precalentados para las búsquedas NIMA
+TAMANO_POOL_NIMA = 2
+MAX_USOS_DRIVER_NIMA = 25
+# Búsquedas simultáneas por defecto en /busqueda-nima/batch (se limitan a las que caben en el pool, ver más abajo)
+CONCURRENCIA_LOTE_NIMA = 2
+# Máximo de segundos que GET /jobs/{id} puede quedarse esperando (long-poll)
+ESPERA_MAXIMA_TRABAJO = 60
 
 app = FastAPI()
 
@@ -23,24 +49,159 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los encabezados
 )
 
+@app.on_event("startup")
+async def iniciar_pool_drivers():
+    """
+    Arranca el pool de drivers de Chrome al iniciar el servidor, para que las búsquedas no paguen el arranque del navegador.
+    """
+    await asyncio.to_thread(driverPool.iniciar_pool, TAMANO_POOL_NIMA, MAX_USOS_DRIVER_NIMA)
+
+@app.on_event("shutdown")
+async def cerrar_pool_drivers():
+    """
+    Cancela los trabajos pendientes y cierra todos los navegadores del pool al parar el servidor.
+    """
+    trabajosNima.cerrar()
+    await asyncio.to_thread(driverPool.cerrar_pool)
+
+@app.get("/health")
+async def health_endpoint():
+    """
+    Health check: responde al instante aunque haya búsquedas largas en curso.
+    """
+    return {
+        "estado": "ok",
+        "pool": driverPool.estado_pool(),
+        "trabajos": trabajosNima.resumen_trabajos()
+    }
+
 @app.post("/busqueda-nima")
 async def busqueda_nima_endpoint(
-    nif: str = Body(..., media_type="text/plain")
+    nif: str = Body(..., media_type="text/plain"),
+    usar_cache: bool = True,
+    invalidar: bool = False,
+    backend: str = None
 ):
     """
     Endpoint para buscar el NIF en la web de NIMA y devolver el JSON extraído.
+    Los resultados se sirven desde la caché persistente si están vigentes.
 
     Ejemplo de llamada:
       POST /busqueda-nima
       Body: B98969264
 
+    Parámetros de query opcionales:
+      usar_cache=false  -> ignora la caché y busca en los portales.
+      invalidar=true    -> borra la entrada de caché del NIF antes de buscar.
+      backend=selenium  -> consulta los portales con navegador en lugar de HTTP (por defecto "http").
+
     Si ocurre alguna excepción en busqueda_NIMA o sus subfunciones, se devolverá un error HTTP con el mensaje.
     """
     try:
-        resultado = mainNima.busqueda_NIMA(nif)
+        # La búsqueda es síncrona (Selenium): se ejecuta en un hilo para no bloquear el event loop
+        resultado = await asyncio.to_thread(
+            mainNima.busqueda_NIMA_cacheada, nif, usar_cache=usar_cache, invalidar=invalidar, backend=backend
+        )
         logging.info(f"Resultado: {resultado}")
         return resultado
     except Exception as e:
         logging.error(f"Error en busqueda_nima_endpoint: {e}")
         # Puedes elegir otro código HTTP si lo prefieres, aquí usamos 400 en caso de error de búsqueda.
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/busqueda-nima/batch")
+async def busqueda_nima_batch_endpoint(
+    nifs: List[str] = Body(...),
+    concurrencia: int = CONCURRENCIA_LOTE_NIMA,
+    usar_cache: bool = True,
+    formato: str = "ndjson",
+    backend: str = None
+):
+    """
+    Endpoint para buscar muchos NIF de una vez. Los NIF se normalizan y deduplican, se buscan con
+    'concurrencia' búsquedas en paralelo y cada resultado se envía en cuanto está listo.
+    Con el pool activo, 'concurrencia' se limita a las búsquedas que caben en el pool en el peor caso
+    (cada búsqueda escalonada puede tener prestado un navegador por comunidad, ver mainNima.drivers_por_busqueda).
+
+    Ejemplo de llamada:
+      POST /busqueda-nima/batch?concurrencia=2
+      Body: ["B98969264", "B43693274"]
+
+    Formato de respuesta:
+      formato=ndjson (por defecto) -> una línea JSON por NIF.
+      formato=sse                  -> Server-Sent Events ("data: {...}").
+    Cada elemento incluye nif, comunidad, origen (cache/busqueda), tiempo (s), resultado y error.
+    La última línea es un resumen {"fin": true, "total": ..., "tiempo": ...}.
+    """
+    if formato not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="Formato no soportado, use 'ndjson' o 'sse'.")
+    try:
+        backend = nimaFunctions.validar_backend(backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    unicos = list(dict.fromkeys(cacheNima.normalizar_nif(nif) for nif in nifs if str(nif).strip()))
+    pool = driverPool.estado_pool()
+    if pool["activo"]:
+        concurrencia = min(concurrencia, pool["tamano"] // mainNima.drivers_por_busqueda(backend))
+    concurrencia = max(1, concurrencia)
+    logging.info(f"Búsqueda por lotes de {len(unicos)} NIF ({len(nifs)} recibidos) con concurrencia {concurrencia}.")
+
+    def serializar(datos):
+        linea = json.dumps(datos, ensure_ascii=False)
+        return f"data: {linea}\n\n" if formato == "sse" else f"{linea}\n"
+
+    async def generar():
+        inicio = time.perf_counter()
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def buscar(nif):
+            async with semaforo:
+                return await asyncio.to_thread(mainNima.busqueda_NIMA_detallada, nif, usar_cache, backend)
+
+        tareas = [asyncio.create_task(buscar(nif)) for nif in unicos]
+        try:
+            for siguiente in asyncio.as_completed(tareas):
+                yield serializar(await siguiente)
+            yield serializar({"fin": True, "total": len(unicos), "tiempo": round(time.perf_counter() - inicio, 3)})
+        finally:
+            # Si el cliente se desconecta, se cancelan las búsquedas que aún no han empezado
+            for tarea in tareas:
+                tarea.cancel()
+
+    media_type = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(generar(), media_type=media_type)
+
+@app.post("/busqueda-nima/jobs", status_code=202)
+async def crear_trabajo_nima_endpoint(
+    nif: str = Body(..., media_type="text/plain"),
+    usar_cache: bool = True,
+    callback: str = None,
+    backend: str = None
+):
+    """
+    Crea un trabajo de búsqueda NIMA y devuelve su id inmediatamente; la búsqueda se ejecuta en segundo plano.
+
+    Ejemplo de llamada:
+      POST /busqueda-nima/jobs?callback=http://localhost:9000/nima
+      Body: B98969264
+
+    Si se indica 'callback' (solo URLs de localhost), al terminar se hace un POST con el trabajo en JSON.
+    """
+    try:
+        id_trabajo = trabajosNima.crear_trabajo(nif, usar_cache=usar_cache, callback=callback, backend=backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id": id_trabajo, "estado": "pendiente", "url": f"/jobs/{id_trabajo}"}
+
+@app.get("/jobs/{id_trabajo}")
+async def obtener_trabajo_endpoint(id_trabajo: str, espera: float = 0):
+    """
+    Devuelve el estado y, si ha terminado, el resultado de un trabajo.
+    Con espera > 0 (máximo ESPERA_MAXIMA_TRABAJO segundos) hace long-poll hasta que el trabajo termine.
+    """
+    espera = max(0, min(espera, ESPERA_MAXIMA_TRABAJO))
+    trabajo = await asyncio.to_thread(trabajosNima.obtener_trabajo, id_trabajo, espera)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {id_trabajo}")
+    return trabajo
@@ -0,0 +1,168 @@
+"""
+Módulo: trabajosNima.py
+
+Este módulo gestiona las búsquedas NIMA como trabajos asíncronos: al crear un trabajo se devuelve
+un identificador inmediatamente y la búsqueda se ejecuta en un pool de hilos en segundo plano,
+de modo que el servidor puede seguir atendiendo otras peticiones mientras dura el scraping.
+
+Funciones principales:
+  - crear_trabajo(nif, usar_cache, callback, backend): encola la búsqueda y devuelve el id del trabajo.
+  - obtener_trabajo(id_trabajo, espera): devuelve el estado del trabajo; si 'espera' > 0 hace long-poll
+    hasta que el trabajo termine o pase ese tiempo.
+  - Si se indica 'callback' (solo URLs de localhost), al terminar se hace un POST con el trabajo en JSON.
+
+Estados de un trabajo: "pendiente", "en_curso", "completado", "error".
+
+Ejemplo de uso:
+    id_trabajo = trabajosNima.crear_trabajo("B98969264")
+    trabajo = trabajosNima.obtener_trabajo(id_trabajo, espera=30)
+"""
+
+import loggerConfig
+import json
+import logging
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import mainNima
+import nimaFunctions
+
+# Búsquedas ejecutándose a la vez (el resto quedan en estado "pendiente")
+MAX_TRABAJOS_SIMULTANEOS = 2
+# Segundos que se conservan los trabajos terminados antes de olvidarlos
+RETENCION_TRABAJOS = 3600
+HOSTS_CALLBACK_PERMITIDOS = {"localhost", "127.0.0.1", "::1"}
+
+_trabajos = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_TRABAJOS_SIMULTANEOS, thread_name_prefix="trabajoNima")
+
+
+def _validar_callback(callback):
+    """
+    Comprueba que la URL de callback apunta a localhost. Lanza ValueError si no.
+    """
+    url = urllib.parse.urlparse(callback)
+    if url.scheme not in ("http", "https") or url.hostname not in HOSTS_CALLBACK_PERMITIDOS:
+        raise ValueError(f"Callback no permitido (solo http(s) a localhost): {callback}")
+
+
+def _vista_publica(trabajo):
+    return {clave: valor for clave, valor in trabajo.items() if clave != "evento"}
+
+
+def _notificar_callback(trabajo):
+    """
+    Envía el trabajo terminado en JSON a su URL de callback. Los errores solo se registran.
+    """
+    datos = json.dumps(_vista_publica(trabajo), ensure_ascii=False).encode("utf-8")
+    peticion = urllib.request.Request(
+        trabajo["callback"], data=datos, headers={"Content-Type": "application/json"}, method="POST"
+    )
+    try:
+        with urllib.request.urlopen(peticion, timeout=10) as respuesta:
+            logging.info(f"Callback del trabajo {trabajo['id']} enviado ({respuesta.status}).")
+    except Exception as e:
+        logging.error(f"Error enviando el callback del trabajo {trabajo['id']}: {e}")
+
+
+def _ejecutar(id_trabajo):
+    trabajo = _trabajos[id_trabajo]
+    trabajo["estado"] = "en_curso"
+    trabajo["iniciado"] = time.time()
+    try:
+        detalle = mainNima.busqueda_NIMA_detallada(trabajo["nif"], trabajo["usar_cache"], trabajo["backend"])
+        trabajo["resultado"] = detalle
+        trabajo["error"] = detalle["error"]
+        trabajo["estado"] = "error" if detalle["error"] else "completado"
+    except Exception as e:
+        logging.error(f"Error ejecutando el trabajo {id_trabajo}: {e}")
+        trabajo["error"] = str(e)
+        trabajo["estado"] = "error"
+    finally:
+        trabajo["terminado"] = time.time()
+        trabajo["evento"].set()
+    logging.info(f"Trabajo {id_trabajo} terminado en estado '{trabajo['estado']}'.")
+    if trabajo["callback"]:
+        _notificar_callback(trabajo)
+
+
+def _purgar_trabajos_antiguos():
+    limite = time.time() - RETENCION_TRABAJOS
+    with _lock:
+        antiguos = [
+            id_trabajo for id_trabajo, trabajo in _trabajos.items()
+            if trabajo["terminado"] and trabajo["terminado"] < limite
+        ]
+        for id_trabajo in antiguos:
+            del _trabajos[id_trabajo]
+
+
+def crear_trabajo(nif: str, usar_cache: bool = True, callback: str = None, backend: str = None) -> str:
+    """
+    Crea un trabajo de búsqueda NIMA y lo encola. Devuelve el id del trabajo sin esperar a la búsqueda.
+
+    Raises:
+        ValueError: Si el callback no apunta a localhost o el backend no existe.
+    """
+    backend = nimaFunctions.validar_backend(backend)
+    if callback:
+        _validar_callback(callback)
+    _purgar_trabajos_antiguos()
+    id_trabajo = uuid.uuid4().hex
+    trabajo = {
+        "id": id_trabajo,
+        "nif": nif,
+        "usar_cache": usar_cache,
+        "callback": callback,
+        "backend": backend,
+        "estado": "pendiente",
+        "creado": time.time(),
+        "iniciado": None,
+        "terminado": None,
+        "resultado": None,
+        "error": None,
+        "evento": threading.Event(),
+    }
+    with _lock:
+        _trabajos[id_trabajo] = trabajo
+    _executor.submit(_ejecutar, id_trabajo)
+    logging.info(f"Trabajo {id_trabajo} creado para el NIF {nif}.")
+    return id_trabajo
+
+
+def obtener_trabajo(id_trabajo: str, espera: float = 0):
+    """
+    Devuelve el estado del trabajo, o None si no existe.
+
+    Args:
+        id_trabajo (str): Identificador devuelto por crear_trabajo.
+        espera (float): Segundos máximos a esperar a que el trabajo termine (long-poll). 0 no espera.
+    """
+    trabajo = _trabajos.get(id_trabajo)
+    if trabajo is None:
+        return None
+    if espera > 0:
+        trabajo["evento"].wait(espera)
+    return _vista_publica(trabajo)
+
+
+def resumen_trabajos() -> dict:
+    """
+    Devuelve el número de trabajos conocidos en cada estado.
+    """
+    resumen = {"pendiente": 0, "en_curso": 0, "completado": 0, "error": 0}
+    for trabajo in list(_trabajos.values()):
+        resumen[trabajo["estado"]] += 1
+    return resumen
+
+
+def cerrar() -> None:
+    """
+    Cancela los trabajos pendientes y deja de aceptar trabajos nuevos.
+    """
+    _executor.shutdown(wait=False, cancel_futures=True)
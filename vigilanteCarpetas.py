@@ -0,0 +1,231 @@
+"""
+Módulo: vigilanteCarpetas.py
+
+Este módulo espera a que aparezcan archivos terminados en una carpeta de descargas sin bucles de sleep + listdir.
+
+En Linux usa inotify (a través de ctypes, sin dependencias externas): el sistema avisa cuando un archivo se termina
+de escribir (IN_CLOSE_WRITE) o cuando Chrome renombra el .crdownload a su nombre final (IN_MOVED_TO), así que la
+espera termina en cuanto la descarga acaba y no hace falta comprobar si el tamaño se ha estabilizado.
+En el resto de sistemas (o si inotify no está disponible) se sondea la carpeta cada INTERVALO_SONDEO segundos y un
+archivo se da por terminado cuando su tamaño y fecha no cambian entre dos sondeos seguidos.
+
+Los archivos que ya tienen su nombre final al empezar la espera se consideran terminados (Chrome solo pone el
+nombre final cuando la descarga ha acabado), salvo los indicados en 'previos' que no han cambiado.
+
+Funciones principales:
+  - esperar_archivos(carpeta, patron, num_archivos, timeout, excluir, previos): devuelve los N primeros archivos
+    terminados que cumplen el patrón glob, en el orden en que terminan.
+  - estado_carpeta(carpeta): fecha de modificación de cada archivo, para usarla como 'previos'.
+
+Ejemplo de uso:
+    previos = vigilanteCarpetas.estado_carpeta(carpeta)
+    webFunctions.clickar_boton_por_id(driver, "descargar")
+    archivos = vigilanteCarpetas.esperar_archivos(carpeta, "*.pdf", num_archivos=2, timeout=60, previos=previos)
+"""
+
+import loggerConfig
+import ctypes
+import ctypes.util
+import fnmatch
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+# Extensiones de archivos que el navegador aún está escribiendo o que no son descargas reales
+EXTENSIONES_TEMPORALES = ('.crdownload', '.tmp', '.htm')
+
+# Segundos entre sondeos cuando no hay notificaciones del sistema
+INTERVALO_SONDEO = 0.5
+
+# Constantes de inotify (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_CABECERA_EVENTO = struct.Struct("iIII")
+
+_libc = None
+
+
+def _libc_inotify():
+    """
+    Devuelve la libc con las funciones de inotify, o None si el sistema no las tiene.
+    """
+    global _libc
+    if _libc is None:
+        _libc = False
+        if sys.platform.startswith("linux"):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                _libc = libc
+            except (OSError, AttributeError) as e:
+                logging.info(f"inotify no disponible, se vigilarán las carpetas por sondeo: {e}")
+    return _libc or None
+
+
+def _abrir_inotify(carpeta: str):
+    """
+    Crea un descriptor inotify que vigila la carpeta. Devuelve None si no se puede.
+    """
+    libc = _libc_inotify()
+    if libc is None:
+        return None
+    descriptor = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    if descriptor < 0:
+        logging.info(f"No se pudo iniciar inotify: {os.strerror(ctypes.get_errno())}")
+        return None
+    if libc.inotify_add_watch(descriptor, os.fsencode(carpeta), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+        logging.info(f"No se pudo vigilar {carpeta} con inotify: {os.strerror(ctypes.get_errno())}")
+        os.close(descriptor)
+        return None
+    return descriptor
+
+
+def _leer_eventos(descriptor: int, timeout: float):
+    """
+    Espera hasta 'timeout' segundos a que haya eventos inotify y devuelve la lista de nombres afectados.
+    Devuelve None si la cola del sistema se ha desbordado (hay que volver a leer la carpeta).
+    """
+    listos, _, _ = select.select([descriptor], [], [], max(0, timeout))
+    if not listos:
+        return []
+    try:
+        datos = os.read(descriptor, 64 * 1024)
+    except BlockingIOError:
+        return []
+    nombres = []
+    posicion = 0
+    while posicion + _CABECERA_EVENTO.size <= len(datos):
+        _, mascara, _, longitud = _CABECERA_EVENTO.unpack_from(datos, posicion)
+        posicion += _CABECERA_EVENTO.size
+        nombre = datos[posicion:posicion + longitud].rstrip(b"\0")
+        posicion += longitud
+        if mascara & _IN_Q_OVERFLOW:
+            return None
+        if nombre:
+            nombres.append(os.fsdecode(nombre))
+    return nombres
+
+
+def estado_carpeta(carpeta: str) -> dict:
+    """
+    Devuelve {nombre: fecha de modificación} de los archivos de la carpeta.
+    """
+    estado = {}
+    try:
+        with os.scandir(carpeta) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_file():
+                        estado[entrada.name] = entrada.stat().st_mtime
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return estado
+
+
+def _listar(carpeta: str) -> dict:
+    """
+    Devuelve {nombre: (tamaño, fecha de modificación)} de los archivos de la carpeta.
+    """
+    archivos = {}
+    try:
+        with os.scandir(carpeta) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_file():
+                        datos = entrada.stat()
+                        archivos[entrada.name] = (datos.st_size, datos.st_mtime)
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return archivos
+
+
+def _listar_uno(carpeta: str, nombre: str):
+    """
+    Devuelve (tamaño, fecha de modificación) de un archivo, o None si ya no existe.
+    """
+    try:
+        datos = os.stat(os.path.join(carpeta, nombre))
+    except OSError:
+        return None
+    return datos.st_size, datos.st_mtime
+
+
+def esperar_archivos(carpeta: str, patron: str = "*", num_archivos: int = 1, timeout: float = 30,
+                     excluir=(), previos=None) -> list:
+    """
+    Espera a que haya 'num_archivos' archivos terminados en la carpeta que cumplan el patrón glob.
+
+    Args:
+        carpeta (str): Carpeta de descargas.
+        patron (str, optional): Patrón glob del nombre (p. ej. "*.xlsx").
+        num_archivos (int, optional): Número de archivos que se esperan.
+        timeout (float, optional): Tiempo máximo de espera en segundos.
+        excluir (iterable, optional): Rutas ya recogidas que no deben devolverse otra vez.
+        previos (dict | iterable, optional): Archivos que ya estaban antes de lanzar la descarga
+            ({nombre: fecha de modificación}, ver estado_carpeta, o lista de nombres). Solo se devuelven si se
+            modifican después.
+
+    Returns:
+        list: Rutas absolutas de los archivos terminados, en el orden en que terminaron (los que ya estaban al
+        empezar, del más antiguo al más reciente). Puede tener menos elementos si se agota el tiempo.
+    """
+    carpeta = os.path.abspath(carpeta)
+    excluir = set(excluir)
+    if previos is not None and not isinstance(previos, dict):
+        previos = {nombre: os.path.getmtime(os.path.join(carpeta, nombre))
+                   for nombre in previos if os.path.isfile(os.path.join(carpeta, nombre))}
+    previos = previos or {}
+    terminados = []
+
+    def aceptar(nombre: str, datos) -> None:
+        ruta = os.path.join(carpeta, nombre)
+        if (datos is None or nombre.endswith(EXTENSIONES_TEMPORALES) or ruta in excluir or ruta in terminados
+                or not fnmatch.fnmatch(nombre, patron)):
+            return
+        if nombre in previos and datos[1] <= previos[nombre]:
+            return
+        terminados.append(ruta)
+
+    limite = time.monotonic() + timeout
+    descriptor = _abrir_inotify(carpeta)
+    try:
+        # Los archivos con nombre final que ya están en la carpeta se dan por terminados
+        actuales = _listar(carpeta)
+        for nombre, datos in sorted(actuales.items(), key=lambda item: (item[1][1], item[0])):
+            aceptar(nombre, datos)
+
+        while len(terminados) < num_archivos:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            if descriptor is not None:
+                nombres = _leer_eventos(descriptor, restante)
+                if nombres is None:
+                    actuales = _listar(carpeta)
+                    nombres = sorted(actuales, key=lambda nombre: (actuales[nombre][1], nombre))
+                for nombre in nombres:
+                    aceptar(nombre, _listar_uno(carpeta, nombre))
+            else:
+                time.sleep(min(INTERVALO_SONDEO, restante))
+                nuevos = _listar(carpeta)
+                # Terminado = mismo tamaño y fecha que en el sondeo anterior
+                estables = [nombre for nombre, datos in nuevos.items() if actuales.get(nombre) == datos]
+                for nombre in sorted(estables, key=lambda nombre: (nuevos[nombre][1], nombre)):
+                    aceptar(nombre, nuevos[nombre])
+                actuales = nuevos
+    finally:
+        if descriptor is not None:
+            os.close(descriptor)
+    return terminados[:num_archivos]
+
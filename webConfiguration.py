@@ -1,12 +1,64 @@
-
 import loggerConfig
+import json
 import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+from config import BASE_DIR
+
+# Ruta del chromedriver resuelta en ejecuciones anteriores (se reutiliza sin consultar webdriver_manager)
+RUTA_CACHE_CHROMEDRIVER = os.path.join(BASE_DIR, "data", "chromedriver.json")
+
+# Versión fija de chromedriver (p. ej. "139.0.7258.66"); None para la que corresponda al Chrome instalado
+VERSION_CHROMEDRIVER = None
+
+_chromedriver = {"ruta": None, "resuelto": False}
+_lock_chromedriver = threading.Lock()
+
+# Perfiles de navegador:
+#   - "completo": el de siempre (ventana maximizada, carga completa). Para los flujos que necesitan ver diálogos
+#     y certificados (MITECO, AutoFirma) o que manejan el navegador a mano.
+#   - "ligero": para las búsquedas (pool de NIMA): carga "eager" (no espera a imágenes ni hojas de estilo),
+#     sin extensiones ni tráfico en segundo plano y con imágenes, fuentes y rastreadores bloqueados.
+PERFIL_COMPLETO = "completo"
+PERFIL_LIGERO = "ligero"
+
+# Recursos que bloquea el perfil ligero (patrones de Network.setBlockedURLs, admiten comodines *)
+RECURSOS_BLOQUEADOS = {
+    "imagenes": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*.bmp"],
+    "fuentes": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "rastreadores": [
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+        "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+    ],
+}
 
-def configure():
+# Recursos que no se bloquean en cada web porque el flujo los necesita
+# (en Castilla-La Mancha se hace clic en la imagen que genera el Excel)
+RECURSOS_PERMITIDOS_POR_SITIO = {
+    "ireno.castillalamancha.es": ("imagenes",),
+}
+
+# Perfil y URLs bloqueadas de cada driver (por session_id)
+_perfiles = {}
+
+
+def configure(perfil: str = PERFIL_COMPLETO, headless: bool = False, eventos_cdp: bool = True):
+    """
+    Arranca Chrome con el perfil indicado ("completo" o "ligero") y, opcionalmente, sin ventana (headless).
+    Con eventos_cdp=False no se activa el log de eventos de DevTools: para flujos que no usan eventosCDP
+    (ni redCDP ni la espera de descargas por eventos), así Chrome no acumula eventos que nadie lee.
+    Devuelve el driver, o None si no se ha podido iniciar el navegador.
+    """
     # Configurar el WebDriver para Google Chrome
     options = webdriver.ChromeOptions()
 
@@ -15,22 +67,230 @@ def configure():
     options.add_argument("--no-first-run --no-default-browser-check")
     options.add_argument("--disable-features=ChromeWhatsNewUI")
 
-    # Opcional: para que veas errores o popups
-    # options.add_argument("--headless")  # puedes quitarlo temporalmente
-
-    options.add_argument("--start-maximized")
+    # Sin ventana: solo para flujos que no necesitan diálogos del sistema ni intervención manual
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    else:
+        options.add_argument("--start-maximized")
     options.add_argument("--disable-notifications")
     options.add_argument("--disable-infobars")
     options.add_argument("--disable-popup-blocking")
+
+    if perfil == PERFIL_LIGERO:
+        # driver.get vuelve con el DOM listo, sin esperar a imágenes, estilos ni iframes
+        options.page_load_strategy = "eager"
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-component-update")
+        options.add_argument("--disable-default-apps")
+        options.add_argument("--disable-sync")
+
     options.add_experimental_option("prefs", {
         "credentials_enable_service": False,  # Desactiva el gestor de contraseñas
         "profile.password_manager_enabled": False,  # Evita guardar contraseñas
         "profile.default_content_setting_values.notifications": 2  # Opcional: desactiva notificaciones
     })
+    if eventos_cdp:
+        # Registra los eventos de DevTools (descargas, red...) para leerlos con eventosCDP
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    inicio = time.perf_counter()
+    ruta = ruta_chromedriver()
+    resuelto = time.perf_counter()
+    try:
+        driver = webdriver.Chrome(service=Service(ruta) if ruta else Service(), options=options)
+    except Exception as e:
+        if ruta is None or "session not created" not in str(e).lower():
+            logging.error(f"Error al iniciar el navegador: {e}")
+            return None
+        # El chromedriver guardado ya no sirve para el Chrome instalado (se ha actualizado): se resuelve de nuevo
+        logging.warning(f"El chromedriver {ruta} no es compatible con el Chrome instalado, se vuelve a resolver: {e}")
+        invalidar_chromedriver()
+        ruta = ruta_chromedriver()
+        resuelto = time.perf_counter()
+        try:
+            driver = webdriver.Chrome(service=Service(ruta) if ruta else Service(), options=options)
+        except Exception as e:
+            logging.error(f"Error al iniciar el navegador: {e}")
+            return None
+    logging.info(
+        f"Arranque del navegador: chromedriver resuelto en {resuelto - inicio:.2f}s, "
+        f"Chrome iniciado en {time.perf_counter() - resuelto:.2f}s."
+    )
+
+    _perfiles[driver.session_id] = {"perfil": perfil, "bloqueadas": None}
+    if perfil == PERFIL_LIGERO:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            bloquear_recursos(driver)
+        except Exception as e:
+            logging.warning(f"No se pudo activar el bloqueo de recursos: {e}")
+    logging.info(
+        f"Navegador iniciado con el perfil '{perfil}'{' sin ventana' if headless else ''}"
+        f"{'' if eventos_cdp else ' y sin eventos CDP'}."
+    )
+    return driver
+
+
+def perfil_driver(driver) -> str:
+    """
+    Devuelve el perfil con el que se arrancó el driver ("completo" si no se arrancó con configure).
+    """
+    return _perfiles.get(getattr(driver, "session_id", None), {}).get("perfil", PERFIL_COMPLETO)
+
+
+def urls_bloqueadas(url: str = None) -> list:
+    """
+    Devuelve los patrones de URL que el perfil ligero bloquea al navegar a 'url'.
+    """
+    sitio = (urlparse(url).hostname or "") if url else ""
+    permitidos = RECURSOS_PERMITIDOS_POR_SITIO.get(sitio, ())
+    return [patron for tipo, patrones in RECURSOS_BLOQUEADOS.items() if tipo not in permitidos for patron in patrones]
+
+
+def bloquear_recursos(driver, url: str = None) -> None:
+    """
+    Ajusta los recursos bloqueados del driver (solo perfil ligero) a la web a la que se va a navegar.
+    Solo llama a Chrome si la lista cambia respecto a la anterior.
+    """
+    estado = _perfiles.get(getattr(driver, "session_id", None))
+    if not estado or estado["perfil"] != PERFIL_LIGERO:
+        return
+    bloqueadas = urls_bloqueadas(url)
+    if bloqueadas == estado["bloqueadas"]:
+        return
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": bloqueadas})
+    estado["bloqueadas"] = bloqueadas
+
+
+def olvidar_driver(driver) -> None:
+    """
+    Elimina el perfil guardado de un driver que se va a cerrar.
+    """
+    _perfiles.pop(getattr(driver, "session_id", None), None)
+
+
+def _version(salida: str):
+    """
+    Extrae el número de versión (p. ej. "139.0.7258.66") de la salida de "--version".
+    """
+    encontrada = re.search(r"\d+(?:\.\d+){1,3}", salida or "")
+    return encontrada.group(0) if encontrada else None
+
+
+def _version_chrome():
+    """
+    Devuelve la versión del Chrome instalado, o None si no se puede averiguar (no se comprueba la compatibilidad).
+    """
+    if sys.platform == "win32":
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon") as clave:
+                return winreg.QueryValueEx(clave, "version")[0]
+        except OSError:
+            return None
+    candidatos = ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"] if sys.platform == "darwin" else []
+    candidatos += [shutil.which(nombre) for nombre in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser")]
+    for ejecutable in candidatos:
+        if ejecutable and os.path.exists(ejecutable):
+            try:
+                salida = subprocess.run([ejecutable, "--version"], capture_output=True, text=True, timeout=10).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            return _version(salida)
+    return None
+
+
+def _version_chromedriver(ruta: str):
+    """
+    Ejecuta "chromedriver --version" y devuelve su versión, o None si el binario no existe o no arranca.
+    """
+    if not ruta or not os.path.isfile(ruta) or not os.access(ruta, os.X_OK):
+        return None
+    try:
+        salida = subprocess.run([ruta, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return _version(salida)
+
+
+def _mayor(version):
+    return version.split(".")[0] if version else None
+
+
+def _leer_cache() -> dict:
     try:
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=Service(), options=options)
-        return driver
+        with open(RUTA_CACHE_CHROMEDRIVER, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _guardar_cache(ruta: str, version: str) -> None:
+    os.makedirs(os.path.dirname(RUTA_CACHE_CHROMEDRIVER), exist_ok=True)
+    temporal = f"{RUTA_CACHE_CHROMEDRIVER}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"ruta": ruta, "version": version, "fijada": VERSION_CHROMEDRIVER, "fecha": time.time()}, f, indent=2)
+    os.replace(temporal, RUTA_CACHE_CHROMEDRIVER)
+
+
+def _resolver_chromedriver():
+    """
+    Busca un chromedriver válido: el guardado en RUTA_CACHE_CHROMEDRIVER si sigue existiendo, arranca y encaja con la
+    versión fijada y con el Chrome instalado; si no, lo pide a webdriver_manager y lo guarda. Sin conexión, se usa el
+    guardado aunque no se haya podido comprobar. Devuelve None si no hay ninguno (Selenium lo buscará por su cuenta).
+    """
+    cache = _leer_cache()
+    version_guardada = _version_chromedriver(cache.get("ruta"))
+    if version_guardada:
+        fijada_ok = VERSION_CHROMEDRIVER is None or version_guardada == VERSION_CHROMEDRIVER
+        version_chrome = _version_chrome() if VERSION_CHROMEDRIVER is None else None
+        chrome_ok = version_chrome is None or _mayor(version_chrome) == _mayor(version_guardada)
+        if fijada_ok and chrome_ok:
+            logging.info(f"Chromedriver {version_guardada} reutilizado de {RUTA_CACHE_CHROMEDRIVER}.")
+            return cache["ruta"]
+        logging.info(f"El chromedriver guardado ({version_guardada}) no corresponde a la versión necesaria, se actualiza.")
+
+    try:
+        if VERSION_CHROMEDRIVER:
+            ruta = ChromeDriverManager(driver_version=VERSION_CHROMEDRIVER).install()
+        else:
+            ruta = ChromeDriverManager().install()
     except Exception as e:
-        logging.error(f"Error al iniciar el navegador: {e}")
+        if version_guardada:
+            logging.warning(f"No se pudo consultar webdriver_manager (¿sin conexión?), se usa el chromedriver guardado: {e}")
+            return cache["ruta"]
+        logging.warning(f"No se pudo resolver chromedriver con webdriver_manager, lo resolverá Selenium: {e}")
         return None
+
+    version = _version_chromedriver(ruta)
+    if not version:
+        logging.warning(f"El chromedriver descargado en {ruta} no arranca, lo resolverá Selenium.")
+        return None
+    _guardar_cache(ruta, version)
+    logging.info(f"Chromedriver {version} resuelto con webdriver_manager: {ruta}")
+    return ruta
+
+
+def ruta_chromedriver():
+    """
+    Devuelve la ruta del chromedriver, resolviéndola solo la primera vez en cada proceso
+    (los drivers del pool o de cada NIF/XML/regage reutilizan la misma). None si no se ha encontrado.
+    """
+    with _lock_chromedriver:
+        if not _chromedriver["resuelto"] or (_chromedriver["ruta"] and not os.path.isfile(_chromedriver["ruta"])):
+            _chromedriver["ruta"] = _resolver_chromedriver()
+            _chromedriver["resuelto"] = True
+        return _chromedriver["ruta"]
+
+
+def invalidar_chromedriver() -> None:
+    """
+    Olvida el chromedriver resuelto (en memoria y en disco), p. ej. tras actualizarse Chrome.
+    """
+    with _lock_chromedriver:
+        _chromedriver.update(ruta=None, resuelto=False)
+        try:
+            os.remove(RUTA_CACHE_CHROMEDRIVER)
+        except FileNotFoundError:
+            pass
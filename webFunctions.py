@@ -10,6 +10,10 @@ Las funcionalidades incluyen:
   - Seleccionar opciones en un <select>.
   - Manejar ventanas/pestañas y alertas.
   - Capturar pantallas y obtener logs del navegador.
+  - Extraer todos los campos de una página con una sola llamada (extraer_campos_por_script).
+  - Rellenar todos los campos de un formulario con el mínimo de llamadas (rellenar_formulario).
+  - Esperar por condición en lugar de pausas fijas: autocompletado abierto/cerrado, pop-up abierto/cerrado,
+    peticiones AJAX terminadas y valor de un campo confirmado (PAUSA_MINIMA fija un ritmo mínimo común).
   
 Cada función incluye documentación sobre sus parámetros, lo que retorna o si lanza excepciones.
 """
@@ -27,14 +31,20 @@ from selenium.common import (
     NoSuchFrameException,
     WebDriverException,
     NoSuchElementException,
-    ElementNotInteractableException
+    ElementNotInteractableException,
+    StaleElementReferenceException
 )
 from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.select import Select
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.common.keys import Keys
 
+import eventosCDP
+import redCDP
+import webConfiguration
+
 # Tiempo de espera global (en segundos)
 DEFAULT_TIMEOUT = 5
 
@@ -46,11 +56,43 @@ def abrir_web(driver: webdriver.Chrome, url: str) -> None:
         driver (webdriver.Chrome): Instancia del navegador.
         url (str): URL a abrir.
 
+    Con el perfil ligero (ver webConfiguration) antes se ajustan los recursos bloqueados para esa web.
+    Si nadie espera eventos CDP del driver, se descartan los acumulados (ver eventosCDP.descartar_sin_suscripciones).
+    Registra en el log el tiempo de carga para poder comparar perfiles.
+
     Ejemplo:
         abrir_web(driver, "https://example.com")
     """
+    webConfiguration.bloquear_recursos(driver, url)
+    eventosCDP.descartar_sin_suscripciones(driver)
+    inicio = time.perf_counter()
     driver.get(url)
-    logging.info(f"Web '{url}' abierta.")
+    duracion = time.perf_counter() - inicio
+    logging.info(f"Web '{url}' abierta en {duracion:.2f}s (perfil {webConfiguration.perfil_driver(driver)}{_resumen_carga(driver)}).")
+
+_SCRIPT_TIEMPOS_CARGA = """
+const navegacion = performance.getEntriesByType('navigation')[0];
+if (!navegacion) return null;
+return {
+    dom: navegacion.domContentLoadedEventEnd,
+    carga: navegacion.loadEventEnd,
+    recursos: performance.getEntriesByType('resource').length
+};
+"""
+
+def _resumen_carga(driver) -> str:
+    """
+    Devuelve los tiempos de carga de la página según el navegador (DOM listo, carga completa y número de recursos),
+    como texto para el log. Devuelve "" si no se pueden leer.
+    """
+    try:
+        tiempos = driver.execute_script(_SCRIPT_TIEMPOS_CARGA)
+    except Exception:
+        return ""
+    if not tiempos:
+        return ""
+    carga = f"{tiempos['carga'] / 1000:.2f}s" if tiempos.get("carga") else "pendiente"
+    return f", DOM listo en {tiempos['dom'] / 1000:.2f}s, carga completa {carga}, {tiempos['recursos']} recursos"
 
 def esperar_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> WebDriverWait:
     """
@@ -129,7 +171,7 @@ def encontrar_elementos(driver, by, value, timeout=DEFAULT_TIMEOUT):
         logging.error(f"Error al buscar elementos con '{by}' = '{value}': {e}")
         return []
 
-def clickar_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> None:
+def clickar_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> WebElement:
     """
     Espera a que un elemento sea visible y realiza un clic en él.
     Reintenta hasta 5 veces con esperas de 0.5s entre intentos.
@@ -140,6 +182,9 @@ def clickar_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int
         value (str): Valor del selector.
         timeout (int, optional): Tiempo máximo de espera en segundos.
 
+    Returns:
+        WebElement: El elemento en el que se ha hecho clic.
+
     Raises:
         TimeoutException: Si el elemento no se encuentra en el tiempo especificado.
         Exception: Si ocurre un error al hacer clic.
@@ -151,7 +196,7 @@ def clickar_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int
             elemento = driver.find_element(by, value)
             elemento.click()
             logging.info(f"Elemento clickado con '{by}' = '{value}'.")
-            return
+            return elemento
         except TimeoutException:
             if intento == intentos - 1:
                 raise
@@ -606,6 +651,8 @@ def escribir_en_elemento_por_name_y_enter(driver: webdriver.Chrome, name: str, t
 def escribir_en_elemento_por_name_y_enter_pausa(driver: webdriver.Chrome, name: str, texto: str) -> None:
     """
     Escribe en un elemento identificado por el atributo name y pulsa Enter después de escribir.
+    Si el campo es un autocompletado, espera a que aparezcan las sugerencias antes de pulsar Enter
+    y a que la selección se confirme después (ver esperar_sugerencias y esperar_seleccion_confirmada).
 
     Args:
         driver (webdriver.Chrome): Instancia del navegador.
@@ -613,13 +660,14 @@ def escribir_en_elemento_por_name_y_enter_pausa(driver: webdriver.Chrome, name:
         texto (str): Texto a escribir.
 
     Ejemplo:
-        escribir_en_elemento_por_name_y_enter(driver, "usuario", "admin")
+        escribir_en_elemento_por_name_y_enter_pausa(driver, "pDenominacion_ine_municipio", "VALENCIA")
     """
     try:
         escribir_en_elemento(driver, By.NAME, name, texto)
         input_element = driver.find_element(By.NAME, name)
-        time.sleep(2)
+        esperar_sugerencias(driver, input_element)
         input_element.send_keys(Keys.ENTER)
+        esperar_seleccion_confirmada(driver, input_element)
         logging.info(f"Se escribió texto y se pulsó Enter en el elemento con name '{name}'.")
     except Exception as e:
         logging.error(f"No se pudo escribir y pulsar Enter en el elemento con name '{name}': {e}")
@@ -906,6 +954,165 @@ def obtener_texto_elemento_por_id(driver: webdriver.Chrome, elemento_id: str, ti
     finally:
         driver.switch_to.default_content()
 
+# Script que lee todos los campos de una especificación en una sola llamada (ver extraer_campos_por_script)
+_SCRIPT_EXTRAER_CAMPOS = """
+const campos = arguments[0];
+const resultado = {};
+const texto = (el) => el ? (el.innerText || el.textContent || "").trim() : null;
+const porXpath = (xpath) => document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const conSub = (el, sub) => el && sub ? el.querySelector(sub) : el;
+for (const [clave, spec] of Object.entries(campos)) {
+    if (spec.prefijo !== undefined) {
+        const lista = [];
+        for (let i = 0; ; i++) {
+            const el = document.getElementById(spec.prefijo + i);
+            if (!el) break;
+            lista.push(texto(conSub(el, spec.sub)) || "");
+        }
+        resultado[clave] = lista;
+    } else if (spec.id !== undefined) {
+        resultado[clave] = texto(conSub(document.getElementById(spec.id), spec.sub));
+    } else if (spec.etiqueta !== undefined) {
+        const nodos = porXpath("//td[b[normalize-space(text())='" + spec.etiqueta + "']]");
+        let valor = texto(nodos.snapshotItem(spec.indice || 0));
+        if (valor !== null) {
+            valor = valor.startsWith(spec.etiqueta)
+                ? valor.slice(spec.etiqueta.length).trim()
+                : valor.split(spec.etiqueta).slice(1).join(spec.etiqueta).trim();
+        }
+        resultado[clave] = valor;
+    } else if (spec.xpath !== undefined) {
+        const nodos = porXpath(spec.xpath);
+        if (spec.todos) {
+            const lista = [];
+            for (let i = 0; i < nodos.snapshotLength; i++) lista.push(texto(nodos.snapshotItem(i)));
+            resultado[clave] = lista;
+        } else {
+            resultado[clave] = texto(nodos.snapshotItem(0));
+        }
+    }
+}
+return resultado;
+"""
+
+def extraer_campos_por_script(driver: webdriver.Chrome, campos: Dict[str, dict], esperar_xpath: Optional[str] = None,
+                              en_iframe: bool = False, timeout: int = DEFAULT_TIMEOUT) -> Dict[str, Union[str, List[str], None]]:
+    """
+    Lee todos los campos de una página en una sola llamada a execute_script, en lugar de buscar cada elemento por separado.
+
+    Cada campo se declara con un diccionario:
+      - {"id": "ENIF1-0", "sub": "span"}          -> texto del elemento con ese id (o de su primer descendiente 'sub', selector CSS).
+      - {"xpath": "//h1"}                          -> texto del primer elemento del XPath.
+      - {"xpath": "//p", "todos": True}            -> lista con el texto de todos los elementos del XPath.
+      - {"etiqueta": "CP:", "indice": 1}           -> igual que leer_texto_por_campo_indice (<td> con un <b> 'etiqueta').
+      - {"prefijo": "Text10-0-0-", "sub": "span"}  -> lista con el texto de los ids prefijo0, prefijo1... hasta el primero que no existe.
+
+    Args:
+        driver (webdriver.Chrome): Instancia del navegador.
+        campos (dict): Clave del resultado -> especificación del campo.
+        esperar_xpath (str, optional): XPath de un elemento que debe estar presente antes de leer (la única espera).
+        en_iframe (bool, optional): Si es True, lee dentro del primer iframe de la página.
+        timeout (int, optional): Tiempo máximo de espera en segundos.
+
+    Returns:
+        dict: Clave -> texto (None si el elemento no existe) o lista de textos.
+
+    Ejemplo:
+        datos = extraer_campos_por_script(driver, {"nif": {"etiqueta": "NIF:"}}, esperar_xpath="//td[b]")
+    """
+    try:
+        if en_iframe:
+            iframe = WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "iframe")))
+            driver.switch_to.frame(iframe)
+        if esperar_xpath:
+            try:
+                WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, esperar_xpath)))
+            except TimeoutException:
+                logging.warning(f"No apareció '{esperar_xpath}' en {timeout}s, se leen los campos disponibles.")
+        resultado = driver.execute_script(_SCRIPT_EXTRAER_CAMPOS, campos) or {}
+        logging.info(f"Extraídos {len(resultado)} campos con una sola llamada: {resultado}")
+        return resultado
+    finally:
+        if en_iframe:
+            driver.switch_to.default_content()
+
+# Rellena en orden los campos [name, valor] dentro de 'raíz' (o del documento) hasta el primero que necesita otra vía.
+# Los <input>/<textarea> normales reciben el valor y los eventos input y change; los <select> eligen la opción por
+# texto o value. Devuelve {"rellenados": n, "motivo": tipo} con tipo:
+#   null: se han rellenado todos; 'teclado': el campo es un autocompletado (hay que teclear y elegir sugerencia);
+#   'ausente': el campo no existe todavía, está oculto o deshabilitado; 'opcion': el <select> no tiene esa opción.
+_SCRIPT_RELLENAR_FORMULARIO = r"""
+const raiz = arguments[0] || document;
+const pares = arguments[1];
+const visible = (el) => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+const avisar = (el) => {
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+};
+for (let i = 0; i < pares.length; i++) {
+    const [nombre, valor] = pares[i];
+    const el = raiz.querySelector('[name="' + CSS.escape(nombre) + '"]');
+    if (!el || !visible(el) || el.disabled || el.readOnly) return {rellenados: i, motivo: 'ausente'};
+    if (el.tagName === 'SELECT') {
+        const opcion = Array.from(el.options).find((o) => o.text.trim() === valor || o.value === valor);
+        if (!opcion) return {rellenados: i, motivo: 'opcion'};
+        el.value = opcion.value;
+        avisar(el);
+        continue;
+    }
+    if (el.classList.contains('ui-autocomplete-input')) return {rellenados: i, motivo: 'teclado'};
+    const prototipo = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(prototipo, 'value').set.call(el, valor);
+    avisar(el);
+}
+return {rellenados: pares.length, motivo: null};
+"""
+
+def rellenar_formulario(driver, campos: Dict[str, str]) -> Dict[str, int]:
+    """
+    Rellena varios campos de un formulario (por su atributo name) con el mínimo de llamadas al navegador.
+
+    Los campos normales y los <select> se rellenan juntos con un solo execute_script (valor + eventos input/change),
+    en el orden del diccionario. Solo se sale del script para los campos que lo necesitan:
+      - autocompletados: se teclea el valor y se elige la sugerencia con Enter (escribir_en_elemento_por_name_y_enter_pausa).
+      - campos que aún no existen, ocultos o deshabilitados: se esperan y se escriben como siempre (escribir_en_elemento).
+      - <select> sin esa opción visible: seleccionar_elemento_por_name (lanza error si no existe).
+
+    Args:
+        driver (webdriver.Chrome | WebElement): Navegador o contenedor (p. ej. el div de un pop-up).
+        campos (dict): name del campo -> valor (se convierte a str).
+
+    Returns:
+        dict: {"script": campos rellenados por script, "teclado": campos rellenados uno a uno, "llamadas": execute_script}.
+
+    Ejemplo:
+        rellenar_formulario(popup, {"pNima": "4600012345", "pDenominacion_ine_municipio": "VALENCIA"})
+    """
+    navegador = _navegador(driver)
+    raiz = driver if isinstance(driver, WebElement) else None
+    pendientes = [[nombre, "" if valor is None else str(valor)] for nombre, valor in campos.items()]
+    resumen = {"script": 0, "teclado": 0, "llamadas": 0}
+    while pendientes:
+        resultado = navegador.execute_script(_SCRIPT_RELLENAR_FORMULARIO, raiz, pendientes)
+        resumen["llamadas"] += 1
+        resumen["script"] += resultado["rellenados"]
+        pendientes = pendientes[resultado["rellenados"]:]
+        if not pendientes:
+            break
+        nombre, valor = pendientes.pop(0)
+        if resultado["motivo"] == "teclado":
+            escribir_en_elemento_por_name_y_enter_pausa(driver, nombre, valor)
+        elif resultado["motivo"] == "opcion":
+            seleccionar_elemento_por_name(driver, nombre, valor)
+        else:
+            escribir_en_elemento(driver, By.NAME, nombre, valor)
+        resumen["teclado"] += 1
+    logging.info(
+        f"Formulario rellenado: {resumen['script']} campos por script y {resumen['teclado']} uno a uno "
+        f"({resumen['llamadas']} llamadas de script)."
+    )
+    return resumen
+
 def obtener_texto_por_parte(driver: webdriver.Chrome, parte_texto: str, timeout: int = DEFAULT_TIMEOUT) -> Optional[str]:
     """
     Busca un elemento que contenga una parte del texto especificado y devuelve la cadena de texto completa de ese elemento.
@@ -983,7 +1190,7 @@ def leer_texto_por_campo_indice(driver, campo, indice=0, timeout=5):
 def completar_campo_y_confirmar_seleccion(driver: webdriver.Chrome, buscar_por: By, locator: str, texto: str, boton_confirmacion_locator: str, timeout: int = DEFAULT_TIMEOUT) -> None:
     """
     Ingresa un valor en un campo (usando el método especificado y locator),
-    espera un breve lapso y luego hace click en un botón de confirmación identificado por su locator.
+    espera a que se muestren las sugerencias y luego hace click en un botón de confirmación identificado por su locator.
 
     Args:
         driver (webdriver.Chrome): Instancia del WebDriver.
@@ -991,14 +1198,16 @@ def completar_campo_y_confirmar_seleccion(driver: webdriver.Chrome, buscar_por:
         locator (str): Valor del locator para el campo.
         texto (str): Texto a ingresar.
         boton_confirmacion_locator (str): Valor del locator del botón de confirmación (se asume se buscará por clase).
-        delay (int, optional): Tiempo en segundos a esperar antes del click. Por defecto es 1.
+        timeout (int, optional): Tiempo máximo de espera en segundos.
 
     Raises:
         Exception: Si ocurre algún error en alguna de las acciones.
     """
     escribir_en_elemento(driver, buscar_por, locator, texto, timeout)
-    time.sleep(1)
+    campo = driver.find_element(buscar_por, locator)
+    esperar_sugerencias(driver, campo, timeout)
     clickar_boton_por_clase(driver, boton_confirmacion_locator, timeout)
+    esperar_seleccion_confirmada(driver, campo, timeout)
 
 def completar_campo_y_confirmar_seleccion_por_name(driver: webdriver.Chrome, nombre: str, texto: str, boton_confirmacion_locator: str, timeout: int = DEFAULT_TIMEOUT) -> None:
     """
@@ -1041,7 +1250,8 @@ def completar_campo_y_confirmar_seleccion_por_class(driver: webdriver.Chrome, cl
 
 def completar_campo_y_enter_por_name(driver, campo_name, valor):
     """
-    Completa un campo de formulario identificado por su atributo 'name' y simula la pulsación de la tecla Enter.
+    Completa un campo de formulario identificado por su atributo 'name' y simula la pulsación de la tecla Enter
+    cuando el campo ya ha mostrado sus sugerencias.
 
     Args:
         driver (selenium.webdriver): Instancia del controlador del navegador.
@@ -1049,8 +1259,10 @@ def completar_campo_y_enter_por_name(driver, campo_name, valor):
         valor (str): Texto que se desea ingresar en el campo.
     """
     escribir_en_elemento_por_name(driver, campo_name, valor)
-    time.sleep(1.5)
+    campo = driver.find_element(By.NAME, campo_name)
+    esperar_sugerencias(driver, campo)
     pulsar_enter_en_elemento_por_name(driver, campo_name)
+    esperar_seleccion_confirmada(driver, campo)
 
 def pulsar_enter_en_elemento(driver: webdriver.Chrome, by: By, value: str, timeout: int = DEFAULT_TIMEOUT) -> None:
     """
@@ -1176,7 +1388,8 @@ def clickar_div_residuo_por_nombre(driver, nombre_residuo, timeout=10):
 
 def escribir_en_elemento_por_name_y_enter_escape(driver: webdriver.Chrome, name: str, texto: str) -> None:
     """
-    Escribe en un elemento identificado por el atributo name y pulsa Enter después de escribir.
+    Escribe en un elemento identificado por el atributo name y pulsa Escape cuando el campo ha mostrado
+    sus sugerencias (se cierra el menú y se conserva el texto escrito).
 
     Args:
         driver (webdriver.Chrome): Instancia del navegador.
@@ -1184,16 +1397,306 @@ def escribir_en_elemento_por_name_y_enter_escape(driver: webdriver.Chrome, name:
         texto (str): Texto a escribir.
 
     Ejemplo:
-        escribir_en_elemento_por_name_y_enter(driver, "usuario", "admin")
+        escribir_en_elemento_por_name_y_enter_escape(driver, "pTratamiento_posterior_1_codigo_ler_2", "R1")
     """
     try:
         escribir_en_elemento(driver, By.NAME, name, texto)
         input_element = driver.find_element(By.NAME, name)
-        time.sleep(2)
+        esperar_sugerencias(driver, input_element)
         input_element.send_keys(Keys.ESCAPE)
-        logging.info(f"Se escribió texto y se pulsó Enter en el elemento con name '{name}'.")
+        esperar_seleccion_confirmada(driver, input_element)
+        logging.info(f"Se escribió texto y se pulsó Escape en el elemento con name '{name}'.")
     except Exception as e:
-        logging.error(f"No se pudo escribir y pulsar Enter en el elemento con name '{name}': {e}")
+        logging.error(f"No se pudo escribir y pulsar Escape en el elemento con name '{name}': {e}")
         raise
 
-## Probar con el campo de codigo de tratamiento en nubelus
\ No newline at end of file
+## Probar con el campo de codigo de tratamiento en nubelus
+
+# ---------------------------------------------------------------------------
+# Esperas por condición
+# ---------------------------------------------------------------------------
+# Sustituyen a las pausas fijas (time.sleep) de los flujos de Nubelus: cada espera termina en cuanto la página
+# cumple la condición (menú de autocompletado abierto o cerrado, pop-up abierto o cerrado, sin peticiones AJAX
+# pendientes, valor del campo confirmado). Las peticiones se cuentan con los eventos CDP de redCDP cuando el driver
+# los registra. PAUSA_MINIMA es solo un suelo de seguridad: ninguna espera termina antes
+# de esos segundos, para poder frenar el ritmo de todos los flujos a la vez si la web lo necesita.
+
+# Tiempo mínimo (segundos) que dura cualquier espera por condición. 0 para no frenar nunca.
+PAUSA_MINIMA = 0.1
+
+# Segundos entre comprobaciones de una condición
+INTERVALO_CONDICION = 0.05
+
+# Segundos seguidos sin peticiones AJAX para dar la página por inactiva (la web encadena peticiones)
+SILENCIO_AJAX = 0.2
+
+# Segundos que un autocompletado sin peticiones ni menú tarda en darse por "sin sugerencias"
+# (jQuery UI lanza la búsqueda 300 ms después de la última tecla)
+ESPERA_SIN_SUGERENCIAS = 0.5
+
+# Tiempo máximo (segundos) para que se procese un formulario al aceptarlo
+TIMEOUT_ACCION = 15
+
+# Cuenta las peticiones XMLHttpRequest/fetch en curso (se instala una vez por página) y comprueba que no quede
+# ninguna, tampoco de jQuery, y que la página haya terminado de cargar.
+_SCRIPT_AJAX_INACTIVO = r"""
+if (!window.__peticionesEnCurso) {
+    const contador = window.__peticionesEnCurso = {pendientes: 0};
+    const terminar = () => { contador.pendientes = Math.max(0, contador.pendientes - 1); };
+    const enviar = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        contador.pendientes++;
+        this.addEventListener('loadend', terminar);
+        return enviar.apply(this, arguments);
+    };
+    if (window.fetch) {
+        const fetchOriginal = window.fetch;
+        window.fetch = function () {
+            contador.pendientes++;
+            return fetchOriginal.apply(this, arguments).finally(terminar);
+        };
+    }
+}
+const jq = window.jQuery;
+const activas = jq && typeof jq.active === 'number' ? jq.active : 0;
+return document.readyState === 'complete' && activas === 0 && window.__peticionesEnCurso.pendientes === 0;
+"""
+
+# Estado del autocompletado (jQuery UI) de un campo: 'abierto' si hay un menú de sugerencias visible con opciones,
+# 'cargando' si el campo está buscando o hay peticiones jQuery en curso y 'cerrado' en otro caso.
+_SCRIPT_ESTADO_AUTOCOMPLETADO = r"""
+const campo = arguments[0];
+const visible = (menu) => getComputedStyle(menu).display !== 'none' && menu.getClientRects().length > 0;
+const menus = Array.from(document.querySelectorAll('ul.ui-autocomplete'));
+if (menus.some((menu) => visible(menu) && menu.querySelector('li'))) return 'abierto';
+const jq = window.jQuery;
+const activas = jq && typeof jq.active === 'number' ? jq.active : 0;
+if (activas > 0 || (campo && campo.classList.contains('ui-autocomplete-loading'))) return 'cargando';
+return 'cerrado';
+"""
+
+def _navegador(driver):
+    """
+    Devuelve el WebDriver a partir del driver o de un WebElement (p. ej. el div de un pop-up).
+    """
+    return driver.parent if isinstance(driver, WebElement) else driver
+
+def _aplicar_pausa_minima(inicio: float) -> None:
+    restante = PAUSA_MINIMA - (time.monotonic() - inicio)
+    if restante > 0:
+        time.sleep(restante)
+
+def esperar_condicion(driver, condicion, timeout: float = DEFAULT_TIMEOUT, descripcion: str = "condición",
+                      silencio: float = 0):
+    """
+    Espera a que condicion(driver) devuelva un valor verdadero y lo mantenga durante 'silencio' segundos.
+    Los errores de Selenium al comprobarla (elemento obsoleto, página recargándose...) cuentan como "aún no".
+
+    Args:
+        driver (webdriver.Chrome | WebElement): Navegador o contenedor que se pasa a la condición.
+        condicion (callable): Función que recibe el driver y devuelve un valor (verdadero si se cumple).
+        timeout (float, optional): Tiempo máximo de espera en segundos.
+        descripcion (str, optional): Texto para el log si se agota el tiempo.
+        silencio (float, optional): Segundos seguidos que debe cumplirse la condición.
+
+    Returns:
+        El último valor de la condición, o None si se agota el tiempo.
+    """
+    inicio = time.monotonic()
+    limite = inicio + timeout
+    cumplida_desde = None
+    while True:
+        try:
+            valor = condicion(driver)
+        except WebDriverException:
+            valor = None
+        ahora = time.monotonic()
+        if valor:
+            cumplida_desde = cumplida_desde or ahora
+            if ahora - cumplida_desde >= silencio:
+                _aplicar_pausa_minima(inicio)
+                return valor
+        else:
+            cumplida_desde = None
+        if ahora >= limite:
+            logging.warning(f"Tiempo agotado ({timeout}s) esperando: {descripcion}.")
+            return None
+        time.sleep(INTERVALO_CONDICION)
+
+def esperar_ajax_inactivo(driver, timeout: float = DEFAULT_TIMEOUT, silencio: float = SILENCIO_AJAX) -> bool:
+    """
+    Espera a que la página haya cargado y no tenga peticiones AJAX en curso durante 'silencio' segundos seguidos.
+    Si el driver registra eventos CDP se cuentan las peticiones de red reales de la página (redCDP); si no,
+    las de jQuery y las XMLHttpRequest/fetch que cuenta un script inyectado en la página.
+
+    Returns:
+        bool: True si la página queda inactiva, False si se agota el tiempo.
+    """
+    navegador = _navegador(driver)
+    if redCDP.disponible(navegador):
+        return bool(esperar_condicion(
+            navegador,
+            lambda d: redCDP.red_inactiva(d, silencio * 1000)
+            and d.execute_script("return document.readyState") == "complete",
+            timeout, "red inactiva"
+        ))
+    return bool(esperar_condicion(
+        navegador, lambda d: d.execute_script(_SCRIPT_AJAX_INACTIVO), timeout, "peticiones AJAX terminadas", silencio
+    ))
+
+def _estado_autocompletado(driver, campo=None) -> str:
+    navegador = _navegador(driver)
+    estado = navegador.execute_script(_SCRIPT_ESTADO_AUTOCOMPLETADO, campo)
+    if estado == "cerrado" and redCDP.peticiones_en_curso(navegador) > 0:
+        return "cargando"
+    return estado
+
+def esperar_autocompletado_abierto(driver, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    Espera a que se muestre un menú de sugerencias de autocompletado con al menos una opción.
+    """
+    return bool(esperar_condicion(
+        driver, lambda d: _estado_autocompletado(d) == "abierto", timeout, "menú de autocompletado abierto"
+    ))
+
+def esperar_autocompletado_cerrado(driver, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    Espera a que no quede ningún menú de autocompletado visible ni búsqueda en curso.
+    """
+    return bool(esperar_condicion(
+        driver, lambda d: _estado_autocompletado(d) == "cerrado", timeout, "menú de autocompletado cerrado"
+    ))
+
+def esperar_sugerencias(driver, campo: WebElement, timeout: float = DEFAULT_TIMEOUT) -> Optional[str]:
+    """
+    Espera, tras escribir en un campo, a que este muestre sus sugerencias o quede claro que no tiene:
+    si el campo no es un autocompletado, o si pasan ESPERA_SIN_SUGERENCIAS segundos sin menú ni búsquedas.
+
+    Returns:
+        str or None: "abierto" si hay sugerencias, "sin_sugerencias" si no las hay, None si se agota el tiempo.
+    """
+    if "ui-autocomplete-input" not in (campo.get_attribute("class") or ""):
+        esperar_ajax_inactivo(driver, timeout)
+        return "sin_sugerencias"
+    cerrado_desde = {"momento": None}
+
+    def sugerencias(d):
+        estado = _estado_autocompletado(d, campo)
+        if estado == "abierto":
+            return estado
+        if estado == "cargando":
+            cerrado_desde["momento"] = None
+            return None
+        cerrado_desde["momento"] = cerrado_desde["momento"] or time.monotonic()
+        if time.monotonic() - cerrado_desde["momento"] >= ESPERA_SIN_SUGERENCIAS:
+            return "sin_sugerencias"
+        return None
+
+    resultado = esperar_condicion(driver, sugerencias, timeout, "sugerencias del autocompletado")
+    if resultado == "sin_sugerencias":
+        logging.info(f"El campo '{campo.get_attribute('name')}' no mostró sugerencias.")
+    return resultado
+
+def esperar_seleccion_confirmada(driver, campo: WebElement, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    Espera, tras elegir una sugerencia (Enter, Escape o clic), a que el menú se cierre
+    y terminen las peticiones que rellenan los campos dependientes.
+    """
+    return esperar_autocompletado_cerrado(driver, timeout) and esperar_ajax_inactivo(driver, timeout)
+
+def _sin_tildes(texto: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn').upper()
+
+def esperar_valor_confirmado(driver, by: By, value: str, esperado: Optional[str] = None,
+                             timeout: float = DEFAULT_TIMEOUT) -> Optional[str]:
+    """
+    Espera a que el campo tenga un valor confirmado: no vacío (y que contenga 'esperado', sin distinguir
+    mayúsculas ni tildes, si se indica), estable durante SILENCIO_AJAX segundos y sin autocompletado abierto.
+
+    Returns:
+        str or None: El valor del campo, o None si se agota el tiempo.
+    """
+    esperado_normalizado = _sin_tildes(esperado) if esperado else None
+
+    def valor_confirmado(d):
+        campo = d.find_element(by, value)
+        valor = (campo.get_attribute("value") or "").strip()
+        if not valor or _estado_autocompletado(d, campo) != "cerrado":
+            return None
+        if esperado_normalizado and esperado_normalizado not in _sin_tildes(valor):
+            return None
+        return valor
+
+    return esperar_condicion(driver, valor_confirmado, timeout, f"valor confirmado en {by}='{value}'", SILENCIO_AJAX)
+
+def esperar_pop_up_abierto(driver, by: By, value: str, timeout: float = DEFAULT_TIMEOUT) -> WebElement:
+    """
+    Espera a que el pop-up sea visible y lo devuelve (como encontrar_pop_up, pero sin adelantarse a la web).
+
+    Raises:
+        TimeoutException: Si el pop-up no se abre en el tiempo indicado.
+    """
+    def pop_up_visible(d):
+        return next((elemento for elemento in d.find_elements(by, value) if elemento.is_displayed()), None)
+
+    popup = esperar_condicion(driver, pop_up_visible, timeout, f"pop-up {by}='{value}' abierto")
+    if popup is None:
+        raise TimeoutException(f"El pop-up con {by}='{value}' no se abrió en {timeout}s.")
+    logging.info(f"Pop-up abierto con {by}='{value}'.")
+    return popup
+
+def esperar_pop_up_abierto_por_id(driver, id: str, timeout: float = DEFAULT_TIMEOUT) -> WebElement:
+    """
+    Wrapper de esperar_pop_up_abierto para un pop-up identificado por su ID.
+    """
+    return esperar_pop_up_abierto(driver, By.ID, id, timeout)
+
+def esperar_pop_up_cerrado(driver, by: By, value: str, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    Espera a que el pop-up se oculte o desaparezca de la página.
+    """
+    return bool(esperar_condicion(
+        driver, lambda d: not any(elemento.is_displayed() for elemento in d.find_elements(by, value)),
+        timeout, f"pop-up {by}='{value}' cerrado"
+    ))
+
+def esperar_pop_up_cerrado_por_id(driver, id: str, timeout: float = DEFAULT_TIMEOUT) -> bool:
+    """
+    Wrapper de esperar_pop_up_cerrado para un pop-up identificado por su ID.
+    """
+    return esperar_pop_up_cerrado(driver, By.ID, id, timeout)
+
+def _oculto(elemento: WebElement) -> bool:
+    try:
+        return not elemento.is_displayed()
+    except StaleElementReferenceException:
+        return True
+
+def clickar_y_esperar_cierre(driver, clase: str, timeout: float = TIMEOUT_ACCION, respuesta: Optional[str] = None) -> bool:
+    """
+    Hace clic en un botón por su clase (p. ej. "miBoton.aceptar" de un formulario o pop-up) y espera a que la
+    acción se procese: que el botón desaparezca (se cierra el pop-up o se carga la página siguiente) y no queden
+    peticiones AJAX en curso. El clic se reintenta como en clickar_elemento (p. ej. si lo intercepta una capa
+    que aún se está cerrando).
+
+    Args:
+        respuesta (str, optional): Expresión regular de la URL cuya respuesta hay que esperar además
+            (ver redCDP.esperar_respuesta).
+
+    Returns:
+        bool: True cuando el formulario se ha cerrado.
+
+    Raises:
+        TimeoutError: Si el formulario sigue abierto al agotar el tiempo (p. ej. la web lo ha rechazado por un error
+        de validación), para que el flujo que llama lo trate como un fallo y no como guardado.
+    """
+    desde = time.time()
+    boton = clickar_elemento(driver, By.CSS_SELECTOR, f".{clase}")
+    logging.info(f"Botón con clase '{clase}' clickado, esperando a que se procese.")
+    if respuesta:
+        redCDP.esperar_respuesta(driver, respuesta, timeout, desde)
+    cerrado = esperar_condicion(driver, lambda _: _oculto(boton), timeout, f"cierre tras pulsar '{clase}'")
+    esperar_ajax_inactivo(driver, timeout)
+    if not cerrado:
+        raise TimeoutError(f"El formulario sigue abierto {timeout}s después de pulsar '{clase}'.")
+    return True